@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 import os
+import socket
 from pathlib import Path
 from decouple import config
 
@@ -168,11 +169,54 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_TASK_TRACK_STARTED = True
 CELERY_TASK_TIME_LIMIT = 30 * 60
+# Pipeline stages run on their own queues so browser, parsing and embedding
+# workers scale independently; everything else stays on the default queue.
+# The page archive lives on the scrape workers' disk, so the tasks that read
+# it are sent to the 'archive.<PAGE_ARCHIVE_HOST>' queue of the host holding
+# the pages, which that host's scrape workers also consume.
+CELERY_TASK_ROUTES = {
+    'products.tasks.fetch_product_pages': {'queue': 'scrape'},
+    'products.tasks.parse_product_pages': {'queue': 'parse'},
+    'products.tasks.embed_product_chunks': {'queue': 'embed'},
+    'products.tasks.drain_embedding_queue': {'queue': 'embed'},
+    'products.tasks.refresh_product_price': {'queue': 'scrape'},
+}
+
+# Periodic tasks live in the django-celery-beat tables; entries below are
+# synced into them when beat starts
+CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
+CELERY_BEAT_SCHEDULE = {
+    'schedule-price-refreshes': {
+        'task': 'products.tasks.schedule_price_refreshes',
+        'schedule': config('PRICE_REFRESH_SCHEDULE_MINUTES', default=30, cast=int) * 60,
+    },
+    # Page archive retention (PAGE_ARCHIVE_RETENTION_DAYS), on every archive host
+    'prune-page-archives': {
+        'task': 'products.tasks.schedule_page_archive_pruning',
+        'schedule': config('PAGE_ARCHIVE_PRUNE_HOURS', default=24, cast=int) * 60 * 60,
+    },
+}
+
+# Redis priority queues: lower numbers are consumed first. Prefetch of one
+# keeps workers from holding queued bulk tasks while interactive ones wait.
+CELERY_BROKER_TRANSPORT_OPTIONS = {
+    'queue_order_strategy': 'priority',
+    'priority_steps': list(range(10)),
+    'sep': ':',
+}
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Ingestion priorities (interactive adds run ahead of bulk backfills)
+INGEST_PRIORITIES = {'interactive': 0, 'bulk': 6}
+INGEST_BULK_MAX_URLS = config('INGEST_BULK_MAX_URLS', default=10000, cast=int)
+INGEST_ENQUEUE_BATCH_SIZE = config('INGEST_ENQUEUE_BATCH_SIZE', default=200, cast=int)
+
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
 
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
-        'LOCATION': config('REDIS_URL', default='redis://localhost:6379/0'),
+        'LOCATION': REDIS_URL,
         'OPTIONS': {
             # 'CLIENT_CLASS': 'django_redis.client.DefaultClient',
         },
@@ -186,6 +230,116 @@ GOOGLE_API_KEY = config('GOOGLE_API_KEY', default='')
 PINECONE_API_KEY = config('PINECONE_API_KEY', default='')
 PINECONE_ENVIRONMENT = config('PINECONE_ENVIRONMENT', default='us-east-1-aws')
 PINECONE_INDEX_NAME = 'amazon-products'
+# 'pinecone' (hosted) or 'local' (in-process NumPy index, works offline)
+VECTOR_STORE_BACKEND = config('VECTOR_STORE_BACKEND', default='pinecone')
+LOCAL_VECTOR_STORE_DIR = config('LOCAL_VECTOR_STORE_DIR', default=str(BASE_DIR / 'vector_store'))
+# Superseded local matrices stay on disk this long for readers holding the old manifest
+LOCAL_VECTOR_STORE_GRACE_SECONDS = config('LOCAL_VECTOR_STORE_GRACE_SECONDS', default=300, cast=int)
+# Typed chunks: items longer than CHUNK_MAX_CHARS are split; reviews shorter than
+# CHUNK_SHORT_REVIEW_CHARS are grouped with others of the same rating
+CHUNK_MAX_CHARS = config('CHUNK_MAX_CHARS', default=1200, cast=int)
+CHUNK_SHORT_REVIEW_CHARS = config('CHUNK_SHORT_REVIEW_CHARS', default=200, cast=int)
+# Hybrid retrieval: BM25 over the same chunks (in-process, one small file per
+# product) fused with vector search by reciprocal rank fusion
+LEXICAL_INDEX_DIR = config('LEXICAL_INDEX_DIR', default=str(BASE_DIR / 'lexical_index'))
+RETRIEVAL_HYBRID = config('RETRIEVAL_HYBRID', default=True, cast=bool)
+RETRIEVAL_CANDIDATES = config('RETRIEVAL_CANDIDATES', default=20, cast=int)
+RETRIEVAL_RRF_K = config('RETRIEVAL_RRF_K', default=60, cast=int)
+QA_TOP_K = config('QA_TOP_K', default=4, cast=int)
+# Query planner: metadata filters (chunk type, rating, review date, helpful votes) inferred from the question
+RETRIEVAL_QUERY_PLANNER = config('RETRIEVAL_QUERY_PLANNER', default=True, cast=bool)
+RETRIEVAL_NEGATIVE_MAX_RATING = config('RETRIEVAL_NEGATIVE_MAX_RATING', default=2.0, cast=float)
+RETRIEVAL_POSITIVE_MIN_RATING = config('RETRIEVAL_POSITIVE_MIN_RATING', default=4.0, cast=float)
+RETRIEVAL_RECENT_DAYS = config('RETRIEVAL_RECENT_DAYS', default=180, cast=int)
+RETRIEVAL_HELPFUL_MIN_VOTES = config('RETRIEVAL_HELPFUL_MIN_VOTES', default=3, cast=int)
+# Prompt budget (tiktoken-counted): history gets at most PROMPT_HISTORY_MAX_TOKENS; messages
+# older than the newest PROMPT_RECENT_MESSAGES are folded into a per-session summary, once
+# at least CHAT_SUMMARY_BATCH_MESSAGES of them have built up (one summarization call per batch)
+PROMPT_MAX_TOKENS = config('PROMPT_MAX_TOKENS', default=2500, cast=int)
+PROMPT_HISTORY_MAX_TOKENS = config('PROMPT_HISTORY_MAX_TOKENS', default=500, cast=int)
+PROMPT_RECENT_MESSAGES = config('PROMPT_RECENT_MESSAGES', default=4, cast=int)
+CHAT_SUMMARY_BATCH_MESSAGES = config('CHAT_SUMMARY_BATCH_MESSAGES', default=4, cast=int)
+CHAT_SUMMARY_MAX_WORDS = config('CHAT_SUMMARY_MAX_WORDS', default=120, cast=int)
+# Intent router: price / stock / brand / spec questions answered from Product fields without RAG
+INTENT_ROUTER_ENABLED = config('INTENT_ROUTER_ENABLED', default=True, cast=bool)
+INTENT_CLASSIFIER_THRESHOLD = config('INTENT_CLASSIFIER_THRESHOLD', default=0.7, cast=float)
+# Answer cache: exact normalised-question tier plus a semantic tier per product
+QA_CACHE_TIMEOUT = config('QA_CACHE_TIMEOUT', default=60 * 60, cast=int)
+QA_SEMANTIC_CACHE_THRESHOLD = config('QA_SEMANTIC_CACHE_THRESHOLD', default=0.95, cast=float)
+QA_SEMANTIC_CACHE_MAX_ENTRIES = config('QA_SEMANTIC_CACHE_MAX_ENTRIES', default=200, cast=int)
+# Products whose semantic index each process keeps in memory
+QA_SEMANTIC_CACHE_LOCAL_PRODUCTS = config('QA_SEMANTIC_CACHE_LOCAL_PRODUCTS', default=256, cast=int)
+
+# Embedding cache (in-process LRU in front of Redis) and query micro-batching
+EMBEDDING_CACHE_TIMEOUT = config('EMBEDDING_CACHE_TIMEOUT', default=7 * 24 * 60 * 60, cast=int)
+EMBEDDING_CACHE_LOCAL_SIZE = config('EMBEDDING_CACHE_LOCAL_SIZE', default=4096, cast=int)
+EMBEDDING_BATCH_WINDOW_MS = config('EMBEDDING_BATCH_WINDOW_MS', default=5, cast=int)
+EMBEDDING_BATCH_MAX_SIZE = config('EMBEDDING_BATCH_MAX_SIZE', default=64, cast=int)
+# Cross-product ingestion batcher: one provider request per drained batch
+EMBEDDING_BATCHER_MAX_TOKENS = config('EMBEDDING_BATCHER_MAX_TOKENS', default=250000, cast=int)
+EMBEDDING_BATCHER_MAX_INPUTS = config('EMBEDDING_BATCHER_MAX_INPUTS', default=1000, cast=int)
+# A chunk whose batch failed this many times is dead-lettered and fails its product
+EMBEDDING_BATCHER_MAX_ATTEMPTS = config('EMBEDDING_BATCHER_MAX_ATTEMPTS', default=3, cast=int)
+EMBEDDING_UPSERT_BATCH_SIZE = config('EMBEDDING_UPSERT_BATCH_SIZE', default=100, cast=int)
+
+# Buy-box (price/availability) refresh: (min user questions over the last
+# PRICE_REFRESH_POPULARITY_DAYS, refresh interval in hours), busiest tier first
+PRICE_REFRESH_TIERS = [(20, 6), (1, 24), (0, 72)]
+PRICE_REFRESH_POPULARITY_DAYS = config('PRICE_REFRESH_POPULARITY_DAYS', default=7, cast=int)
+PRICE_REFRESH_BATCH_LIMIT = config('PRICE_REFRESH_BATCH_LIMIT', default=500, cast=int)
+# A queued refresh that has not run after this long (lost or dead-lettered) is queued again
+PRICE_REFRESH_QUEUED_TIMEOUT_MINUTES = config('PRICE_REFRESH_QUEUED_TIMEOUT_MINUTES', default=120, cast=int)
+
+# Provider rate limits, shared by all workers through Redis token buckets.
+# Concurrency is per process and adapts (AIMD) to 429s up to the max.
+RATE_LIMITS = {
+    'llm': {
+        'requests_per_minute': config('LLM_RATE_LIMIT_RPM', default=1000, cast=int),
+        'tokens_per_minute': config('LLM_RATE_LIMIT_TPM', default=1000000, cast=int),
+        'max_concurrency': config('LLM_MAX_CONCURRENCY', default=16, cast=int),
+    },
+    'embeddings': {
+        'requests_per_minute': config('EMBEDDING_RATE_LIMIT_RPM', default=3000, cast=int),
+        'tokens_per_minute': config('EMBEDDING_RATE_LIMIT_TPM', default=1000000, cast=int),
+        'max_concurrency': config('EMBEDDING_MAX_CONCURRENCY', default=8, cast=int),
+    },
+}
+RATE_LIMIT_MAX_RETRIES = config('RATE_LIMIT_MAX_RETRIES', default=5, cast=int)
+# 5xx / timeout / connection errors (client-side retries are disabled)
+RATE_LIMIT_TRANSIENT_RETRIES = config('RATE_LIMIT_TRANSIENT_RETRIES', default=2, cast=int)
+RATE_LIMIT_MAX_WAIT_SECONDS = config('RATE_LIMIT_MAX_WAIT_SECONDS', default=30, cast=int)
+RATE_LIMIT_BACKOFF_BASE_MS = config('RATE_LIMIT_BACKOFF_BASE_MS', default=500, cast=int)
+RATE_LIMIT_BACKOFF_MAX_MS = config('RATE_LIMIT_BACKOFF_MAX_MS', default=20000, cast=int)
+
+# Scraper browser pool (one Chromium per Celery worker process)
+SCRAPER_BROWSER_MAX_USES = config('SCRAPER_BROWSER_MAX_USES', default=50, cast=int)
+# Chromium is pre-launched only in workers consuming one of these queues
+SCRAPER_BROWSER_PRELAUNCH = config('SCRAPER_BROWSER_PRELAUNCH', default=True, cast=bool)
+SCRAPER_BROWSER_QUEUES = config('SCRAPER_BROWSER_QUEUES', default='scrape').split(',')
+# Fast mode aborts images/fonts/media and third-party hosts, and waits on selectors
+SCRAPER_FAST_MODE = config('SCRAPER_FAST_MODE', default=True, cast=bool)
+# 'browser' extracts with page.evaluate, 'lxml' parses page.content() offline
+SCRAPER_PARSE_ENGINE = config('SCRAPER_PARSE_ENGINE', default='browser')
+SCRAPER_PARSE_WORKERS = config('SCRAPER_PARSE_WORKERS', default=2, cast=int)
+# 'concurrent' loads review pages by URL in parallel (async Playwright) instead of clicking 'Next'
+SCRAPER_REVIEW_FETCH_MODE = config('SCRAPER_REVIEW_FETCH_MODE', default='sequential')
+SCRAPER_REVIEW_CONCURRENCY = config('SCRAPER_REVIEW_CONCURRENCY', default=3, cast=int)
+SCRAPER_REVIEW_HOST_DELAY_MS = config('SCRAPER_REVIEW_HOST_DELAY_MS', default=250, cast=int)
+# The concurrent fetcher is a second Chromium per worker; below this much free memory reviews are paginated sequentially
+SCRAPER_REVIEW_FETCHER_MIN_FREE_MB = config('SCRAPER_REVIEW_FETCHER_MIN_FREE_MB', default=1024, cast=int)
+SCRAPER_ALLOWED_HOST_SUFFIXES = [
+    'amazon.com', 'amazon.in', 'media-amazon.com', 'ssl-images-amazon.com',
+]
+
+# Raw page archive (content-addressed, zstd-compressed HTML of every fetch)
+PAGE_ARCHIVE_ENABLED = config('PAGE_ARCHIVE_ENABLED', default=True, cast=bool)
+PAGE_ARCHIVE_DIR = config('PAGE_ARCHIVE_DIR', default=str(BASE_DIR / 'page_archive'))
+PAGE_ARCHIVE_COMPRESSION_LEVEL = config('PAGE_ARCHIVE_COMPRESSION_LEVEL', default=10, cast=int)
+PAGE_ARCHIVE_RETENTION_DAYS = config('PAGE_ARCHIVE_RETENTION_DAYS', default=30, cast=int)
+# Name of the archive this host writes, recorded on every snapshot; hosts that
+# share PAGE_ARCHIVE_DIR (one shared volume) must use the same name
+PAGE_ARCHIVE_HOST = config('PAGE_ARCHIVE_HOST', default=socket.gethostname())
+
 # CHROME_DRIVER_PATH = config('CHROME_DRIVER_PATH', default='../Chromedriver/chromedriver.exe')
 # HEADLESS_MODE = config('HEADLESS_MODE', default=True, cast=bool)
 
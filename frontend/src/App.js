@@ -7,7 +7,7 @@ import {
   addProduct, 
   deleteProduct, 
   retryProduct,
-  askQuestion,
+  askQuestionStream,
   pollProductStatus 
 } from './services/api';
 import './App.css';
@@ -161,20 +161,42 @@ function App() {
     setIsSendingMessage(true);
     
     try {
-      const response = await askQuestion(selectedProduct.id, question, sessionId);
+      // Placeholder assistant message filled in as tokens stream in
+      let streamStarted = false;
+      const appendToken = (text) => {
+        if (!streamStarted) {
+          streamStarted = true;
+          setMessages(prev => [...prev, { role: 'assistant', content: text }]);
+          return;
+        }
+        setMessages(prev => {
+          const updated = [...prev];
+          const last = updated[updated.length - 1];
+          updated[updated.length - 1] = { ...last, content: last.content + text };
+          return updated;
+        });
+      };
+
+      const response = await askQuestionStream(selectedProduct.id, question, sessionId, {
+        onSession: (id) => setSessionId(id),
+        onToken: appendToken,
+      });
       
       // Save session ID for conversation continuity
       if (response.session_id) {
         setSessionId(response.session_id);
       }
       
-      // Add assistant response
+      // Replace the streamed text with the final answer and its context
       const assistantMessage = { 
         role: 'assistant', 
         content: response.answer,
         context_chunks: response.context_chunks 
       };
-      setMessages(prev => [...prev, assistantMessage]);
+      setMessages(prev => streamStarted
+        ? [...prev.slice(0, -1), assistantMessage]
+        : [...prev, assistantMessage]
+      );
     } catch (error) {
       console.error('Failed to send message:', error);
       // Add error message
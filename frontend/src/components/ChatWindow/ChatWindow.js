@@ -180,7 +180,8 @@ const ChatWindow = ({
                 </div>
               </div>
             ))}
-            {isLoading && (
+            {/* Typing indicator until the first streamed token arrives */}
+            {isLoading && messages[messages.length - 1]?.role !== 'assistant' && (
               <div className="message assistant">
                 <div className="message-avatar">
                   <Bot size={20} />
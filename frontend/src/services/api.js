@@ -107,6 +107,67 @@ export const askQuestion = async (productId, question, sessionId = null) => {
   return response.data;
 };
 
+/**
+ * Ask a question and stream the answer as it is generated (server-sent events)
+ * @param {string} productId - Product UUID
+ * @param {string} question - User's question
+ * @param {string} sessionId - Optional chat session ID for context
+ * @param {Object} handlers - { onSession, onToken } callbacks
+ * @returns {Promise<Object>} Final payload: { answer, session_id, context_chunks }
+ */
+export const askQuestionStream = async (productId, question, sessionId = null, handlers = {}) => {
+  const { onSession, onToken } = handlers;
+  const payload = { question };
+  if (sessionId) {
+    payload.session_id = sessionId;
+  }
+
+  const response = await fetch(`${API_BASE_URL}/products/${productId}/ask/stream/`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(payload),
+  });
+  if (!response.ok || !response.body) {
+    throw new Error(`Streaming request failed: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary;
+    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+
+      let event = 'message';
+      let data = '';
+      rawEvent.split('\n').forEach((line) => {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      });
+      const parsed = data ? JSON.parse(data) : {};
+
+      if (event === 'session') onSession?.(parsed.session_id);
+      else if (event === 'token') onToken?.(parsed.text);
+      else if (event === 'done') result = parsed;
+      else if (event === 'error') throw new Error(parsed.error || 'Streaming failed');
+    }
+  }
+
+  if (!result) {
+    throw new Error('Stream ended before the answer completed');
+  }
+  return result;
+};
+
 /**
  * Get all chat sessions for a product
  * @param {string} productId - Product UUID
@@ -4,7 +4,7 @@
 
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Product, Review, QuestionAnswer, ChatSession, ChatMessage
+from .models import Product, Review, QuestionAnswer, PageSnapshot, PriceHistory, ChatSession, ChatMessage
 
 
 @admin.register(Product)
@@ -14,15 +14,15 @@ class ProductAdmin(admin.ModelAdmin):
         'vector_count', 'created_at'
     ]
     list_filter = ['status', 'created_at', 'brand']
-    search_fields = ['title', 'brand', 'url']
+    search_fields = ['title', 'brand', 'url', 'canonical_key']
     readonly_fields = [
-        'id', 'pinecone_namespace', 'vector_count',
-        'task_id', 'scraped_at', 'created_at', 'updated_at'
+        'id', 'canonical_key', 'pinecone_namespace', 'vector_count',
+        'task_id', 'scraped_at', 'price_refreshed_at', 'created_at', 'updated_at'
     ]
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('id', 'url', 'title', 'brand')
+            'fields': ('id', 'url', 'canonical_key', 'title', 'brand')
         }),
         ('Pricing', {
             'fields': ('current_price', 'original_price', 'availability')
@@ -36,7 +36,7 @@ class ProductAdmin(admin.ModelAdmin):
         ('Scraping Status', {
             'fields': (
                 'status', 'task_id', 'error_message',
-                'scraped_at', 'created_at', 'updated_at'
+                'scraped_at', 'price_refreshed_at', 'created_at', 'updated_at'
             )
         }),
         ('Vector Database', {
@@ -63,7 +63,7 @@ class ProductAdmin(admin.ModelAdmin):
     actions = ['retry_scraping']
     
     def retry_scraping(self, request, queryset):
-        from .tasks import scrape_and_embed_product
+        from .tasks import start_product_pipeline
         
         count = 0
         for product in queryset.filter(status='failed'):
@@ -71,7 +71,7 @@ class ProductAdmin(admin.ModelAdmin):
             product.error_message = None
             product.save()
             
-            task = scrape_and_embed_product.delay(str(product.id))
+            task = start_product_pipeline(product.id)
             product.task_id = task.id
             product.save()
             count += 1
@@ -102,6 +102,27 @@ class QuestionAnswerAdmin(admin.ModelAdmin):
     question_preview.short_description = 'Question'
 
 
+@admin.register(PageSnapshot)
+class PageSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['product', 'page_type', 'page_number', 'fetched_at', 'raw_size', 'compressed_size', 'unchanged']
+    list_filter = ['page_type', 'unchanged', 'fetched_at']
+    search_fields = ['url', 'content_hash']
+    readonly_fields = ['id', 'content_hash', 'raw_size', 'compressed_size']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
+@admin.register(PriceHistory)
+class PriceHistoryAdmin(admin.ModelAdmin):
+    list_display = ['product', 'current_price', 'original_price', 'availability', 'recorded_at']
+    list_filter = ['recorded_at']
+    search_fields = ['product__title', 'product__url']
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product')
+
+
 class ChatMessageInline(admin.TabularInline):
     model = ChatMessage
     extra = 0
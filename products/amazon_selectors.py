@@ -0,0 +1,41 @@
+"""CSS selectors for Amazon product and review pages, shared by every extraction engine."""
+
+SELECTORS = {
+    'title': '#productTitle',
+    'current_price': '.a-price .a-offscreen',
+    'original_price': '.a-text-price .a-offscreen',
+    'features': '#feature-bullets',
+    'brand': '#bylineInfo',
+    'availability': '#availability',
+    'variants': '#variation_size_name li, #variation_color_name li',
+    'qa': '#ask-btf_feature_div .a-section',
+    'categories': '#wayfinding-breadcrumbs_feature_div a',
+    'shipping_info': '#mir-layout-DELIVERY_BLOCK',
+    'sales_rank': '#SalesRank',
+    'specification_rows': [
+        '#productDetails_techSpec_section_1 tr',
+        '#productDetails_detailBullets_sections1 tr',
+        '#prodDetails tr',
+        '.prodDetTable tr',
+    ],
+    'specification_key': 'td:first-child, th',
+    'specification_value': 'td:last-child',
+    'related_products': [
+        "[data-automation-id='related-products'] a",
+        '#similarities a',
+    ],
+    'reviews_section': '#customerReviews',
+    'see_all_reviews': "a[data-hook='see-all-reviews-link']",
+    'review': '.a-section.review, #cm-cr-dp-review-list .review',
+    'review_title': '.review-title',
+    'review_text': '.a-expander-content.reviewText.review-text-content.a-expander-partial-collapse-content',
+    'review_rating': '.review-rating',
+    'review_customer_name': 'span.a-profile-name',
+    'review_helpful_votes': '.a-size-small.a-color-secondary',
+    'review_date': "[data-hook='review-date'], .review-date",
+    'next_reviews_page': 'li.a-last a',
+}
+
+QA_LIMIT = 10
+RELATED_PRODUCTS_LIMIT = 10
+
@@ -0,0 +1,71 @@
+"""Amazon URL helpers: ASIN extraction and derived page URLs."""
+import re
+from urllib.parse import urlencode, urlparse
+
+# ASINs are 10 upper-case alphanumerics, found after one of these path segments
+_ASIN_RE = re.compile(
+    r'/(?:dp|gp/product|gp/aw/d|product-reviews|exec/obidos/ASIN)/([A-Z0-9]{10})(?:[/?#]|$)',
+    re.IGNORECASE
+)
+
+# Marketplaces products can be added from (the host or any subdomain of it)
+MARKETPLACE_DOMAINS = ('amazon.com', 'amazon.in')
+
+
+def marketplace(url):
+    """The marketplace domain a URL belongs to ('amazon.com', 'amazon.in'), or None"""
+    host = (urlparse(url).hostname or '').lower()
+    for domain in MARKETPLACE_DOMAINS:
+        if host == domain or host.endswith(f".{domain}"):
+            return domain
+    return None
+
+
+def is_amazon_url(url):
+    return marketplace(url) is not None
+
+
+def extract_asin(url):
+    """Return the upper-cased ASIN in an Amazon product URL, or None"""
+    match = _ASIN_RE.search(urlparse(url).path + '/')
+    return match.group(1).upper() if match else None
+
+
+def base_url(url):
+    """scheme://host of a URL (the Amazon marketplace)"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme or 'https'}://{parsed.netloc}"
+
+
+def review_page_url(product_url, page_number):
+    """
+    URL of the n-th (1-based) page of a product's dedicated review list,
+    or None when the product URL carries no ASIN
+    """
+    asin = extract_asin(product_url)
+    if asin is None:
+        return None
+    query = urlencode({'pageNumber': page_number, 'reviewerType': 'all_reviews'})
+    return f"{base_url(product_url)}/product-reviews/{asin}/?{query}"
+
+
+def canonical_key(url):
+    """
+    '<marketplace>:<ASIN>' identifying one product on one marketplace
+    whatever slug, tracking parameters or subdomain the URL has.
+    Returns None for non-Amazon URLs and URLs without an ASIN.
+    """
+    asin = extract_asin(url)
+    domain = marketplace(url)
+    if asin is None or domain is None:
+        return None
+    return f"{domain}:{asin}"
+
+
+def canonical_product_url(url):
+    """https://www.<marketplace>/dp/<ASIN> for an Amazon product URL, or None (see canonical_key)"""
+    key = canonical_key(url)
+    if key is None:
+        return None
+    domain, asin = key.split(':')
+    return f"https://www.{domain}/dp/{asin}"
@@ -0,0 +1,263 @@
+import hashlib
+import logging
+import re
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .embedding_cache import LRUCache
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+metrics.register(
+    'qa_cache.exact_hits', 'qa_cache.semantic_hits', 'qa_cache.misses'
+)
+
+# Add one question embedding to a product's index: the vector, its LRU time
+# and its position in the add log (sequence numbers from one counter, so
+# readers can fetch just what was added since they last looked).
+# Returns the index size.
+_ADD = """
+local seq = redis.call('INCR', KEYS[4])
+redis.call('HSET', KEYS[1], ARGV[1], ARGV[2])
+redis.call('ZADD', KEYS[2], ARGV[3], ARGV[1])
+redis.call('ZADD', KEYS[3], seq, ARGV[1])
+for i = 1, 4 do
+    redis.call('EXPIRE', KEYS[i], ARGV[4])
+end
+return redis.call('ZCARD', KEYS[2])
+"""
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """Lowercase, drop punctuation and collapse whitespace"""
+    text = _PUNCTUATION_RE.sub(' ', question.lower())
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+class SemanticAnswerCache:
+    """
+    Two-tier answer cache shared by every worker.
+
+    Tier 1 keys answers (in the Django cache) on a stable hash of the
+    normalised question text. Tier 2 keeps, per product in Redis, the
+    embeddings of recently answered questions and returns the cached answer
+    of the nearest one when its cosine similarity is above
+    ``QA_SEMANTIC_CACHE_THRESHOLD``. The per-product index is a hash of
+    answer key -> embedding plus a sorted set of last-use times, both
+    updated with single atomic commands, so concurrent writers never drop
+    each other's entries. It is capped at ``QA_SEMANTIC_CACHE_MAX_ENTRIES``
+    (least recently used entries are evicted first); answers expire after
+    ``QA_CACHE_TIMEOUT`` seconds and index entries pointing at an expired
+    answer are dropped when met. Every answer key of a product is also kept
+    in a set, so ``invalidate`` can drop them all when the product changes.
+
+    Lookups do not read the whole index each time: every process keeps the
+    index of recently asked products as one packed matrix and only fetches
+    the vectors added since (an add log ordered by a sequence number), or
+    rebuilds it when the product's epoch changes (``invalidate``).
+    """
+
+    def __init__(self, threshold=None, max_entries=None, timeout=None, redis_client=None):
+        self.threshold = threshold if threshold is not None else settings.QA_SEMANTIC_CACHE_THRESHOLD
+        self.max_entries = max_entries or settings.QA_SEMANTIC_CACHE_MAX_ENTRIES
+        self.timeout = timeout or settings.QA_CACHE_TIMEOUT
+        self._redis = redis_client
+        # product id -> (epoch, last add sequence, answer keys, matrix, load time)
+        self._local = LRUCache(settings.QA_SEMANTIC_CACHE_LOCAL_PRODUCTS)
+
+    @property
+    def redis(self):
+        # Resolved lazily: the process-wide client is rebuilt after fork
+        return self._redis or get_redis()
+
+    def answer_key(self, product_id, question):
+        digest = hashlib.sha256(normalize_question(question).encode('utf-8')).hexdigest()
+        return f"qa:{product_id}:{digest[:32]}"
+
+    def vectors_key(self, product_id):
+        return f"qa_index:{product_id}:vectors"
+
+    def lru_key(self, product_id):
+        return f"qa_index:{product_id}:lru"
+
+    def keys_key(self, product_id):
+        return f"qa_index:{product_id}:keys"
+
+    def added_key(self, product_id):
+        return f"qa_index:{product_id}:added"
+
+    def seq_key(self, product_id):
+        return f"qa_index:{product_id}:seq"
+
+    def epoch_key(self, product_id):
+        return f"qa_index:{product_id}:epoch"
+
+    def get_exact(self, product_id, question):
+        """Tier 1: exact match on the normalised question"""
+        result = cache.get(self.answer_key(product_id, question))
+        if result is not None:
+            metrics.incr('qa_cache.exact_hits')
+            logger.info(f"Exact cache hit for question: {question[:50]}")
+        return result
+
+    @staticmethod
+    def _pack(entries, dimension):
+        """Returns: (answer keys, matrix) of the vectors of ``dimension`` floats"""
+        # Vectors from another embedding model (different dimension) are ignored
+        entries = [(key, vector) for key, vector in entries if vector and len(vector) == dimension * 4]
+        matrix = np.frombuffer(b''.join(vector for _, vector in entries), dtype=np.float32)
+        return [key for key, _ in entries], matrix.reshape(len(entries), dimension)
+
+    def _load_index(self, product_id, dimension):
+        """
+        The product's index as (answer keys, matrix), from the in-process copy
+        plus the vectors added since it was taken, or rebuilt from Redis. Copies
+        older than the index TTL are rebuilt, as its counters may have expired.
+        """
+        local = self._local.get(product_id)
+        if local is not None and local[3].shape[1] == dimension and time.monotonic() - local[4] < self.timeout:
+            epoch, seq, keys, matrix, loaded_at = local
+            pipe = self.redis.pipeline()
+            pipe.get(self.epoch_key(product_id))
+            pipe.zrangebyscore(self.added_key(product_id), f"({seq}", '+inf', withscores=True)
+            current_epoch, added = pipe.execute()
+            if current_epoch == epoch:
+                if not added:
+                    return keys, matrix
+                added_keys = [key.decode() for key, _ in added]
+                vectors = self.redis.hmget(self.vectors_key(product_id), added_keys)
+                new_keys, new_matrix = self._pack(zip(added_keys, vectors), dimension)
+                # A re-answered question replaces its old row
+                replaced = set(new_keys)
+                rows = [row for row, key in enumerate(keys) if key not in replaced]
+                keys, matrix = [keys[row] for row in rows] + new_keys, np.vstack([matrix[rows], new_matrix])
+                # Evicted entries stay in the copy until it has grown well past the cap
+                if len(keys) <= 2 * self.max_entries:
+                    self._local.set(product_id, (epoch, int(added[-1][1]), keys, matrix, loaded_at))
+                    return keys, matrix
+
+        pipe = self.redis.pipeline()
+        pipe.get(self.epoch_key(product_id))
+        pipe.zrange(self.added_key(product_id), -1, -1, withscores=True)
+        pipe.hgetall(self.vectors_key(product_id))
+        epoch, last, index = pipe.execute()
+        keys, matrix = self._pack(((key.decode(), vector) for key, vector in index.items()), dimension)
+        self._local.set(product_id, (epoch, int(last[0][1]) if last else 0, keys, matrix, time.monotonic()))
+        return keys, matrix
+
+    def get_similar(self, product_id, embedding):
+        """Tier 2: nearest previously answered question above the threshold"""
+        query = np.array(embedding, dtype=np.float32)
+        query /= np.linalg.norm(query) or 1.0
+
+        keys, matrix = self._load_index(product_id, len(query))
+        if not keys:
+            metrics.incr('qa_cache.misses')
+            return None
+
+        scores = matrix @ query
+
+        stale = []
+        result = None
+        for row in np.argsort(-scores):
+            if scores[row] < self.threshold:
+                break
+            key = keys[row]
+            result = cache.get(key)
+            if result is None:
+                stale.append(key)
+                continue
+
+            # Refresh LRU position
+            self.redis.zadd(self.lru_key(product_id), {key: time.time()}, xx=True)
+            metrics.incr('qa_cache.semantic_hits')
+            logger.info(f"Semantic cache hit (score {scores[row]:.3f}) for product {product_id}")
+            break
+
+        if stale:
+            self._remove(product_id, stale)
+        if result is None:
+            metrics.incr('qa_cache.misses')
+        return result
+
+    def set(self, product_id, question, result, embedding=None):
+        """Store an answer in tier 1 and, when an embedding is given, tier 2"""
+        key = self.answer_key(product_id, question)
+        cache.set(key, result, timeout=self.timeout)
+
+        pipe = self.redis.pipeline()
+        pipe.sadd(self.keys_key(product_id), key)
+        pipe.expire(self.keys_key(product_id), self.timeout)
+        pipe.execute()
+        if embedding is None:
+            return
+
+        vector = np.array(embedding, dtype=np.float32)
+        vector /= np.linalg.norm(vector) or 1.0
+        size = self.redis.register_script(_ADD)(
+            keys=[
+                self.vectors_key(product_id), self.lru_key(product_id),
+                self.added_key(product_id), self.seq_key(product_id)
+            ],
+            args=[key, vector.tobytes(), time.time(), self.timeout]
+        )
+
+        # LRU eviction; ZPOPMIN hands each evicted entry to exactly one writer
+        if size > self.max_entries:
+            evicted = self.redis.zpopmin(self.lru_key(product_id), size - self.max_entries)
+            if evicted:
+                members = [member for member, _ in evicted]
+                pipe = self.redis.pipeline()
+                pipe.hdel(self.vectors_key(product_id), *members)
+                pipe.zrem(self.added_key(product_id), *members)
+                pipe.execute()
+
+    def _remove(self, product_id, keys):
+        pipe = self.redis.pipeline()
+        pipe.hdel(self.vectors_key(product_id), *keys)
+        pipe.zrem(self.lru_key(product_id), *keys)
+        pipe.zrem(self.added_key(product_id), *keys)
+        pipe.srem(self.keys_key(product_id), *keys)
+        pipe.execute()
+        # Other processes drop them from their copies when they meet them
+        local = self._local.get(product_id)
+        if local is not None:
+            epoch, seq, local_keys, matrix, loaded_at = local
+            rows = [row for row, key in enumerate(local_keys) if key not in keys]
+            self._local.set(product_id, (epoch, seq, [local_keys[row] for row in rows], matrix[rows], loaded_at))
+
+    def invalidate(self, product_id):
+        """
+        Drop every cached answer of a product and its semantic index
+        (after a re-scrape, re-embed or price change)
+        """
+        keys_key = self.keys_key(product_id)
+        pipe = self.redis.pipeline()
+        pipe.smembers(keys_key)
+        pipe.delete(
+            keys_key, self.vectors_key(product_id), self.lru_key(product_id), self.added_key(product_id)
+        )
+        # A new epoch makes every process rebuild its copy of the index
+        pipe.incr(self.epoch_key(product_id))
+        pipe.expire(self.epoch_key(product_id), self.timeout)
+        keys = [key.decode() for key in pipe.execute()[0]]
+        if keys:
+            cache.delete_many(keys)
+        logger.info(f"Invalidated {len(keys)} cached answers for product {product_id}")
+        return len(keys)
+
+    def stats(self):
+        counters = metrics.get_counters([
+            'qa_cache.exact_hits', 'qa_cache.semantic_hits', 'qa_cache.misses'
+        ])
+        hits = counters['qa_cache.exact_hits'] + counters['qa_cache.semantic_hits']
+        counters['qa_cache.hit_rate'] = metrics.ratio(hits, hits + counters['qa_cache.misses'])
+        return counters
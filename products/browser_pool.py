@@ -0,0 +1,156 @@
+import logging
+import os
+import threading
+from contextlib import contextmanager
+
+from celery import current_app
+from celery.signals import worker_process_init, worker_process_shutdown
+from django.conf import settings
+from playwright.sync_api import sync_playwright
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.register('browser_pool.launches', 'browser_pool.pages', 'browser_pool.recycles')
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+)
+
+
+class BrowserPool:
+    """
+    Persistent Chromium instance handing out isolated contexts/pages.
+
+    Launching Chromium dominates short scrapes, so one browser is kept per
+    worker process and every scrape gets a fresh browser context (own
+    cookies/cache). The browser is relaunched after ``max_uses`` pages or
+    as soon as it is found disconnected (crash). Sync Playwright objects are
+    bound to the thread that created them, hence one pool per thread.
+    """
+
+    def __init__(self, headless=True, max_uses=None):
+        self.headless = headless
+        self.max_uses = max_uses or settings.SCRAPER_BROWSER_MAX_USES
+        self._playwright = None
+        self._browser = None
+        self._uses = 0
+        self.launches = 0
+        self.pages_served = 0
+
+    def _ensure_browser(self):
+        if self._browser is not None and self._browser.is_connected():
+            return self._browser
+
+        if self._browser is not None:
+            logger.warning("Browser disconnected, relaunching")
+            self._close_browser()
+
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+
+        logger.info("Launching Playwright browser (Chromium)...")
+        self._browser = self._playwright.chromium.launch(
+            headless=self.headless,
+            args=['--no-sandbox', '--disable-setuid-sandbox']
+        )
+        self._uses = 0
+        self.launches += 1
+        metrics.incr('browser_pool.launches')
+        return self._browser
+
+    def start(self):
+        """Launch the browser eagerly (worker start-up)"""
+        self._ensure_browser()
+
+    @contextmanager
+    def page(self):
+        """Yield a page in a fresh context; the context is closed afterwards"""
+        browser = self._ensure_browser()
+        context = browser.new_context(user_agent=USER_AGENT)
+        page = context.new_page()
+        self.pages_served += 1
+        metrics.incr('browser_pool.pages')
+        try:
+            yield page
+        finally:
+            try:
+                context.close()
+            except Exception as e:
+                logger.warning(f"Error closing browser context: {str(e)}")
+
+            self._uses += 1
+            if not browser.is_connected() or self._uses >= self.max_uses:
+                logger.info(f"Recycling browser after {self._uses} uses")
+                metrics.incr('browser_pool.recycles')
+                self._close_browser()
+
+    def _close_browser(self):
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+        self._browser = None
+
+    def close(self):
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+        self._playwright = None
+
+    def stats(self):
+        return {
+            'launches': self.launches,
+            'pages_served': self.pages_served,
+            'reuses': self.pages_served - self.launches,
+        }
+
+
+_local = threading.local()
+
+
+def get_browser_pool():
+    """Browser pool owned by the current thread of the current process"""
+    pool = getattr(_local, 'pool', None)
+    if pool is None or getattr(_local, 'pid', None) != os.getpid():
+        pool = BrowserPool()
+        _local.pool = pool
+        _local.pid = os.getpid()
+    return pool
+
+
+def close_browser_pool():
+    pool = getattr(_local, 'pool', None)
+    if pool is not None and getattr(_local, 'pid', None) == os.getpid():
+        pool.close()
+        logger.info(f"Browser pool stats: {pool.stats()}")
+    _local.pool = None
+
+
+def _consumes_browser_queue():
+    """Whether this worker reads one of SCRAPER_BROWSER_QUEUES (set with -Q, inherited on fork)"""
+    consumed = set(current_app.amqp.queues.consume_from)
+    return bool(consumed & set(settings.SCRAPER_BROWSER_QUEUES))
+
+
+@worker_process_init.connect
+def _start_pool_on_worker_init(**kwargs):
+    # The parent's pool (if any) is not usable after fork
+    _local.pool = None
+    # Parse, embed and default-queue workers never scrape: no Chromium for them
+    if settings.SCRAPER_BROWSER_PRELAUNCH and _consumes_browser_queue():
+        try:
+            get_browser_pool().start()
+        except Exception as e:
+            logger.error(f"Could not pre-launch browser: {str(e)}", exc_info=True)
+
+
+@worker_process_shutdown.connect
+def _close_pool_on_worker_shutdown(**kwargs):
+    close_browser_pool()
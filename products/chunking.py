@@ -0,0 +1,158 @@
+import re
+
+from django.conf import settings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .models import QuestionAnswer, Review
+from .parsers import parse_review_date
+
+# Chunk types, also stored as metadata['type'] for filtered queries
+OVERVIEW = 'overview'
+SPECIFICATIONS = 'specifications'
+REVIEW = 'review'
+QA = 'qa'
+
+_WORD_NUMBERS = {'one': 1, 'a': 1, 'an': 1}
+
+
+def parse_rating(rating):
+    """'4.0 out of 5 stars' -> 4.0; None when there is no number"""
+    match = re.search(r"\d+(?:[.,]\d+)?", rating or '')
+    return float(match.group().replace(',', '.')) if match else None
+
+
+def review_date_key(date_text):
+    """Review date as a YYYYMMDD integer (range-filterable in every vector store), or None"""
+    review_date = parse_review_date(date_text)
+    return int(review_date.strftime('%Y%m%d')) if review_date else None
+
+
+def parse_helpful_votes(helpful_votes):
+    """'1,234 people found this helpful' -> 1234, 'One person ...' -> 1; 0 when absent"""
+    text = (helpful_votes or '').strip().lower()
+    match = re.search(r"\d[\d,]*", text)
+    if match:
+        return int(match.group().replace(',', ''))
+    first = text.split(' ', 1)[0] if text else ''
+    return _WORD_NUMBERS.get(first, 0)
+
+
+class ProductChunker:
+    """
+    Typed chunks built from the structured product_data rather than from
+    one concatenated string: an overview (title, brand, features),
+    the specification table, one chunk per review (short reviews with the
+    same star rating are grouped) and one per Q&A. Each chunk carries
+    flat metadata (type, rating, helpful votes, review date, review / Q&A
+    ids) that the vector store can filter on; a group of short reviews
+    records its highest vote count and newest date. Items longer than ``CHUNK_MAX_CHARS`` are
+    split, keeping their metadata.
+    """
+
+    def __init__(self, max_chars=None, short_review_chars=None):
+        self.max_chars = max_chars or settings.CHUNK_MAX_CHARS
+        self.short_review_chars = short_review_chars or settings.CHUNK_SHORT_REVIEW_CHARS
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=self.max_chars, chunk_overlap=100)
+
+    def _emit(self, chunks, text, metadata):
+        """Append one chunk, or several parts when the text is too long"""
+        text = text.strip()
+        if not text:
+            return
+        parts = [text] if len(text) <= self.max_chars else self.splitter.split_text(text)
+        for part, part_text in enumerate(parts):
+            chunks.append({
+                'text': part_text,
+                'metadata': {**metadata, 'part': part} if len(parts) > 1 else dict(metadata),
+            })
+
+    def _overview(self, chunks, product_data):
+        # Price and stock change between price refreshes; they are answered from the product row
+        lines = []
+        if product_data.get('title'):
+            lines.append(f"Title: {product_data['title']}")
+        if product_data.get('brand'):
+            lines.append(f"Brand: {product_data['brand']}")
+        if product_data.get('features'):
+            lines.append(f"Features:\n{product_data['features']}")
+        self._emit(chunks, "\n".join(lines), {'type': OVERVIEW})
+
+    def _specifications(self, chunks, product_data):
+        specifications = product_data.get('specifications') or {}
+        if not specifications:
+            return
+        # Split between rows, never inside one
+        block = []
+        for key, value in specifications.items():
+            line = f"  {key}: {value}"
+            if block and len("\n".join(block + [line])) > self.max_chars:
+                self._emit(chunks, "Specifications:\n" + "\n".join(block), {'type': SPECIFICATIONS})
+                block = []
+            block.append(line)
+        self._emit(chunks, "Specifications:\n" + "\n".join(block), {'type': SPECIFICATIONS})
+
+    @staticmethod
+    def _review_text(review):
+        # Helpful votes change between scrapes: metadata only. The chunk id (chunk_hash covers the
+        # metadata) still changes with them, but the unchanged text is served by the embedding cache
+        review_date = parse_review_date(review.get('date'))
+        dated = f", {review_date.isoformat()}" if review_date else ''
+        return (
+            f"Review by {review.get('customer_name') or 'Anonymous'} "
+            f"(Rating: {review.get('rating') or 'N/A'}{dated}): "
+            f"{review.get('title') or ''} - {review.get('text') or ''}"
+        )
+
+    def _reviews(self, chunks, product_data):
+        groups = {}  # rating -> (texts, review ids, helpful votes, dates) of pending short reviews
+
+        def review_metadata(rating, review_ids, votes, dates):
+            metadata = {'type': REVIEW, 'review_ids': review_ids, 'helpful_votes': max(votes)}
+            if rating is not None:
+                metadata['rating'] = rating
+            dates = [date for date in dates if date]
+            if dates:
+                metadata['review_date'] = max(dates)
+            return metadata
+
+        def flush(rating):
+            texts, review_ids, votes, dates = groups.pop(rating)
+            self._emit(chunks, "\n".join(texts), review_metadata(rating, review_ids, votes, dates))
+
+        for review in product_data.get('reviews') or []:
+            text = self._review_text(review)
+            rating = parse_rating(review.get('rating'))
+            review_id = Review.compute_content_hash(review)
+            votes = parse_helpful_votes(review.get('helpful_votes'))
+            date = review_date_key(review.get('date'))
+            if len(review.get('text') or '') >= self.short_review_chars:
+                self._emit(chunks, text, review_metadata(rating, [review_id], [votes], [date]))
+                continue
+            if rating in groups and len("\n".join(groups[rating][0] + [text])) > self.max_chars:
+                flush(rating)
+            texts, review_ids, group_votes, dates = groups.setdefault(rating, ([], [], [], []))
+            texts.append(text)
+            review_ids.append(review_id)
+            group_votes.append(votes)
+            dates.append(date)
+        for rating in list(groups):
+            flush(rating)
+
+    def _questions(self, chunks, product_data):
+        for qa_text in product_data.get('qa') or []:
+            self._emit(chunks, f"Q&A: {qa_text}", {
+                'type': QA, 'qa_id': QuestionAnswer.compute_content_hash(qa_text)
+            })
+
+    def build(self, product_data):
+        """Returns: list of {'text', 'metadata'} chunks in document order"""
+        chunks = []
+        self._overview(chunks, product_data)
+        self._specifications(chunks, product_data)
+        self._reviews(chunks, product_data)
+        self._questions(chunks, product_data)
+        return chunks
+
+
+def build_chunks(product_data):
+    return ProductChunker().build(product_data)
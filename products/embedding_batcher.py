@@ -0,0 +1,321 @@
+import json
+import logging
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+
+from . import metrics
+from .rate_limit import RateLimitExceeded
+from .redis_client import get_redis
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+metrics.register(
+    'embedding_batcher.requests', 'embedding_batcher.chunks',
+    'embedding_batcher.tokens', 'embedding_batcher.upserts',
+    'embedding_batcher.retries', 'embedding_batcher.dead_lettered'
+)
+
+QUEUE_KEY = 'embed_batcher:queue'
+PROCESSING_KEY = 'embed_batcher:processing'
+LOCK_KEY = 'embed_batcher:lock'
+# Job completions / failures waiting for their callback (acknowledged once it ran)
+OUTBOX_KEY = 'embed_batcher:outbox'
+# Chunks that failed EMBEDDING_BATCHER_MAX_ATTEMPTS times, kept for inspection
+DEAD_LETTER_KEY = 'embed_batcher:dead_letter'
+DEAD_LETTER_MAX = 1000
+
+# Move items from the queue head to the processing list while they fit the
+# request budget (always at least one, so an oversized chunk cannot block).
+# A chunk that already failed is sent on its own, so a bad input only takes
+# down its own product.
+_POP_BATCH = """
+local items = {}
+local tokens = 0
+while #items < tonumber(ARGV[2]) do
+    local raw = redis.call('LINDEX', KEYS[1], 0)
+    if not raw then break end
+    local item = cjson.decode(raw)
+    local retried = (item['attempts'] or 0) > 0
+    if #items > 0 and (retried or tokens + item['tokens'] > tonumber(ARGV[1])) then break end
+    redis.call('RPUSH', KEYS[2], redis.call('LPOP', KEYS[1]))
+    tokens = tokens + item['tokens']
+    items[#items + 1] = raw
+    if retried then break end
+end
+return items
+"""
+
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def job_key(job_id):
+    return f"embed_batcher:job:{job_id}"
+
+
+def pending_key(job_id):
+    return f"embed_batcher:pending:{job_id}"
+
+
+def product_job_key(product_id):
+    """Id of the product's newest job"""
+    return f"embed_batcher:product:{product_id}"
+
+
+class EmbeddingBatcher:
+    """
+    Redis-backed queue that embeds chunks of many products together.
+
+    The embed stage enqueues a product's new chunks as one job; a single
+    drainer at a time (Redis lock) pops as many queued chunks as fit in one
+    provider request (``EMBEDDING_BATCHER_MAX_TOKENS`` tokens, counted with
+    tiktoken, and ``EMBEDDING_BATCHER_MAX_INPUTS`` inputs) regardless of
+    product, upserts the vectors per namespace in batches of
+    ``EMBEDDING_UPSERT_BATCH_SIZE`` and counts down each job's pending
+    chunks. Popped chunks sit in a processing list until their batch is
+    stored, so a crashed drainer's chunks are re-queued by the next one.
+
+    A batch that fails (other than on a rate limit) is re-queued with each
+    chunk's attempt count raised; retried chunks are then sent one at a
+    time, and a chunk that has failed ``EMBEDDING_BATCHER_MAX_ATTEMPTS``
+    times is moved to a dead-letter list and fails its job. Finished and
+    failed jobs go through an outbox that is only acknowledged once their
+    callback has run, so a failing callback is retried by the next drain.
+
+    A product has one live job: ``supersede`` (called before enqueueing a
+    newer plan) forgets the previous one, so its queued chunks are skipped
+    and its stale manifest never completes.
+    """
+
+    def __init__(self, embedding_service, redis_client=None):
+        self.embedding_service = embedding_service
+        self.redis = redis_client or get_redis()
+        self.max_tokens = settings.EMBEDDING_BATCHER_MAX_TOKENS
+        self.max_inputs = settings.EMBEDDING_BATCHER_MAX_INPUTS
+        self.upsert_batch_size = settings.EMBEDDING_UPSERT_BATCH_SIZE
+        self.max_attempts = settings.EMBEDDING_BATCHER_MAX_ATTEMPTS
+        self.lock_timeout = 300
+        self._pop_batch = self.redis.register_script(_POP_BATCH)
+        self._release_lock = self.redis.register_script(_RELEASE_LOCK)
+
+    # --- Producer side ---
+
+    def enqueue(self, product_id, chunks, job):
+        """
+        Queue a product's chunks (plan chunks: hash/index/text/metadata). ``job`` is
+        stored and handed to the completion callback once every chunk is in
+        the vector store.
+        Returns: the job id
+        """
+        job_id = uuid.uuid4().hex
+        namespace = self.embedding_service.create_namespace(str(product_id))
+        items = [
+            json.dumps({
+                'job_id': job_id,
+                'product_id': str(product_id),
+                'namespace': namespace,
+                'hash': chunk['hash'],
+                'index': chunk['index'],
+                'text': chunk['text'],
+                'metadata': chunk.get('metadata', {}),
+                'tokens': count_tokens(chunk['text']),
+            })
+            for chunk in chunks
+        ]
+        ttl = 7 * 24 * 3600
+        pipe = self.redis.pipeline()
+        pipe.set(job_key(job_id), json.dumps({**job, 'product_id': str(product_id)}), ex=ttl)
+        pipe.set(pending_key(job_id), len(items), ex=ttl)
+        pipe.set(product_job_key(product_id), job_id, ex=ttl)
+        pipe.rpush(QUEUE_KEY, *items)
+        pipe.execute()
+        logger.info(f"Queued {len(items)} chunks of product {product_id} for embedding (job {job_id})")
+        return job_id
+
+    def supersede(self, product_id):
+        """
+        Forget the product's unfinished job, if any: chunks it still has
+        queued are skipped and it neither completes nor fails
+        Returns: the superseded job, or None
+        """
+        job_id = self.redis.get(product_job_key(product_id))
+        if job_id is None:
+            return None
+        job_id = job_id.decode() if isinstance(job_id, bytes) else job_id
+        pipe = self.redis.pipeline()
+        pipe.get(job_key(job_id))
+        pipe.delete(job_key(job_id), pending_key(job_id), product_job_key(product_id))
+        job, _ = pipe.execute()
+        if job is None:
+            return None
+        logger.info(f"Superseded embedding job {job_id} of product {product_id}")
+        return json.loads(job)
+
+    def queue_length(self):
+        return self.redis.llen(QUEUE_KEY)
+
+    # --- Consumer side ---
+
+    def _acquire_lock(self):
+        token = uuid.uuid4().hex
+        if self.redis.set(LOCK_KEY, token, nx=True, ex=self.lock_timeout):
+            return token
+        return None
+
+    def _requeue_processing(self):
+        """Put chunks left in the processing list (failed/crashed batch) back at the queue head"""
+        leftovers = self.redis.lrange(PROCESSING_KEY, 0, -1)
+        if leftovers:
+            pipe = self.redis.pipeline()
+            pipe.lpush(QUEUE_KEY, *reversed(leftovers))
+            pipe.delete(PROCESSING_KEY)
+            pipe.execute()
+            logger.warning(f"Re-queued {len(leftovers)} chunks from an unfinished batch")
+
+    def _fail_batch(self, raw_items, error):
+        """
+        Re-queue a failed batch with attempt counts raised; chunks out of
+        attempts are dead-lettered and their jobs failed
+        Returns: number of chunks dead-lettered
+        """
+        retry, dead = [], []
+        for raw in raw_items:
+            item = json.loads(raw)
+            item['attempts'] = item.get('attempts', 0) + 1
+            (dead if item['attempts'] >= self.max_attempts else retry).append(item)
+
+        pipe = self.redis.pipeline()
+        if retry:
+            pipe.lpush(QUEUE_KEY, *[json.dumps(item) for item in reversed(retry)])
+        pipe.delete(PROCESSING_KEY)
+        for item in dead:
+            pipe.lpush(DEAD_LETTER_KEY, json.dumps({**item, 'error': error}))
+        if dead:
+            pipe.ltrim(DEAD_LETTER_KEY, 0, DEAD_LETTER_MAX - 1)
+        for job_id in {item['job_id'] for item in dead}:
+            self._close_job(pipe, job_id, 'failed', error)
+        pipe.execute()
+
+        if retry:
+            metrics.incr('embedding_batcher.retries', len(retry))
+            logger.warning(f"Re-queued {len(retry)} chunks after a failed batch: {error}")
+        if dead:
+            metrics.incr('embedding_batcher.dead_lettered', len(dead))
+            logger.error(
+                f"Dead-lettered {len(dead)} chunks after {self.max_attempts} attempts: {error}"
+            )
+        return len(dead)
+
+    def _close_job(self, pipe, job_id, event, error=None):
+        """Queue a job's completion (or failure) in the outbox and forget the job, atomically"""
+        job = self.redis.get(job_key(job_id))
+        if job is None:
+            return  # Already closed, or superseded by a newer job for the product
+        pipe.rpush(OUTBOX_KEY, json.dumps({'event': event, 'job': json.loads(job), 'error': error}))
+        pipe.delete(job_key(job_id), pending_key(job_id))
+
+    def _flush_outbox(self, on_complete, on_failed):
+        """Run the callbacks of closed jobs; an entry is removed only once its callback succeeded"""
+        while True:
+            raw = self.redis.lindex(OUTBOX_KEY, 0)
+            if raw is None:
+                return
+            entry = json.loads(raw)
+            if entry['event'] == 'complete':
+                on_complete(entry['job'])
+            else:
+                on_failed(entry['job'], entry['error'])
+            self.redis.lrem(OUTBOX_KEY, 1, raw)
+
+    def _process(self, raw_items):
+        items = [json.loads(raw) for raw in raw_items]
+        # Chunks of superseded or failed jobs are dropped without an API call
+        live_jobs = {job_id for job_id in {item['job_id'] for item in items} if self.redis.exists(job_key(job_id))}
+        items = [item for item in items if item['job_id'] in live_jobs]
+        if not items:
+            self.redis.delete(PROCESSING_KEY)
+            return
+        embeddings = self.embedding_service.embeddings.embed_documents([item['text'] for item in items])
+        metrics.incr('embedding_batcher.requests')
+        metrics.incr('embedding_batcher.chunks', len(items))
+        metrics.incr('embeddings.chunks_embedded', len(items))
+        metrics.incr('embedding_batcher.tokens', sum(item['tokens'] for item in items))
+
+        by_namespace = defaultdict(list)
+        for item, embedding in zip(items, embeddings):
+            by_namespace[item['namespace']].append(
+                self.embedding_service.chunk_vector(item['product_id'], item, embedding)
+            )
+        for namespace, vectors in by_namespace.items():
+            for i in range(0, len(vectors), self.upsert_batch_size):
+                self.embedding_service.vector_store.upsert(
+                    vectors=vectors[i:i + self.upsert_batch_size], namespace=namespace
+                )
+                metrics.incr('embedding_batcher.upserts')
+
+        # Everything is stored: acknowledge the batch, then count jobs down
+        done_per_job = defaultdict(int)
+        for item in items:
+            done_per_job[item['job_id']] += 1
+        pipe = self.redis.pipeline()
+        pipe.delete(PROCESSING_KEY)
+        for job_id, done in done_per_job.items():
+            if not self.redis.exists(job_key(job_id)):
+                continue  # Superseded by a newer job, or already failed
+            if self.redis.decrby(pending_key(job_id), done) <= 0:
+                self._close_job(pipe, job_id, 'complete')
+        pipe.execute()
+
+        logger.info(
+            f"Embedded {len(items)} chunks from {len(done_per_job)} jobs "
+            f"into {len(by_namespace)} namespaces"
+        )
+
+    def drain(self, on_complete, on_failed, max_seconds=240):
+        """
+        Embed queued chunks until the queue is empty (or ``max_seconds``).
+        ``on_complete(job)`` runs once all of a job's chunks are stored and
+        ``on_failed(job, error)`` once one of them is dead-lettered.
+        Returns: number of chunks processed, or None if another drainer holds the lock
+        """
+        token = self._acquire_lock()
+        if token is None:
+            return None
+
+        processed = 0
+        started = time.monotonic()
+        try:
+            self._requeue_processing()
+            self._flush_outbox(on_complete, on_failed)
+            while time.monotonic() - started < max_seconds:
+                raw_items = self._pop_batch(
+                    keys=[QUEUE_KEY, PROCESSING_KEY], args=[self.max_tokens, self.max_inputs]
+                )
+                if not raw_items:
+                    break
+                try:
+                    self._process(raw_items)
+                except RateLimitExceeded:
+                    # Not the chunks' fault: retry them as they are
+                    self._requeue_processing()
+                    raise
+                except Exception as e:
+                    if not self._fail_batch(raw_items, str(e)):
+                        raise
+                    # Dead-lettered chunks no longer block the queue: carry on
+                    self._flush_outbox(on_complete, on_failed)
+                    continue
+                processed += len(raw_items)
+                self._flush_outbox(on_complete, on_failed)
+                self.redis.expire(LOCK_KEY, self.lock_timeout)
+        finally:
+            self._release_lock(keys=[LOCK_KEY], args=[token])
+        return processed
@@ -0,0 +1,203 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.register(
+    'embedding_cache.local_hits', 'embedding_cache.remote_hits',
+    'embedding_cache.misses', 'embedding_batcher.batches',
+    'embedding_batcher.queries'
+)
+
+
+class LRUCache:
+    """Small thread-safe in-process LRU"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class MicroBatcher:
+    """
+    Coalesces concurrent single-item calls into one batched call.
+
+    ``submit(item)`` blocks until ``batch_func`` has been called with a list
+    containing the item (and any others submitted within ``window_ms`` of the
+    first one, up to ``max_batch_size``) and returns that item's result.
+    The worker thread is started lazily and restarted after fork.
+    """
+
+    def __init__(self, batch_func, window_ms=5, max_batch_size=64):
+        self.batch_func = batch_func
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._pending = []
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def submit(self, item):
+        if self._pid != os.getpid():
+            self._reset()
+
+        future = Future()
+        with self._condition:
+            self._pending.append((item, future))
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name='embedding-micro-batcher', daemon=True
+                )
+                self._thread.start()
+            self._condition.notify()
+        return future.result()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+                deadline = time.monotonic() + self.window
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch_size]
+                self._pending = self._pending[self.max_batch_size:]
+
+            items = [item for item, _ in batch]
+            try:
+                results = self.batch_func(items)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            metrics.incr('embedding_batcher.batches')
+            metrics.incr('embedding_batcher.queries', len(items))
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+
+class CachedEmbeddings:
+    """
+    Content-hashed cache in front of a LangChain embeddings client.
+
+    Vectors are looked up in an in-process LRU first, then in the shared
+    Django (Redis) cache, and only the remaining texts are sent to the
+    provider. Query and document embeddings share the same cache because
+    OpenAI returns identical vectors for both. Single queries go through a
+    MicroBatcher so concurrent questions are embedded in one request.
+    """
+
+    def __init__(self, embeddings, model_name=None):
+        self.embeddings = embeddings
+        self.model_name = model_name or getattr(embeddings, 'model', 'default')
+        self.timeout = settings.EMBEDDING_CACHE_TIMEOUT
+        self.local = LRUCache(settings.EMBEDDING_CACHE_LOCAL_SIZE)
+        self.batcher = MicroBatcher(
+            self._embed_uncached,
+            window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+            max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE
+        )
+
+    def cache_key(self, text):
+        digest = hashlib.sha256(text.encode('utf-8')).hexdigest()
+        return f"emb:{self.model_name}:{digest}"
+
+    def _lookup(self, texts):
+        """Return {text: vector} for every cached text"""
+        found = {}
+        remote_keys = {}
+        for text in texts:
+            vector = self.local.get(self.cache_key(text))
+            if vector is not None:
+                found[text] = vector
+            else:
+                remote_keys[self.cache_key(text)] = text
+
+        if remote_keys:
+            try:
+                cached = cache.get_many(list(remote_keys))
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed: {str(e)}")
+                cached = {}
+            for key, blob in cached.items():
+                vector = np.frombuffer(blob, dtype=np.float32).tolist()
+                self.local.set(key, vector)
+                found[remote_keys[key]] = vector
+            if cached:
+                metrics.incr('embedding_cache.remote_hits', len(cached))
+
+        local_hits = len(texts) - len(remote_keys)
+        if local_hits:
+            metrics.incr('embedding_cache.local_hits', local_hits)
+        return found
+
+    def _store(self, vectors_by_text):
+        entries = {}
+        for text, vector in vectors_by_text.items():
+            key = self.cache_key(text)
+            self.local.set(key, list(vector))
+            entries[key] = np.asarray(vector, dtype=np.float32).tobytes()
+        try:
+            cache.set_many(entries, timeout=self.timeout)
+        except Exception as e:
+            logger.warning(f"Embedding cache store failed: {str(e)}")
+
+    def _embed_uncached(self, texts):
+        """Embed texts through the provider, deduplicated, and cache them"""
+        unique = list(dict.fromkeys(texts))
+        vectors = self.embeddings.embed_documents(unique)
+        by_text = dict(zip(unique, vectors))
+        self._store(by_text)
+        return [by_text[text] for text in texts]
+
+    def embed_documents(self, texts):
+        found = self._lookup(set(texts))
+        missing = [text for text in dict.fromkeys(texts) if text not in found]
+        if missing:
+            metrics.incr('embedding_cache.misses', len(missing))
+            found.update(zip(missing, self._embed_uncached(missing)))
+        return [found[text] for text in texts]
+
+    def embed_query(self, text):
+        found = self._lookup([text])
+        if text in found:
+            return found[text]
+        metrics.incr('embedding_cache.misses')
+        return self.batcher.submit(text)
@@ -1,121 +1,271 @@
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
-from pinecone import Pinecone
 from django.conf import settings
+from . import metrics
+from .embedding_cache import CachedEmbeddings
+from .lexical_index import LexicalIndexStore, reciprocal_rank_fusion
+from .rate_limit import RateLimitedEmbeddings
+from .vector_stores import get_vector_store
 import logging
 import hashlib
+import json
 
 logger = logging.getLogger(__name__)
 
+metrics.register('embeddings.chunks_embedded', 'embeddings.chunks_unchanged')
+
 
 class EmbeddingService:
-    """Service for creating and managing embeddings in Pinecone"""
-    
-    def __init__(self):
-        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
-        self.index = self.pc.Index(settings.PINECONE_INDEX_NAME)
-        self.embeddings = OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY)
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=800,
-            chunk_overlap=100
+    """Service for creating and managing embeddings in the vector store"""
+    
+    def __init__(self, vector_store=None):
+        self.vector_store = vector_store or get_vector_store()
+        # 429s and transient errors are retried by the shared limiter, not by the client
+        self.embeddings = CachedEmbeddings(
+            RateLimitedEmbeddings(
+                OpenAIEmbeddings(openai_api_key=settings.OPENAI_API_KEY, max_retries=0)
+            )
         )
+        self.lexical_index = LexicalIndexStore()
     
     def create_namespace(self, product_id):
         """Create unique namespace for product"""
         return f"product_{product_id}"
     
-    def split_text(self, text):
-        """Split text into chunks"""
-        if not text:
-            return []
-        return self.text_splitter.split_text(text)
+    def chunk_hash(self, chunk):
+        """
+        Content hash identifying a chunk across re-scrapes; covers the
+        metadata too, so e.g. a changed helpful-vote count re-upserts the
+        vector with fresh metadata (the text, and so the embedding, is
+        unchanged and comes from CachedEmbeddings without an API call)
+        """
+        payload = chunk['text'] + json.dumps(chunk.get('metadata', {}), sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+    
+    def chunk_id(self, product_id, digest):
+        return f"{product_id}_{digest}"
     
-    def create_embeddings(self, product_id, text, batch_size=50):
+    def create_embeddings(self, product_id, chunks, batch_size=50):
         """
-        Create embeddings and store in Pinecone
+        Create embeddings and store in the vector store (full rebuild)
         Returns: number of vectors stored
         """
+        return self.sync_embeddings(product_id, chunks, batch_size=batch_size)['vector_count']
+    
+    def unique_chunks(self, product_id, chunks):
+        """Typed chunks (chunking.build_chunks) as {hash: chunk}, in order; identical chunks collapse to one"""
+        if not chunks:
+            logger.warning(f"No chunks created for product {product_id}")
+        
+        logger.info(f"Created {len(chunks)} chunks for product {product_id}")
+        
+        chunk_by_hash = {}
+        for chunk in chunks:
+            chunk_by_hash.setdefault(self.chunk_hash(chunk), chunk)
+        return chunk_by_hash
+    
+    def index_chunks(self, product_id, chunks):
+        """
+        Rebuild the product's BM25 index over the same chunks (and ids) as
+        its vectors; cheap, so it is always rewritten in full
+        """
+        chunk_by_hash = self.unique_chunks(product_id, chunks)
+        self.lexical_index.write(self.create_namespace(product_id), [
+            {
+                'id': self.chunk_id(product_id, digest),
+                'text': chunk['text'],
+                'metadata': {**chunk['metadata'], 'chunk_index': i, 'chunk_hash': digest},
+            }
+            for i, (digest, chunk) in enumerate(chunk_by_hash.items())
+        ])
+    
+    def plan_sync(self, product_id, chunks, previous_manifest=None, legacy_count=0):
+        """
+        Diff typed chunks against the previous manifest (no API calls)
+        
+        Chunk ids are content hashes, so with the manifest (list of chunk
+        hashes) from the previous run only new chunks need embedding and
+        vanished ones deleting. Without a manifest the plan is a full rebuild;
+        ``legacy_count`` is the number of positional vectors
+        (``<product>_chunk_<i>``) stored before chunk ids were hashes.
+        
+        Returns: JSON-serialisable dict with manifest, chunks (new chunks as
+        hash/index/text/metadata), vanished, rebuild and legacy_count
+        """
+        chunk_by_hash = self.unique_chunks(product_id, chunks)
+        manifest = list(chunk_by_hash)
+        
+        previous = set(previous_manifest or [])
+        return {
+            'manifest': manifest,
+            'chunks': [
+                {
+                    'hash': digest,
+                    'index': i,
+                    'text': chunk_by_hash[digest]['text'],
+                    'metadata': chunk_by_hash[digest]['metadata'],
+                }
+                for i, digest in enumerate(manifest) if digest not in previous
+            ],
+            'vanished': [digest for digest in previous if digest not in chunk_by_hash],
+            'rebuild': previous_manifest is None,
+            'legacy_count': legacy_count if previous_manifest is None else 0,
+        }
+    
+    def chunk_vector(self, product_id, chunk, embedding):
+        """Vector store record for a plan chunk (hash/index/text/metadata)"""
+        return {
+            'id': self.chunk_id(product_id, chunk['hash']),
+            'values': embedding,
+            'metadata': {
+                **chunk.get('metadata', {}),
+                'product_id': str(product_id),
+                'chunk_index': chunk['index'],
+                'chunk_hash': chunk['hash'],
+                # Chunks are bounded by CHUNK_MAX_CHARS, so the full text fits
+                'text': chunk['text']
+            }
+        }
+    
+    def delete_replaced(self, product_id, plan):
+        """
+        Delete the vectors a plan replaces: vanished chunks and, on a
+        rebuild, the legacy positional ids. Call once the new vectors are
+        stored, so the namespace is never missing chunks in between.
+        Returns: number of ids deleted
+        """
+        ids = [self.chunk_id(product_id, digest) for digest in plan['vanished']]
+        ids += [f"{product_id}_chunk_{i}" for i in range(plan.get('legacy_count', 0))]
+        namespace = self.create_namespace(product_id)
+        for i in range(0, len(ids), 1000):
+            self.vector_store.delete(namespace=namespace, ids=ids[i:i + 1000])
+        return len(ids)
+    
+    def apply_sync(self, product_id, plan, batch_size=50):
+        """
+        Embed and upsert the new chunks of a plan, then delete the ones it replaces
+        
+        Safe to re-run: vector ids are content hashes, so a retry overwrites
+        what a failed attempt already upserted.
+        Returns: dict with vector_count, manifest, embedded, deleted, unchanged
+        """
         try:
-            # Split text
-            chunks = self.split_text(text)
-            if not chunks:
-                logger.warning(f"No chunks created for product {product_id}")
-                return 0
-            
-            logger.info(f"Created {len(chunks)} chunks for product {product_id}")
-            
             # Create namespace
             namespace = self.create_namespace(product_id)
             
+            if plan['rebuild'] and not plan.get('legacy_count'):
+                # Nothing is known about the stored ids: clear the namespace first
+                self.delete_vectors(product_id)
+            
+            new_chunks = plan['chunks']
+            
             # Process in batches
             vectors_stored = 0
-            for i in range(0, len(chunks), batch_size):
-                batch = chunks[i:i + batch_size]
+            for i in range(0, len(new_chunks), batch_size):
+                batch = new_chunks[i:i + batch_size]
                 
                 # Generate embeddings
-                embeddings = self.embeddings.embed_documents(batch)
+                embeddings = self.embeddings.embed_documents([chunk['text'] for chunk in batch])
                 
-                # Prepare vectors for Pinecone
-                vectors = []
-                for j, (chunk, embedding) in enumerate(zip(batch, embeddings)):
-                    vector_id = f"{product_id}_chunk_{i+j}"
-                    vectors.append({
-                        'id': vector_id,
-                        'values': embedding,
-                        'metadata': {
-                            'product_id': str(product_id),
-                            'chunk_index': i + j,
-                            'text': chunk[:1000]  # Store first 1000 chars
-                        }
-                    })
+                # Prepare vectors for the vector store
+                vectors = [
+                    self.chunk_vector(product_id, chunk, embedding)
+                    for chunk, embedding in zip(batch, embeddings)
+                ]
                 
-                # Upsert to Pinecone
-                self.index.upsert(vectors=vectors, namespace=namespace)
+                # Upsert to the vector store
+                self.vector_store.upsert(vectors=vectors, namespace=namespace)
                 vectors_stored += len(vectors)
                 
                 logger.info(
                     f"Upserted batch {i//batch_size + 1} "
-                    f"({len(vectors)} vectors) to Pinecone"
+                    f"({len(vectors)} vectors) to the vector store"
                 )
             
+            deleted = self.delete_replaced(product_id, plan)
+            
+            manifest = plan['manifest']
+            unchanged = len(manifest) - len(new_chunks)
+            metrics.incr('embeddings.chunks_embedded', len(new_chunks))
+            metrics.incr('embeddings.chunks_unchanged', unchanged)
             logger.info(
-                f"Successfully stored {vectors_stored} vectors "
-                f"for product {product_id} in namespace {namespace}"
+                f"Synced namespace {namespace} for product {product_id}: "
+                f"{vectors_stored} embedded, {deleted} deleted, "
+                f"{unchanged} unchanged (embed calls saved)"
             )
-            return vectors_stored
+            return {
+                'vector_count': len(manifest),
+                'manifest': manifest,
+                'embedded': vectors_stored,
+                'deleted': deleted,
+                'unchanged': unchanged,
+            }
             
         except Exception as e:
             logger.error(f"Error creating embeddings: {str(e)}", exc_info=True)
             raise
     
-    def query_similar(self, product_id, query_text, top_k=2):
+    def sync_embeddings(self, product_id, chunks, previous_manifest=None, batch_size=50, legacy_count=0):
+        """
+        Bring a product's namespace in line with its chunks (plan_sync + apply_sync)
+        Returns: dict with vector_count, manifest, embedded, deleted, unchanged
+        """
+        plan = self.plan_sync(product_id, chunks, previous_manifest, legacy_count=legacy_count)
+        sync = self.apply_sync(product_id, plan, batch_size=batch_size)
+        self.index_chunks(product_id, chunks)
+        return sync
+    
+    def embed_query(self, query_text):
+        """Embed a single question"""
+        return self.embeddings.embed_query(query_text)
+    
+    def query_similar(self, product_id, query_text, top_k=2, query_embedding=None, hybrid=None,
+                      metadata_filter=None):
         """
         Query similar chunks for a product
+        Pass query_embedding to reuse an embedding computed by the caller
+        
+        ``metadata_filter`` (Pinecone filter syntax over chunk metadata, e.g.
+        {'type': 'review', 'rating': {'$lte': 2}}) is applied inside the
+        vector store and the BM25 index, so top_k is taken among matching
+        chunks instead of over-fetching and discarding.
+        
+        With hybrid retrieval (RETRIEVAL_HYBRID) the vector and BM25
+        candidates (RETRIEVAL_CANDIDATES each) are merged by reciprocal rank
+        fusion, so exact terms such as model numbers or spec keys are found
+        even when the embedding blurs them; 'score' is then the fused score.
         Returns: list of matching chunks with scores
         """
+        hybrid = settings.RETRIEVAL_HYBRID if hybrid is None else hybrid
         try:
             # Create query embedding
-            query_embedding = self.embeddings.embed_query(query_text)
+            if query_embedding is None:
+                query_embedding = self.embed_query(query_text)
             
-            # Query Pinecone
+            # Query the vector store
             namespace = self.create_namespace(product_id)
-            results = self.index.query(
+            candidates = max(top_k, settings.RETRIEVAL_CANDIDATES) if hybrid else top_k
+            results = self.vector_store.query(
                 vector=query_embedding,
-                top_k=top_k,
+                top_k=candidates,
                 namespace=namespace,
-                include_metadata=True
+                metadata_filter=metadata_filter
             )
             
             # Extract results
             matches = []
-            for match in results.matches:
+            for match in results:
                 matches.append({
-                    'id': match.id,
-                    'score': match.score,
-                    'text': match.metadata.get('text', ''),
-                    'chunk_index': match.metadata.get('chunk_index', 0)
+                    'id': match['id'],
+                    'score': match['score'],
+                    'text': match['metadata'].get('text', ''),
+                    'chunk_index': match['metadata'].get('chunk_index', 0),
+                    'type': match['metadata'].get('type')
                 })
             
+            if hybrid:
+                lexical = self.lexical_index.search(namespace, query_text, candidates, metadata_filter)
+                matches = self._fuse(matches, lexical, top_k)
+            
             logger.info(f"Found {len(matches)} matches for query: {query_text[:50]}")
             return matches
             
@@ -123,11 +273,31 @@ class EmbeddingService:
             logger.error(f"Error querying embeddings: {str(e)}", exc_info=True)
             raise
     
+    def _fuse(self, dense, lexical, top_k):
+        """Reciprocal rank fusion of vector matches and BM25 hits"""
+        if not lexical:
+            return dense[:top_k]
+        by_id = {hit['id']: {
+            'id': hit['id'],
+            'text': hit['text'],
+            'chunk_index': hit['metadata'].get('chunk_index', 0),
+            'type': hit['metadata'].get('type'),
+        } for hit in lexical}
+        for match in dense:
+            by_id[match['id']] = {**match, 'vector_score': match['score'], **by_id.get(match['id'], {})}
+        fused = reciprocal_rank_fusion([dense, lexical], k=settings.RETRIEVAL_RRF_K)
+        return [{**by_id[chunk_id], 'score': score} for chunk_id, score in fused[:top_k]]
+    
+    def delete_vectors(self, product_id):
+        """Drop the product's vectors only (rebuild); the lexical index is rebuilt separately"""
+        self.vector_store.delete(namespace=self.create_namespace(product_id), delete_all=True)
+    
     def delete_product_embeddings(self, product_id):
         """Delete all embeddings for a product"""
         try:
             namespace = self.create_namespace(product_id)
-            self.index.delete(delete_all=True, namespace=namespace)
+            self.vector_store.delete(namespace=namespace, delete_all=True)
+            self.lexical_index.delete(namespace)
             logger.info(f"Deleted all vectors for product {product_id}")
         except Exception as e:
             logger.error(f"Error deleting embeddings: {str(e)}", exc_info=True)
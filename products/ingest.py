@@ -0,0 +1,107 @@
+import csv
+import io
+import logging
+
+from django.conf import settings
+
+from . import metrics
+from .amazon_urls import canonical_key, canonical_product_url
+from .models import Product
+from .tasks import enqueue_product_pipelines
+
+logger = logging.getLogger(__name__)
+
+metrics.register('ingest.urls_received', 'ingest.products_created', 'ingest.duplicates', 'ingest.invalid')
+
+# How many rows each existence check / bulk INSERT covers
+INSERT_BATCH_SIZE = 1000
+
+
+def read_csv_urls(uploaded_file):
+    """
+    URLs from an uploaded CSV: the 'url' column when the first row is a
+    header naming one, else the first column of every row
+    """
+    text = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', errors='replace')
+    rows = [row for row in csv.reader(text) if row]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if 'url' in header:
+        column = header.index('url')
+        rows = rows[1:]
+    else:
+        column = 0
+    return [row[column].strip() for row in rows if len(row) > column and row[column].strip()]
+
+
+def ingest_urls(urls, priority='bulk'):
+    """
+    Create products for many Amazon URLs and queue their pipelines.
+
+    URLs are reduced to their marketplace + ASIN key so variants of one
+    product collapse to a single row; products that already exist under
+    that key are left alone. Rows are inserted with
+    bulk_create(ignore_conflicts=True), so a concurrent insert of the same
+    product is skipped rather than failing the batch, and the new
+    products are queued in batches of ``INGEST_ENQUEUE_BATCH_SIZE`` at the
+    given priority ('interactive' or 'bulk').
+    Returns: summary dict (counts, invalid URLs, created product ids)
+    """
+    canonical = {}
+    invalid = []
+    duplicates = 0
+    for raw in urls:
+        key = canonical_key(raw)
+        if key is None:
+            invalid.append(raw)
+        elif key in canonical:
+            duplicates += 1
+        else:
+            canonical[key] = canonical_product_url(raw)
+
+    keys = list(canonical)
+    created_ids = []
+    existing = 0
+    for i in range(0, len(keys), INSERT_BATCH_SIZE):
+        batch = keys[i:i + INSERT_BATCH_SIZE]
+        known = set(Product.objects.filter(canonical_key__in=batch).values_list('canonical_key', flat=True))
+        new_products = [
+            Product(url=canonical[key], canonical_key=key, status='pending')
+            for key in batch if key not in known
+        ]
+        Product.objects.bulk_create(new_products, ignore_conflicts=True)
+        # ids are generated client-side; keep only the rows that were actually inserted
+        inserted = list(
+            Product.objects.filter(id__in=[product.id for product in new_products]).values_list('id', flat=True)
+        )
+        created_ids.extend(str(product_id) for product_id in inserted)
+        existing += len(batch) - len(inserted)
+
+    batch_size = settings.INGEST_ENQUEUE_BATCH_SIZE
+    for i in range(0, len(created_ids), batch_size):
+        enqueue_product_pipelines.apply_async(
+            args=[created_ids[i:i + batch_size], priority],
+            priority=settings.INGEST_PRIORITIES[priority]
+        )
+
+    metrics.incr('ingest.urls_received', len(urls))
+    metrics.incr('ingest.products_created', len(created_ids))
+    metrics.incr('ingest.duplicates', duplicates + existing)
+    if invalid:
+        metrics.incr('ingest.invalid', len(invalid))
+    logger.info(
+        f"Bulk ingest: {len(urls)} URLs, {len(created_ids)} new products, "
+        f"{existing} existing, {duplicates} duplicates, {len(invalid)} invalid"
+    )
+
+    return {
+        'received': len(urls),
+        'created': len(created_ids),
+        'existing': existing,
+        'duplicates': duplicates,
+        'invalid': len(invalid),
+        'invalid_urls': invalid[:100],
+        'priority': priority,
+        'product_ids': created_ids,
+    }
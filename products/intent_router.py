@@ -0,0 +1,275 @@
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+
+from . import metrics
+from .lexical_index import tokenize
+
+logger = logging.getLogger(__name__)
+
+metrics.register(
+    'intent_router.questions', 'intent_router.fast_path',
+    'intent_router.price', 'intent_router.availability', 'intent_router.brand', 'intent_router.spec'
+)
+
+STRUCTURED_INTENTS = ('price', 'availability', 'brand', 'spec')
+
+# Opinion / comparison questions need the reviews: always RAG
+_RAG_ONLY = re.compile(
+    r"\b(worth|value|reviews?|reviewers?|people|customers?|users?|complain\w*|compare\w*|vs|versus|"
+    r"better|best|recommend\w*|why|should i|good for|pros|cons|experiences?|durab\w*|quality|problems?|issues?|"
+    r"feel|feels|warranty)\b"
+)
+
+# Rules need question phrasing: a bare "cost", "cheap" or "company" is usually part of an opinion
+_HOW_MUCH = r"how much\b(?!.*\b(weigh\w*|hold|holds|space|storage|memory|power|battery|water|noise)\b)"
+_RULES = {
+    'price': re.compile(
+        r"\b(" + _HOW_MUCH + r"|what(?:'s| is| are| was)? (?:the |its |this |it )?(?:current |list |sale )?(?:price|cost|mrp)|"
+        r"(?:price|cost|mrp) of|priced at|what does (?:it|this) cost|on sale|any discounts?|discounted)\b"
+    ),
+    'availability': re.compile(
+        r"\b(in stock|out of stock|back in stock|sold out|availability|available(?! in\b)|can i (?:buy|order) it)\b"
+    ),
+    'brand': re.compile(
+        r"\b(brand(?! new)|manufacturer|manufactured by|made by|who makes|who made|"
+        r"(?:what|which) company (?:makes|made|manufactures|is))\b"
+    ),
+    'spec': re.compile(
+        r"\b(weight|weigh|weighs|heavy|dimensions?|how big|size|model number|model|colou?rs?|material|"
+        r"battery|capacity|wattage|watts|voltage|resolution|specs?|specifications?)\b"
+    ),
+}
+
+# Question words that point at a specification key (nouns and verbs only: "how long" is not "dimensions")
+_SPEC_SYNONYMS = {
+    'weigh': 'weight', 'weighs': 'weight',
+    'size': 'dimensions', 'dimension': 'dimensions', 'measurements': 'dimensions',
+    'color': 'colour', 'watts': 'wattage',
+}
+# Words too common in spec keys to identify one on their own
+_GENERIC_SPEC_WORDS = frozenset({
+    'item', 'product', 'number', 'type', 'details', 'specs', 'spec', 'specification', 'specifications'
+})
+
+# Terms a question may use besides the field it asks about; any other content word
+# ("price of replacement pads", "return policy if out of stock") means RAG
+_FILLER_TERMS = frozenset({'much', 'many', 'me', 'tell', 'please', 'there', 'any', 'exact', 'exactly', 'item', 'product'})
+_INTENT_TERMS = {
+    'price': frozenset({
+        'price', 'prices', 'priced', 'cost', 'costs', 'mrp', 'sale', 'discount', 'discounts', 'discounted',
+        'current', 'list', 'money', 'pay', 'go', 'rate', 'offer',
+    }),
+    'availability': frozenset({
+        'stock', 'sold', 'out', 'back', 'available', 'availability', 'buy', 'order', 'can', 'now', 'today',
+        'right', 'still', 'currently', 'purchasable',
+    }),
+    'brand': frozenset({
+        'brand', 'manufacturer', 'manufactured', 'made', 'makes', 'make', 'maker', 'company', 'sells', 'label',
+    }),
+}
+
+
+def _content_terms(question):
+    """Question terms (spec synonyms applied) minus filler; single letters ("what's") dropped"""
+    return {_SPEC_SYNONYMS.get(term, term) for term in tokenize(question) if len(term) > 1} - _FILLER_TERMS
+
+# Seed questions for the fallback classifier (used when no rule matches)
+_EXAMPLES = {
+    'price': [
+        "how much is it", "what does this go for", "what's the mrp", "is there any offer on it",
+        "what will i pay for this", "how much money", "current rate of this item",
+    ],
+    'availability': [
+        "can i buy it now", "is this still sold", "is it in stock right now", "can i order it today",
+        "is this item currently purchasable",
+    ],
+    'brand': [
+        "who sells this", "which company is this from", "who is the maker", "what label is this",
+    ],
+    'spec': [
+        "how tall is it", "how wide is it", "what are its measurements", "how many grams",
+        "what is it made of", "how long does the battery last", "what is the screen size",
+    ],
+    'rag': [
+        "is it comfortable", "does it work well for running", "how is the sound", "is it good for kids",
+        "does it break easily", "what do buyers say", "is it easy to set up", "does it fit well",
+        "how loud is it", "is it noisy", "can i use it outdoors", "does it come with a case",
+        "how long does shipping take", "what is included in the box", "is it waterproof",
+    ],
+}
+
+
+@dataclass
+class Intent:
+    name: str
+    confidence: float
+    source: str
+
+    @property
+    def structured(self):
+        return self.name in STRUCTURED_INTENTS
+
+
+class NaiveBayesClassifier:
+    """Tiny multinomial naive Bayes over tokenize() terms, trained in-process on seed questions"""
+
+    def __init__(self, examples, alpha=0.1):
+        self.alpha = alpha
+        self.term_counts = defaultdict(Counter)
+        self.doc_counts = Counter()
+        for label, questions in examples.items():
+            for question in questions:
+                self.doc_counts[label] += 1
+                self.term_counts[label].update(tokenize(question))
+        self.vocabulary = {term for counts in self.term_counts.values() for term in counts}
+        self.totals = {label: sum(counts.values()) for label, counts in self.term_counts.items()}
+        self.n_docs = sum(self.doc_counts.values())
+
+    def predict(self, question):
+        """Returns: (label, probability)"""
+        terms = [term for term in tokenize(question) if term in self.vocabulary]
+        if not terms:
+            return 'rag', 0.0
+        vocabulary_size = len(self.vocabulary)
+        log_probs = {}
+        for label, counts in self.term_counts.items():
+            log_prob = math.log(self.doc_counts[label] / self.n_docs)
+            denominator = self.totals[label] + self.alpha * vocabulary_size
+            for term in terms:
+                log_prob += math.log((counts[term] + self.alpha) / denominator)
+            log_probs[label] = log_prob
+        best = max(log_probs, key=log_probs.get)
+        peak = log_probs[best]
+        total = sum(math.exp(value - peak) for value in log_probs.values())
+        return best, 1.0 / total
+
+
+class IntentRouter:
+    """
+    Sends questions answerable from Product fields (price, availability,
+    brand, a specification) down a fast path that skips embedding, vector
+    search and the LLM; everything else goes to RAG.
+
+    Regex rules decide first; a question matching none of them goes to a
+    small naive Bayes classifier and is routed only above
+    ``INTENT_CLASSIFIER_THRESHOLD``. Opinion or comparison questions,
+    questions matching several intents and questions with words beyond
+    the field they name (another object, a policy, a condition) always
+    use RAG.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = settings.INTENT_CLASSIFIER_THRESHOLD if threshold is None else threshold
+        self.classifier = NaiveBayesClassifier(_EXAMPLES)
+
+    def classify(self, question):
+        """Returns: Intent (name, confidence, 'rule' or 'classifier')"""
+        metrics.incr('intent_router.questions')
+        text = question.lower()
+        if _RAG_ONLY.search(text):
+            return Intent('rag', 1.0, 'rule')
+        matched = [name for name, pattern in _RULES.items() if pattern.search(text)]
+        if len(matched) == 1:
+            return Intent(matched[0], 1.0, 'rule') if self._only_asks_for(matched[0], text) else Intent('rag', 1.0, 'rule')
+        if matched:
+            return Intent('rag', 1.0, 'rule')
+        label, probability = self.classifier.predict(question)
+        if label != 'rag' and probability >= self.threshold and self._only_asks_for(label, text):
+            return Intent(label, probability, 'classifier')
+        return Intent('rag', probability if label == 'rag' else 1.0 - probability, 'classifier')
+
+    @staticmethod
+    def _only_asks_for(label, text):
+        """
+        False when the question says more than its field ("price of
+        replacement pads", "does the brand offer support"); spec questions
+        are checked against the matching key in find_specification
+        """
+        if label not in _INTENT_TERMS:
+            return True
+        return not (_content_terms(text) - _INTENT_TERMS[label])
+
+    # --- Answers from the product row ---
+
+    @staticmethod
+    def _clean_brand(brand):
+        brand = re.sub(r"^(visit the|brand:)\s*", '', brand.strip(), flags=re.IGNORECASE)
+        return re.sub(r"\s+store$", '', brand, flags=re.IGNORECASE).strip()
+
+    @staticmethod
+    def find_specification(specifications, question):
+        """
+        Best (key, value) whose key words appear in the question, or None.
+        The key's head noun ("life" in "Battery Life") must be asked about
+        and the question may not add words the key does not cover, so "is
+        the battery replaceable?" or "is this the 2023 model?" go to RAG.
+        """
+        asked = _content_terms(question)
+        best, best_score = None, 0.0
+        for key, value in (specifications or {}).items():
+            all_key_terms = [_SPEC_SYNONYMS.get(term, term) for term in tokenize(key)]
+            key_terms = [term for term in all_key_terms if term not in _GENERIC_SPEC_WORDS]
+            if not key_terms or not value:
+                continue
+            if key_terms[-1] not in asked or asked - set(all_key_terms) - _GENERIC_SPEC_WORDS:
+                continue
+            overlap = len(set(key_terms) & asked) / len(set(key_terms))
+            if overlap >= 0.5 and overlap > best_score:
+                best, best_score = (key, value), overlap
+        return best
+
+    def answer(self, product, intent, question):
+        """
+        Answer a structured intent from the product row
+        Returns: (answer, [source field texts]) or None when the field is empty
+        """
+        if intent.name == 'price' and product.current_price:
+            answer = f"The current price is {product.current_price}"
+            if product.original_price and product.original_price != product.current_price:
+                answer += f" (list price {product.original_price})"
+            return answer + ".", [f"Price: {product.current_price}"]
+        if intent.name == 'availability' and product.availability:
+            return f"Availability: {product.availability}", [f"Availability: {product.availability}"]
+        if intent.name == 'brand' and product.brand:
+            brand = self._clean_brand(product.brand)
+            return f"This product is made by {brand}.", [f"Brand: {brand}"]
+        if intent.name == 'spec':
+            found = self.find_specification(product.specifications, question)
+            if found:
+                key, value = found
+                return f"{key}: {value}", [f"{key}: {value}"]
+        return None
+
+    def route(self, product, question, intent=None):
+        """
+        Classify a question and answer it from the product when possible
+        Returns: result dict (answer, context_chunks) or None to use RAG
+        """
+        intent = intent or self.classify(question)
+        if not intent.structured:
+            return None
+        answered = self.answer(product, intent, question)
+        if answered is None:
+            return None
+        answer, sources = answered
+        metrics.incr('intent_router.fast_path')
+        metrics.incr(f"intent_router.{intent.name}")
+        logger.info(f"Answered '{question[:50]}' from product fields ({intent.name}, {intent.source})")
+        return {
+            'answer': answer,
+            'context_chunks': [{'text': text, 'score': 1.0} for text in sources],
+        }
+
+    @staticmethod
+    def stats():
+        counters = metrics.get_counters(['intent_router.questions', 'intent_router.fast_path'])
+        return {
+            'intent_router.fast_path_ratio': metrics.ratio(
+                counters['intent_router.fast_path'], counters['intent_router.questions']
+            )
+        }
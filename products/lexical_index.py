@@ -0,0 +1,176 @@
+import json
+import logging
+import math
+import os
+import re
+import uuid
+from collections import Counter, defaultdict
+from pathlib import Path
+
+import zstandard
+from django.conf import settings
+
+from . import metrics
+from .embedding_cache import LRUCache
+from .vector_stores import metadata_matches
+
+logger = logging.getLogger(__name__)
+
+metrics.register('lexical_index.loads')
+
+# Words plus model numbers / SKUs kept whole ("wh-1000xm5", "1.5kg", "b0abcdefgh")
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by does do for from has have how i in is it its of on or "
+    "the this that to was what when where which who why will with you your".split()
+)
+
+
+def tokenize(text):
+    """Lower-cased terms; compound tokens are indexed whole and by their parts"""
+    terms = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        terms.append(token)
+        if not token.isalnum():
+            terms.extend(part for part in re.split(r"[.\-/]", token) if part and part not in _STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """
+    Okapi BM25 over one product's chunks, held in memory.
+
+    Only ids, texts and metadata are persisted; the postings are rebuilt on
+    load, which for a product's few hundred chunks takes a few milliseconds
+    and keeps the stored file small.
+    """
+
+    def __init__(self, ids, texts, metadata, k1=1.2, b=0.75):
+        self.ids = ids
+        self.texts = texts
+        self.metadata = metadata
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.lengths = []
+        for doc, text in enumerate(texts):
+            terms = tokenize(text)
+            self.lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                self.postings[term].append((doc, tf))
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    def search(self, query, top_k, metadata_filter=None):
+        """
+        ``metadata_filter`` (vector store filter syntax) restricts the
+        scored chunks; idf stays that of the whole product
+        Returns: list of dicts with id, score, text and metadata, best first
+        """
+        n_docs = len(self.ids)
+        if not n_docs or top_k <= 0:
+            return []
+        allowed = None
+        if metadata_filter:
+            allowed = {doc for doc in range(n_docs) if metadata_matches(self.metadata[doc], metadata_filter)}
+            if not allowed:
+                return []
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc, tf in postings:
+                if allowed is not None and doc not in allowed:
+                    continue
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[doc] / (self.avg_length or 1))
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        best = sorted(scores.items(), key=lambda item: -item[1])[:top_k]
+        return [
+            {
+                'id': self.ids[doc],
+                'score': score,
+                'text': self.texts[doc],
+                'metadata': self.metadata[doc],
+            }
+            for doc, score in best
+        ]
+
+
+class LexicalIndexStore:
+    """
+    Per-namespace BM25 indexes stored as zstd-compressed JSON files under
+    ``LEXICAL_INDEX_DIR`` and cached in-process by file mtime, so a query
+    costs a stat() and an in-memory lookup. Files are replaced atomically.
+    """
+
+    SUFFIX = '.bm25.zst'
+
+    def __init__(self, root=None, cache_size=256):
+        self.root = Path(root or settings.LEXICAL_INDEX_DIR)
+        self._cache = LRUCache(cache_size)
+
+    def path(self, namespace):
+        return self.root / f"{namespace}{self.SUFFIX}"
+
+    def write(self, namespace, entries):
+        """Replace a namespace's index; ``entries`` are dicts with id, text and metadata"""
+        payload = json.dumps({
+            'ids': [entry['id'] for entry in entries],
+            'texts': [entry['text'] for entry in entries],
+            'metadata': [entry.get('metadata', {}) for entry in entries],
+        }).encode('utf-8')
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.root / f".{namespace}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zstandard.ZstdCompressor(level=10).compress(payload))
+        os.replace(tmp_path, self.path(namespace))
+
+    def load(self, namespace):
+        """The namespace's BM25Index, or None if it has none"""
+        path = self.path(namespace)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        cached = self._cache.get(namespace)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as f:
+            data = json.loads(zstandard.ZstdDecompressor().decompress(f.read()))
+        index = BM25Index(data['ids'], data['texts'], data['metadata'])
+        self._cache.set(namespace, (mtime, index))
+        metrics.incr('lexical_index.loads')
+        return index
+
+    def search(self, namespace, query, top_k, metadata_filter=None):
+        """BM25 hits for a namespace; [] when it has no (readable) index"""
+        try:
+            index = self.load(namespace)
+        except Exception as e:
+            logger.warning(f"Could not load lexical index {namespace}: {str(e)}")
+            return []
+        if index is None:
+            return []
+        return index.search(query, top_k, metadata_filter)
+
+    def delete(self, namespace):
+        try:
+            self.path(namespace).unlink()
+        except FileNotFoundError:
+            pass
+
+
+def reciprocal_rank_fusion(ranked_lists, k=60):
+    """
+    Fuse ranked result lists (dicts with 'id'); each list contributes
+    1 / (k + rank) per item. Returns: [(id, fused_score)], best first
+    """
+    fused = defaultdict(float)
+    for results in ranked_lists:
+        for rank, result in enumerate(results, start=1):
+            fused[result['id']] += 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: -item[1])
@@ -0,0 +1,88 @@
+"""Local HTTP server for scraper benchmarks (not a management command)."""
+import mimetypes
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FIXTURES_DIR = Path(__file__).resolve().parents[2] / 'fixtures' / 'pages'
+
+
+class FixtureServer:
+    """
+    Serves saved HTML pages from a directory with simulated network latency.
+
+    Page hosts are 127.0.0.1; ``{{THIRD_PARTY}}`` in a page is rewritten to
+    the same server under the ``localhost`` hostname so those requests look
+    third-party to the scraper. Any ``/assets/*`` or ``/thirdparty/*`` path is
+    answered with a generated payload of ``asset_kb`` kilobytes.
+    """
+
+    def __init__(self, fixtures_dir=None, latency_ms=50, asset_kb=64):
+        self.fixtures_dir = Path(fixtures_dir or FIXTURES_DIR)
+        self.latency = latency_ms / 1000.0
+        self.asset_bytes = asset_kb * 1024
+        self.requests = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def page_url(self, name):
+        return f"http://127.0.0.1:{self.port}/{name}"
+
+    def pages(self):
+        return sorted(path.name for path in self.fixtures_dir.glob('*.html'))
+
+    def reset_stats(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+
+    def _record(self, size):
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += size
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(server.latency)
+                path = self.path.split('?')[0].lstrip('/')
+                if path.startswith(('assets/', 'thirdparty/')):
+                    body = b'\0' * server.asset_bytes
+                    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+                else:
+                    file_path = server.fixtures_dir / path
+                    if not file_path.is_file():
+                        self.send_error(404)
+                        return
+                    third_party = f"http://localhost:{server.port}"
+                    body = file_path.read_text(encoding='utf-8').replace(
+                        '{{THIRD_PARTY}}', third_party
+                    ).encode('utf-8')
+                    content_type = 'text/html; charset=utf-8'
+
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                server._record(len(body))
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
@@ -0,0 +1,49 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from products.parsers import parse_product_page
+
+from ._fixture_server import FIXTURES_DIR
+
+
+class Command(BaseCommand):
+    help = "Benchmark offline (lxml) parsing throughput on saved HTML pages"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', default=None, help="Directory of saved .html pages")
+        parser.add_argument('--iterations', type=int, default=200, help="Parses per page")
+        parser.add_argument('--workers', type=int, default=0, help="Also run through a process pool of this size")
+
+    def handle(self, *args, **options):
+        fixtures_dir = Path(options['fixtures'] or FIXTURES_DIR)
+        pages = {path.name: path.read_text(encoding='utf-8') for path in sorted(fixtures_dir.glob('*.html'))}
+        url = 'https://www.amazon.com/dp/B000000000'
+
+        for name, html in pages.items():
+            data = parse_product_page(html, url)
+            self.stdout.write(
+                f"\n{name}: {len(html) / 1024:.1f} KiB, title={data['title'][:40]!r}, "
+                f"specs={len(data['specifications'])}, reviews={len(data['reviews'])}"
+            )
+
+            iterations = options['iterations']
+            start = time.perf_counter()
+            for _ in range(iterations):
+                parse_product_page(html, url)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f"  inline   {elapsed / iterations * 1000:7.2f} ms/page  {iterations / elapsed:8.1f} pages/s"
+            )
+
+            if options['workers'] > 0:
+                with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+                    list(pool.map(parse_product_page, [html] * options['workers'], [url] * options['workers']))
+                    start = time.perf_counter()
+                    list(pool.map(parse_product_page, [html] * iterations, [url] * iterations, chunksize=8))
+                    elapsed = time.perf_counter() - start
+                self.stdout.write(
+                    f"  pool x{options['workers']:<2} {elapsed / iterations * 1000:7.2f} ms/page  {iterations / elapsed:8.1f} pages/s"
+                )
@@ -0,0 +1,52 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.browser_pool import BrowserPool
+from products.scraper import AmazonProductScraper
+
+from ._fixture_server import FixtureServer
+
+
+class Command(BaseCommand):
+    help = "Benchmark full vs fast scraping mode against saved HTML fixtures on a local server"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fixtures', default=None, help="Directory of saved .html pages")
+        parser.add_argument('--runs', type=int, default=3)
+        parser.add_argument('--latency-ms', type=int, default=50, help="Simulated per-request latency")
+        parser.add_argument('--asset-kb', type=int, default=64, help="Size of generated assets")
+
+    def handle(self, *args, **options):
+        server = FixtureServer(
+            options['fixtures'], latency_ms=options['latency_ms'], asset_kb=options['asset_kb']
+        ).start()
+        pool = BrowserPool()
+        try:
+            pool.start()
+            for name in server.pages():
+                url = server.page_url(name)
+                self.stdout.write(f"\n{name}")
+                for label, fast_mode in (('full', False), ('fast', True)):
+                    timings, requests, sent, blocked = [], 0, 0, 0
+                    for _ in range(options['runs']):
+                        server.reset_stats()
+                        scraper = AmazonProductScraper(browser_pool=pool, fast_mode=fast_mode)
+                        start = time.perf_counter()
+                        scraper.scrape_product_data(url)
+                        timings.append(time.perf_counter() - start)
+                        requests += server.requests
+                        sent += server.bytes_sent
+                        blocked += scraper.blocked_requests
+
+                    runs = options['runs']
+                    self.stdout.write(
+                        f"  {label:<4}  median {statistics.median(timings) * 1000:8.1f} ms"
+                        f"  requests {requests / runs:6.1f}"
+                        f"  bytes {sent / runs / 1024:9.1f} KiB"
+                        f"  blocked {blocked / runs:5.1f}"
+                    )
+        finally:
+            pool.close()
+            server.stop()
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.registry import get_qa_service, reset_services
+from products.services import QAService
+
+
+class Command(BaseCommand):
+    help = "Compare per-request QAService setup cost with and without the service registry"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            QAService()
+        fresh = (time.perf_counter() - start) / iterations
+
+        reset_services()
+        start = time.perf_counter()
+        get_qa_service()
+        first = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            get_qa_service()
+        shared = (time.perf_counter() - start) / iterations
+
+        self.stdout.write(f"Fresh QAService() per request: {fresh * 1000:.2f} ms")
+        self.stdout.write(f"Registry first call (cold):     {first * 1000:.2f} ms")
+        self.stdout.write(f"Registry per request (warm):    {shared * 1000:.4f} ms")
+        if shared:
+            self.stdout.write(f"Speedup: {fresh / shared:,.0f}x")
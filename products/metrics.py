@@ -0,0 +1,43 @@
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = 'metrics'
+
+# Counter names are registered here so /metrics/ can read them in one round trip
+REGISTERED_COUNTERS = set()
+
+
+def _key(name):
+    return f"{METRICS_PREFIX}:{name}"
+
+
+def register(*names):
+    REGISTERED_COUNTERS.update(names)
+
+
+def incr(name, amount=1):
+    """Increment a shared (cross-worker) counter; never raises"""
+    REGISTERED_COUNTERS.add(name)
+    key = _key(name)
+    try:
+        try:
+            cache.incr(key, amount)
+        except ValueError:
+            # Key missing: create it, falling back to incr if another worker won
+            if not cache.add(key, amount, timeout=None):
+                cache.incr(key, amount)
+    except Exception as e:
+        logger.warning(f"Could not update metric {name}: {str(e)}")
+
+
+def get_counters(names=None):
+    """Return {name: value} for the given (or all registered) counters"""
+    names = sorted(names or REGISTERED_COUNTERS)
+    values = cache.get_many([_key(name) for name in names])
+    return {name: values.get(_key(name), 0) for name in names}
+
+
+def ratio(numerator, denominator):
+    return round(numerator / denominator, 4) if denominator else 0.0
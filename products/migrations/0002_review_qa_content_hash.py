@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:43
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def _content_hash(*parts):
+    normalized = "\x1f".join(" ".join(str(part or '').split()).lower() for part in parts)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def backfill_content_hashes(apps, schema_editor):
+    """Hash existing rows and drop duplicates left by earlier task retries"""
+    Review = apps.get_model('products', 'Review')
+    QuestionAnswer = apps.get_model('products', 'QuestionAnswer')
+
+    for model, hash_row in (
+        (Review, lambda r: _content_hash(r.customer_name, r.title, r.text, r.rating)),
+        (QuestionAnswer, lambda q: _content_hash(q.question)),
+    ):
+        seen = set()
+        duplicates = []
+        updated = []
+        for row in model.objects.order_by('created_at').iterator():
+            row.content_hash = hash_row(row)
+            key = (row.product_id, row.content_hash)
+            if key in seen:
+                duplicates.append(row.pk)
+            else:
+                seen.add(key)
+                updated.append(row)
+        model.objects.filter(pk__in=duplicates).delete()
+        model.objects.bulk_update(updated, ['content_hash'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionanswer',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_content_hashes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='questionanswer',
+            constraint=models.UniqueConstraint(fields=('product', 'content_hash'), name='unique_question_content'),
+        ),
+        migrations.AddConstraint(
+            model_name='review',
+            constraint=models.UniqueConstraint(fields=('product', 'content_hash'), name='unique_review_content'),
+        ),
+    ]
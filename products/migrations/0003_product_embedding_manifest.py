@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0002_review_qa_content_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='embedding_manifest',
+            field=models.JSONField(blank=True, default=None, null=True),
+        ),
+    ]
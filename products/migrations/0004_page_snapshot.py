@@ -0,0 +1,34 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:50
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_embedding_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PageSnapshot',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('url', models.URLField(max_length=1000)),
+                ('page_type', models.CharField(choices=[('product', 'Product'), ('reviews', 'Reviews')], max_length=20)),
+                ('page_number', models.IntegerField(default=0)),
+                ('fetched_at', models.DateTimeField()),
+                ('content_hash', models.CharField(max_length=64)),
+                ('raw_size', models.IntegerField(default=0)),
+                ('compressed_size', models.IntegerField(default=0)),
+                ('unchanged', models.BooleanField(default=False)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='snapshots', to='products.product')),
+            ],
+            options={
+                'ordering': ['-fetched_at'],
+                'indexes': [models.Index(fields=['url', '-fetched_at'], name='products_pa_url_bce3dc_idx'), models.Index(fields=['product', '-fetched_at'], name='products_pa_product_a3a3bb_idx'), models.Index(fields=['content_hash'], name='products_pa_content_7f1c18_idx')],
+            },
+        ),
+    ]
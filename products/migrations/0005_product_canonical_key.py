@@ -0,0 +1,71 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:05
+
+import re
+from urllib.parse import urlparse
+
+from django.db import migrations, models
+
+_ASIN_RE = re.compile(
+    r'/(?:dp|gp/product|gp/aw/d|product-reviews|exec/obidos/ASIN)/([A-Z0-9]{10})(?:[/?#]|$)',
+    re.IGNORECASE
+)
+
+
+def _canonical_key(url):
+    host = (urlparse(url).hostname or '').lower()
+    domain = next(
+        (d for d in ('amazon.com', 'amazon.in') if host == d or host.endswith(f".{d}")), None
+    )
+    match = _ASIN_RE.search(urlparse(url).path + '/')
+    if domain is None or match is None:
+        return None
+    return f"{domain}:{match.group(1).upper()}"
+
+
+def backfill_canonical_keys(apps, schema_editor):
+    """
+    Key existing products and merge URL variants of one product into a
+    single row: the completed (else oldest) one keeps the key and the chat
+    sessions of the others, which are deleted
+    """
+    Product = apps.get_model('products', 'Product')
+    ChatSession = apps.get_model('products', 'ChatSession')
+    groups = {}
+    for product in Product.objects.order_by('created_at').iterator():
+        key = _canonical_key(product.url)
+        if key is not None:
+            groups.setdefault(key, []).append(product)
+    
+    updated = []
+    duplicate_ids = []
+    for key, products in groups.items():
+        keeper = next((product for product in products if product.status == 'completed'), products[0])
+        duplicates = [product.id for product in products if product.id != keeper.id]
+        if duplicates:
+            ChatSession.objects.filter(product_id__in=duplicates).update(product_id=keeper.id)
+            duplicate_ids.extend(duplicates)
+        keeper.canonical_key = key
+        updated.append(keeper)
+    # Their reviews, Q&A and snapshots go with them; the keeper has its own
+    Product.objects.filter(id__in=duplicate_ids).delete()
+    Product.objects.bulk_update(updated, ['canonical_key'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_page_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='canonical_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.RunPython(backfill_canonical_keys, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(fields=('canonical_key',), name='unique_product_canonical_key'),
+        ),
+    ]
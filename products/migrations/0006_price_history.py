@@ -0,0 +1,40 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:03
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_canonical_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='content_fingerprint',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='price_refreshed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='PriceHistory',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('current_price', models.CharField(blank=True, max_length=50, null=True)),
+                ('original_price', models.CharField(blank=True, max_length=50, null=True)),
+                ('availability', models.CharField(blank=True, max_length=255, null=True)),
+                ('recorded_at', models.DateTimeField()),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_history', to='products.product')),
+            ],
+            options={
+                'ordering': ['-recorded_at'],
+                'indexes': [models.Index(fields=['product', '-recorded_at'], name='products_pr_product_84f8c9_idx')],
+            },
+        ),
+    ]
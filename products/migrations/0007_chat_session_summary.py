@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_price_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='history_summary',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='summarized_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
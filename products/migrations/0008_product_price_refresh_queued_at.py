@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_chat_session_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='price_refresh_queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_product_price_refresh_queued_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pagesnapshot',
+            name='archive_host',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+    ]
@@ -3,8 +3,17 @@
 # Create your models here.
 from django.db import models
 from django.contrib.auth.models import User
+import hashlib
 import uuid
 
+from .amazon_urls import canonical_key
+
+
+def content_hash(*parts):
+    """Stable natural key for scraped rows (whitespace/case-insensitive)"""
+    normalized = "\x1f".join(" ".join(str(part or '').split()).lower() for part in parts)
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
 class Product(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -16,6 +25,8 @@ class Product(models.Model):
    
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     url = models.URLField(max_length=500, unique=True)
+    # '<marketplace>:<ASIN>'; every URL variant of a product maps to one row
+    canonical_key = models.CharField(max_length=64, blank=True, null=True)
     title = models.TextField(blank=True, null=True)
     brand = models.CharField(max_length=255, blank=True, null=True)
     current_price = models.CharField(max_length=50, blank=True, null=True)
@@ -32,12 +43,20 @@ class Product(models.Model):
     # Vector database reference
     pinecone_namespace = models.CharField(max_length=100, blank=True, null=True)
     vector_count = models.IntegerField(default=0)
+    # Content hashes of the embedded chunks; None means unknown (full rebuild)
+    embedding_manifest = models.JSONField(blank=True, null=True, default=None)
     
     # Scraping metadata
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     task_id = models.CharField(max_length=255, blank=True, null=True)
     error_message = models.TextField(blank=True, null=True)
     scraped_at = models.DateTimeField(blank=True, null=True)
+    # Last buy-box refresh (full scrapes count) and a hash of the page
+    # content that feeds the embedded text, to tell when a rescrape is needed
+    price_refreshed_at = models.DateTimeField(blank=True, null=True)
+    content_fingerprint = models.CharField(max_length=64, blank=True, default='')
+    # Set when a refresh is queued and cleared when it runs, so beat ticks do not re-queue it
+    price_refresh_queued_at = models.DateTimeField(blank=True, null=True)
     
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
@@ -50,6 +69,15 @@ class Product(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['-created_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(fields=['canonical_key'], name='unique_product_canonical_key'),
+        ]
+    
+    def save(self, *args, **kwargs):
+        # Only new rows derive the key; an existing row keeps the one it was stored with
+        if self._state.adding and not self.canonical_key:
+            self.canonical_key = canonical_key(self.url)
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return self.title or self.url
@@ -64,6 +92,8 @@ class Review(models.Model):
     customer_name = models.CharField(max_length=255, blank=True, null=True)
     helpful_votes = models.CharField(max_length=100, blank=True, null=True)
     review_date = models.DateField(blank=True, null=True)
+    # Hash of author/title/text/rating, used to upsert re-scraped reviews
+    content_hash = models.CharField(max_length=64, blank=True, default='')
     
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -72,6 +102,18 @@ class Review(models.Model):
         indexes = [
             models.Index(fields=['product', '-created_at']),
         ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'content_hash'], name='unique_review_content'
+            ),
+        ]
+    
+    @staticmethod
+    def compute_content_hash(review_data):
+        return content_hash(
+            review_data.get('customer_name'), review_data.get('title'),
+            review_data.get('text'), review_data.get('rating')
+        )
     
     def __str__(self):
         return f"Review for {self.product.title} by {self.customer_name}"
@@ -82,22 +124,90 @@ class QuestionAnswer(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='questions')
     question = models.TextField()
     answer = models.TextField(blank=True, null=True)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
     
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['product', 'content_hash'], name='unique_question_content'
+            ),
+        ]
+    
+    @staticmethod
+    def compute_content_hash(question):
+        return content_hash(question)
     
     def __str__(self):
         return f"Q&A for {self.product.title}"
 
 
+class PageSnapshot(models.Model):
+    """One fetch of a page; the HTML lives in the content-addressed page archive"""
+    PAGE_TYPE_CHOICES = [
+        ('product', 'Product'),
+        ('reviews', 'Reviews'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='snapshots')
+    url = models.URLField(max_length=1000)
+    page_type = models.CharField(max_length=20, choices=PAGE_TYPE_CHOICES)
+    # Position of a review page in the pagination (0 for the product page)
+    page_number = models.IntegerField(default=0)
+    fetched_at = models.DateTimeField()
+    # sha256 of the raw HTML, i.e. the archive blob name
+    content_hash = models.CharField(max_length=64)
+    raw_size = models.IntegerField(default=0)
+    compressed_size = models.IntegerField(default=0)
+    # Same content as the previous snapshot of this URL
+    unchanged = models.BooleanField(default=False)
+    # PAGE_ARCHIVE_HOST of the archive holding the blob ('' before hosts were recorded)
+    archive_host = models.CharField(max_length=255, blank=True, default='')
+    
+    class Meta:
+        ordering = ['-fetched_at']
+        indexes = [
+            models.Index(fields=['url', '-fetched_at']),
+            models.Index(fields=['product', '-fetched_at']),
+            models.Index(fields=['content_hash']),
+        ]
+    
+    def __str__(self):
+        return f"{self.page_type} snapshot of {self.url} at {self.fetched_at}"
+
+
+class PriceHistory(models.Model):
+    """Buy-box values, recorded whenever a scrape or refresh sees them change"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_history')
+    current_price = models.CharField(max_length=50, blank=True, null=True)
+    original_price = models.CharField(max_length=50, blank=True, null=True)
+    availability = models.CharField(max_length=255, blank=True, null=True)
+    recorded_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['product', '-recorded_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.current_price} for {self.product_id} at {self.recorded_at}"
+
+
 class ChatSession(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='chat_sessions')
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
     session_id = models.CharField(max_length=100, unique=True)
     
+    # Rolling summary of the messages up to summarized_until; only newer ones are re-sent
+    history_summary = models.TextField(blank=True, default='')
+    summarized_until = models.DateTimeField(blank=True, null=True)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -0,0 +1,140 @@
+import hashlib
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+
+import zstandard
+from celery.signals import celeryd_after_setup
+from django.conf import settings
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+metrics.register(
+    'page_archive.pages', 'page_archive.unchanged', 'page_archive.deduplicated',
+    'page_archive.raw_bytes', 'page_archive.stored_bytes'
+)
+
+
+class PageArchive:
+    """
+    Content-addressed, zstd-compressed store of fetched HTML.
+
+    Each distinct page body is written once to
+    ``<root>/<hash[:2]>/<hash>.html.zst`` where ``hash`` is the sha256 of the
+    raw HTML, so identical fetches (unchanged pages, repeated scrapes) cost
+    no extra space. Which URL was fetched when is recorded by PageSnapshot
+    rows; blobs no snapshot refers to any more are removed by ``prune``.
+    """
+
+    SUFFIX = '.html.zst'
+
+    def __init__(self, root=None, level=None):
+        self.root = Path(root or settings.PAGE_ARCHIVE_DIR)
+        self.level = level or settings.PAGE_ARCHIVE_COMPRESSION_LEVEL
+
+    @staticmethod
+    def content_hash(html):
+        return hashlib.sha256(html.encode('utf-8')).hexdigest()
+
+    def blob_path(self, digest):
+        return self.root / digest[:2] / f"{digest}{self.SUFFIX}"
+
+    def store(self, html):
+        """
+        Store a page body unless an identical one is already archived
+        Returns: dict with content_hash, raw_size, compressed_size, deduplicated
+        """
+        raw = html.encode('utf-8')
+        digest = hashlib.sha256(raw).hexdigest()
+        path = self.blob_path(digest)
+
+        if path.exists():
+            # Refresh mtime so prune's grace period covers the pending snapshot row
+            os.utime(path)
+            compressed_size = path.stat().st_size
+            deduplicated = True
+        else:
+            compressed = zstandard.ZstdCompressor(level=self.level).compress(raw)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write-then-rename so concurrent readers never see a partial blob
+            tmp_path = path.parent / f".{digest}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp_path, path)
+            compressed_size = len(compressed)
+            deduplicated = False
+
+        metrics.incr('page_archive.pages')
+        metrics.incr('page_archive.raw_bytes', len(raw))
+        if deduplicated:
+            metrics.incr('page_archive.deduplicated')
+        else:
+            metrics.incr('page_archive.stored_bytes', compressed_size)
+
+        return {
+            'content_hash': digest,
+            'raw_size': len(raw),
+            'compressed_size': compressed_size,
+            'deduplicated': deduplicated,
+        }
+
+    def load(self, digest):
+        """Return the archived HTML for a content hash"""
+        with open(self.blob_path(digest), 'rb') as f:
+            return zstandard.ZstdDecompressor().decompress(f.read()).decode('utf-8')
+
+    def exists(self, digest):
+        return self.blob_path(digest).exists()
+
+    def iter_hashes(self):
+        for path in self.root.glob(f"*/*{self.SUFFIX}"):
+            yield path.name[:-len(self.SUFFIX)]
+
+    def delete(self, digest):
+        try:
+            self.blob_path(digest).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def prune(self, referenced_hashes, grace_seconds=3600):
+        """
+        Delete blobs not in ``referenced_hashes``; returns the number removed.
+        Blobs written within ``grace_seconds`` are kept: their snapshot row
+        may not be committed yet.
+        """
+        referenced = set(referenced_hashes)
+        cutoff = time.time() - grace_seconds
+        removed = 0
+        for digest in list(self.iter_hashes()):
+            if digest in referenced:
+                continue
+            try:
+                if self.blob_path(digest).stat().st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if self.delete(digest):
+                removed += 1
+        return removed
+
+
+def get_page_archive():
+    return PageArchive()
+
+
+def archive_queue(host=None):
+    """Queue of the workers that hold the archive named ``host`` (default: this host's PAGE_ARCHIVE_HOST)"""
+    return f"archive.{host or settings.PAGE_ARCHIVE_HOST}"
+
+
+@celeryd_after_setup.connect
+def _consume_archive_queue(sender, instance, **kwargs):
+    # Workers that write the archive (browser queues) also run the tasks that read it
+    queues = instance.app.amqp.queues
+    if set(queues.consume_from) & set(settings.SCRAPER_BROWSER_QUEUES):
+        queues.select_add(archive_queue())
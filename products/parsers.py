@@ -0,0 +1,357 @@
+import logging
+import multiprocessing
+import os
+import re
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+
+import billiard.pool
+from billiard.process import current_process as billiard_current_process
+import lxml.html
+from celery.signals import worker_process_shutdown
+from lxml.cssselect import CSSSelector
+from django.conf import settings
+
+from .amazon_selectors import QA_LIMIT, RELATED_PRODUCTS_LIMIT, SELECTORS
+
+logger = logging.getLogger(__name__)
+
+# Elements rendered on their own line by innerText
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt',
+    'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li',
+    'main', 'nav', 'ol', 'p', 'pre', 'section', 'table', 'tbody', 'td', 'th',
+    'thead', 'tr', 'ul',
+}
+SKIPPED_TAGS = {'script', 'style', 'noscript', 'template'}
+HIDDEN_CLASSES = {'a-hidden', 'aok-hidden'}
+
+_SPACES_RE = re.compile(r'[ \t\r\f\v\xa0]+')
+
+
+@lru_cache(maxsize=None)
+def _compiled(selector):
+    """CSS selectors are translated to XPath once per process"""
+    return CSSSelector(selector)
+
+
+def select(root, selector):
+    return _compiled(selector)(root)
+
+
+def _is_hidden(element):
+    """Best-effort visibility check without a layout engine"""
+    node = element
+    while node is not None:
+        if node.get('hidden') is not None or node.get('aria-hidden') == 'true':
+            return True
+        style = (node.get('style') or '').replace(' ', '').lower()
+        if 'display:none' in style or 'visibility:hidden' in style:
+            return True
+        if HIDDEN_CLASSES & set((node.get('class') or '').split()):
+            return True
+        node = node.getparent()
+    return False
+
+
+def _collect_text(element, parts):
+    if not isinstance(element.tag, str) or element.tag in SKIPPED_TAGS:
+        if element.tail:
+            parts.append(element.tail)
+        return
+    block = element.tag in BLOCK_TAGS
+    if block:
+        parts.append('\n')
+    if element.text:
+        parts.append(element.text)
+    for child in element:
+        _collect_text(child, parts)
+    if block:
+        parts.append('\n')
+    if element.tail:
+        parts.append(element.tail)
+
+
+def inner_text(element):
+    """Approximate the browser's innerText: block elements on their own lines, whitespace collapsed"""
+    if element is None:
+        return ''
+    parts = []
+    _collect_text(element, parts)
+    # The element's own tail is not part of its text
+    if element.tail:
+        parts.pop()
+    lines = (_SPACES_RE.sub(' ', line).strip() for line in ''.join(parts).split('\n'))
+    return '\n'.join(line for line in lines if line)
+
+
+class ProductPageParser:
+    """
+    Browser-free extraction of the fields read by AmazonProductScraper.
+
+    Works on raw HTML (``page.content()`` or an archived page) with lxml and
+    the shared ``SELECTORS``, and returns the same dicts as the in-page
+    extractors, so pages can be parsed in a process pool or re-parsed later
+    when selectors change without fetching them again.
+    """
+
+    def _first(self, root, selector):
+        found = select(root, selector)
+        return found[0] if found else None
+
+    def _text(self, root, selector):
+        return inner_text(self._first(root, selector))
+
+    def _texts(self, root, selector):
+        return [text for text in (inner_text(el) for el in select(root, selector)) if text]
+
+    def _reviews(self, root):
+        reviews = []
+        for review in select(root, SELECTORS['review']):
+            data = {
+                'title': self._text(review, SELECTORS['review_title']),
+                'text': self._text(review, SELECTORS['review_text']),
+                'rating': self._text(review, SELECTORS['review_rating']),
+                'customer_name': self._text(review, SELECTORS['review_customer_name']),
+                'helpful_votes': (
+                    self._text(review, SELECTORS['review_helpful_votes'])
+                    or "0 people found this helpful"
+                ),
+                'date': self._text(review, SELECTORS['review_date']),
+            }
+            if data['text']:
+                reviews.append(data)
+        return reviews
+
+    def parse_product_page(self, html, url):
+        """Return the product_data dict (reviews limited to those on the product page)"""
+        root = lxml.html.fromstring(html)
+        data = {}
+
+        titles = [el for el in select(root, SELECTORS['title']) if not _is_hidden(el)]
+        data['title'] = inner_text(titles[0]) if titles else ''
+        data['current_price'] = self._text(root, SELECTORS['current_price'])
+        data['original_price'] = self._text(root, SELECTORS['original_price'])
+        data['features'] = self._text(root, SELECTORS['features'])
+        data['brand'] = self._text(root, SELECTORS['brand'])
+        data['availability'] = self._text(root, SELECTORS['availability'])
+        data['variants'] = self._texts(root, SELECTORS['variants'])
+        data['qa'] = [
+            text for text in (inner_text(el) for el in select(root, SELECTORS['qa'])[:QA_LIMIT])
+            if text
+        ]
+        data['categories'] = self._texts(root, SELECTORS['categories'])
+        data['shipping_info'] = [
+            text for text in self._texts(root, SELECTORS['shipping_info']) if len(text) > 5
+        ]
+        data['sales_rank'] = self._text(root, SELECTORS['sales_rank'])
+
+        data['specifications'] = {}
+        for row_selector in SELECTORS['specification_rows']:
+            for row in select(root, row_selector):
+                key = self._text(row, SELECTORS['specification_key'])
+                value = self._text(row, SELECTORS['specification_value'])
+                if key and value and key != value:
+                    data['specifications'][key] = value
+
+        data['related_products'] = []
+        base = url.split('/dp/')[0]
+        for selector in SELECTORS['related_products']:
+            for link in select(root, selector)[:RELATED_PRODUCTS_LIMIT]:
+                title = link.get('title')
+                href = link.get('href')
+                if title and href:
+                    if not href.startswith('http'):
+                        href = base + href
+                    data['related_products'].append({'title': title, 'url': href})
+
+        data['has_reviews_section'] = self._first(root, SELECTORS['reviews_section']) is not None
+        data['has_see_all_reviews'] = self._first(root, SELECTORS['see_all_reviews']) is not None
+        data['reviews'] = self._reviews(root)
+        return data
+
+    def parse_reviews_page(self, html):
+        """Return {'reviews': [...], 'has_next_page': bool} for a review page"""
+        root = lxml.html.fromstring(html)
+        next_link = self._first(root, SELECTORS['next_reviews_page'])
+        has_next_page = next_link is not None and not any(
+            'a-disabled' in (node.get('class') or '').split()
+            for node in [next_link, *next_link.iterancestors()]
+        )
+        return {'reviews': self._reviews(root), 'has_next_page': has_next_page}
+
+
+def create_scraped_text(product_data):
+    """Concatenate product_data into the text that is chunked and embedded"""
+    text_parts = []
+
+    # Title and basic info
+    if product_data.get('title'):
+        text_parts.append(f"Title: {product_data['title']}")
+    if product_data.get('features'):
+        text_parts.append(f"Features:\n{product_data['features']}")
+
+    # Specifications
+    if product_data.get('specifications'):
+        text_parts.append("Specifications:")
+        for key, value in product_data['specifications'].items():
+            text_parts.append(f"  {key}: {value}")
+
+    # Reviews
+    if product_data.get('reviews'):
+        text_parts.append("\nCustomer Reviews:")
+        for review in product_data['reviews']:
+            review_text = (
+                f"Review by {review.get('customer_name', 'Anonymous')}: "
+                f"{review.get('title', '')} - {review.get('text', '')} "
+                f"(Rating: {review.get('rating', 'N/A')}, Helpful: {review.get('helpful_votes', 'N/A')})"
+            )
+            text_parts.append(review_text)
+
+    # Q&A
+    if product_data.get('qa'):
+        text_parts.append("\nQuestions & Answers:")
+        for qa in product_data['qa']:
+            text_parts.append(f"  {qa}")
+
+    return "\n".join(text_parts)
+
+
+_REVIEW_DATE_RE = re.compile(r"(\d{1,2} [A-Za-z]+ \d{4}|[A-Za-z]+ \d{1,2}, \d{4})")
+
+
+def parse_review_date(text):
+    """'Reviewed in the United States on January 5, 2024' (or '... on 5 January 2024') -> date; None if unparseable"""
+    match = _REVIEW_DATE_RE.search(text or '')
+    if not match:
+        return None
+    for date_format in ('%B %d, %Y', '%d %B %Y'):
+        try:
+            return datetime.strptime(match.group(1), date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+# --- Process pool (module-level functions so they pickle) ---
+
+def parse_product_page(html, url):
+    return ProductPageParser().parse_product_page(html, url)
+
+
+def parse_reviews_page(html):
+    return ProductPageParser().parse_reviews_page(html)
+
+
+class InlineFuture:
+    """Result holder with the Future interface, used when the pool is disabled"""
+
+    def __init__(self, func, *args):
+        self._result = self._exception = None
+        try:
+            self._result = func(*args)
+        except Exception as e:
+            self._exception = e
+
+    def result(self, timeout=None):
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class BilliardFuture:
+    """Future interface over a billiard AsyncResult"""
+
+    def __init__(self, async_result):
+        self.async_result = async_result
+
+    def result(self, timeout=None):
+        return self.async_result.get(timeout)
+
+
+class BilliardParsePool:
+    """
+    ProcessPoolExecutor stand-in for daemonic processes (Celery prefork
+    children), which multiprocessing refuses to give children; billiard,
+    Celery's own fork of it, allows them
+    """
+
+    def __init__(self, max_workers):
+        self.pool = billiard.pool.Pool(processes=max_workers)
+
+    def submit(self, func, *args):
+        return BilliardFuture(self.pool.apply_async(func, args))
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.pool.terminate()
+        if wait:
+            self.pool.join()
+
+
+_pool_lock = threading.Lock()
+_pool = None
+_pool_pid = None
+# Set to the pid of a process whose pool failed, so it parses inline from then on
+_pool_failed_pid = None
+
+
+def _is_daemonic():
+    return multiprocessing.current_process().daemon or bool(billiard_current_process().daemon)
+
+
+def get_parse_pool():
+    """Per-process parser pool sized by SCRAPER_PARSE_WORKERS (None when disabled or broken)"""
+    global _pool, _pool_pid
+    if settings.SCRAPER_PARSE_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        pid = os.getpid()
+        if _pool_failed_pid == pid:
+            return None
+        if _pool is None or _pool_pid != pid:
+            pool_class = BilliardParsePool if _is_daemonic() else ProcessPoolExecutor
+            _pool = pool_class(max_workers=settings.SCRAPER_PARSE_WORKERS)
+            _pool_pid = pid
+        return _pool
+
+
+def _disable_parse_pool(pool, error):
+    """Drop a pool that cannot run work (and the payloads queued in it) for the rest of this process"""
+    global _pool, _pool_failed_pid
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+            _pool_failed_pid = os.getpid()
+    logger.warning(f"Parse pool unavailable, parsing inline from now on: {str(error)}")
+    try:
+        pool.shutdown(wait=False, cancel_futures=True)
+    except Exception:
+        pass
+
+
+def submit_parse(func, *args):
+    """Run a parse function in the pool, or inline when no pool is configured or it is broken"""
+    pool = get_parse_pool()
+    if pool is None:
+        return InlineFuture(func, *args)
+    try:
+        return pool.submit(func, *args)
+    except Exception as e:
+        # Broken pool (killed child, ...): not retried for every page
+        _disable_parse_pool(pool, e)
+        return InlineFuture(func, *args)
+
+
+def shutdown_parse_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+@worker_process_shutdown.connect
+def _shutdown_parse_pool_on_worker_shutdown(**kwargs):
+    shutdown_parse_pool()
@@ -0,0 +1,135 @@
+import logging
+
+from django.conf import settings
+
+from . import metrics
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# prompt.tokens / prompt.requests is the mean prompt size sent to the LLM
+metrics.register(
+    'prompt.requests', 'prompt.tokens', 'prompt.chunks_deduped',
+    'prompt.chunks_dropped', 'prompt.history_dropped'
+)
+
+# Shortest shared prefix/suffix treated as splitter overlap rather than coincidence
+MIN_OVERLAP_CHARS = 30
+MAX_OVERLAP_CHARS = 300
+# A chunk is only cut to fit when at least this many tokens are left for it
+MIN_CHUNK_TOKENS = 50
+
+
+def _overlap(previous, text):
+    """Length of the longest suffix of ``previous`` that starts ``text``"""
+    for size in range(min(len(previous), len(text), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(text[:size]):
+            return size
+    return 0
+
+
+def dedupe_chunks(matches):
+    """
+    Drop retrieved chunks whose text is already contained in a better-ranked
+    one, and trim the text a chunk shares with another (the overlap between
+    consecutive parts of a split item) so it is sent once.
+    Returns: (list of match dicts, number of chunks dropped)
+    """
+    kept = []
+    dropped = 0
+    for match in matches:
+        text = match['text'].strip()
+        if not text or any(text in other['text'] for other in kept):
+            dropped += 1
+            continue
+        for other in kept:
+            shared = _overlap(other['text'], text)
+            if shared:
+                text = text[shared:].lstrip()
+        kept.append({**match, 'text': text})
+    return kept, dropped
+
+
+class PromptBudget:
+    """
+    Assembles the prompt's context and history within ``PROMPT_MAX_TOKENS``
+    (counted with tiktoken).
+
+    The template and question are paid for first. History gets at most
+    ``PROMPT_HISTORY_MAX_TOKENS``: the session's rolling summary of older
+    turns, then the newest messages that still fit. Retrieved chunks,
+    deduplicated, fill what is left in rank order; a chunk that does not
+    fit is skipped (or cut, if it is the first).
+    """
+
+    def __init__(self, template, max_tokens=None, history_max_tokens=None):
+        self.max_tokens = max_tokens or settings.PROMPT_MAX_TOKENS
+        self.history_max_tokens = history_max_tokens or settings.PROMPT_HISTORY_MAX_TOKENS
+        self.template_tokens = count_tokens(template)
+
+    def _history(self, question, chat_history, history_summary):
+        """Returns: (history text, tokens used)"""
+        lines = []
+        used = 0
+        if history_summary:
+            summary_line = f"Summary of earlier conversation: {history_summary}"
+            used = count_tokens(summary_line)
+            lines.append(summary_line)
+
+        messages = list(chat_history or [])
+        # The view appends the current question; it is already in the prompt
+        if messages and messages[-1]['role'] == 'user' and messages[-1]['content'] == question:
+            messages.pop()
+
+        recent = []
+        for msg in reversed(messages):
+            line = f"{msg['role']}: {msg['content']}"
+            tokens = count_tokens(line)
+            if used + tokens > self.history_max_tokens:
+                break
+            recent.append(line)
+            used += tokens
+        if len(recent) < len(messages):
+            metrics.incr('prompt.history_dropped', len(messages) - len(recent))
+        lines.extend(reversed(recent))
+        return "\n".join(lines), used
+
+    def assemble(self, question, matches, chat_history=None, history_summary=''):
+        """
+        Returns: dict with context, chat_history (texts for the template),
+        matches (the chunks actually sent) and tokens (estimated prompt size)
+        """
+        history_text, history_tokens = self._history(question, chat_history, history_summary)
+        used = self.template_tokens + count_tokens(question) + history_tokens
+
+        chunks, deduped = dedupe_chunks(matches)
+        included = []
+        for match in chunks:
+            # Chunks are joined by a blank line (about two tokens)
+            tokens = count_tokens(match['text']) + 2
+            remaining = self.max_tokens - used
+            if tokens <= remaining:
+                included.append(match)
+                used += tokens
+            elif not included and remaining >= MIN_CHUNK_TOKENS:
+                # Never send an empty context when the best chunk alone is too long
+                text = match['text'][:remaining * 4]
+                included.append({**match, 'text': text})
+                used += count_tokens(text)
+
+        metrics.incr('prompt.requests')
+        metrics.incr('prompt.tokens', used)
+        if deduped:
+            metrics.incr('prompt.chunks_deduped', deduped)
+        if len(included) < len(chunks):
+            metrics.incr('prompt.chunks_dropped', len(chunks) - len(included))
+        logger.info(
+            f"Prompt of ~{used} tokens: {len(included)}/{len(matches)} chunks, "
+            f"{history_tokens} history tokens"
+        )
+        return {
+            'context': "\n\n".join(match['text'] for match in included),
+            'chat_history': history_text,
+            'matches': included,
+            'tokens': used,
+        }
@@ -0,0 +1,104 @@
+import re
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import metrics
+from .chunking import OVERVIEW, QA, REVIEW, SPECIFICATIONS
+
+metrics.register('query_planner.filtered', 'query_planner.fallbacks')
+
+_NUMBER_WORDS = {'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5}
+
+# Decimal ratings ("4.5 stars") describe the product average, not a review: no star filter
+_STARS_RE = re.compile(r"(?<![\d.])(\d+(?:\.\d+)?|one|two|three|four|five)[ -]?stars?\b")
+# Sentiment only counts when it is about the reviews; "any issues?" or "do people like it" stay unfiltered
+_SENTIMENT_NOUNS = r"(reviews?|reviewers?|ratings?|feedback|comments)"
+_NEGATIVE_RE = re.compile(
+    r"\b(complain\w*|(negative|bad|critical|unfavou?rable|worst|low[ -]rated) " + _SENTIMENT_NOUNS + r")\b"
+)
+_POSITIVE_RE = re.compile(
+    r"\b(praise\w*|(positive|good|favou?rable|glowing|best|high(ly)?[ -]rated) " + _SENTIMENT_NOUNS + r")\b"
+)
+_REVIEW_RE = re.compile(
+    r"\b(reviews?|reviewers?|ratings?|rated|stars?|complain\w*|"
+    r"(customers?|buyers?|users?|people|owners?) (say|said|think|mention\w*|report\w*|like|love|hate|complain\w*))\b"
+)
+_SPEC_RE = re.compile(
+    r"\b(specs?|specifications?|dimensions?|weight|weigh|model (number|name)|material|wattage|voltage|"
+    r"capacity|resolution|technical details)\b"
+)
+_QA_RE = re.compile(r"(\bq ?& ?a\b|\bq and a\b|\bquestions? (\w+ )?(asked|answered)\b|\b(asked|answered) questions?\b)")
+_HELPFUL_RE = re.compile(r"\b(most helpful|helpful reviews?|top reviews?|most upvoted)\b")
+_RECENT_RE = re.compile(r"\b(recent(ly)?|latest|newest|lately)\b")
+_THIS_YEAR_RE = re.compile(r"\bthis year\b")
+_LAST_PERIOD_RE = re.compile(r"\b(?:last|past) (\d+|few|couple of)? ?(days?|weeks?|months?|years?)\b")
+
+_PERIOD_DAYS = {'day': 1, 'week': 7, 'month': 30, 'year': 365}
+
+
+class QueryPlanner:
+    """
+    Infers a metadata filter for retrieval from the question wording.
+
+    Star ratings ("1-star reviewers"), explicit sentiment ("negative
+    reviews", "complain"), recency ("recent reviews", "last 3 months",
+    "past year") and helpfulness ("most
+    helpful reviews") restrict the search to matching review chunks;
+    specification and Q&A questions restrict it to those chunk types.
+    Questions with no such cue are not filtered.
+    """
+
+    def _rating(self, text):
+        stars = _STARS_RE.search(text)
+        if stars:
+            value = stars.group(1)
+            value = _NUMBER_WORDS.get(value) or float(value)
+            return float(value) if value in (1, 2, 3, 4, 5) else None
+        negative = bool(_NEGATIVE_RE.search(text))
+        positive = bool(_POSITIVE_RE.search(text))
+        if negative and not positive:
+            return {'$lte': settings.RETRIEVAL_NEGATIVE_MAX_RATING}
+        if positive and not negative:
+            return {'$gte': settings.RETRIEVAL_POSITIVE_MIN_RATING}
+        return None
+
+    def _since(self, text):
+        """Oldest review date (YYYYMMDD) the question asks about, or None"""
+        now = timezone.now()
+        period = _LAST_PERIOD_RE.search(text)
+        if period:
+            count = period.group(1)
+            count = int(count) if count and count.isdigit() else (2 if count else 1)
+            since = now - timedelta(days=count * _PERIOD_DAYS[period.group(2).rstrip('s')])
+        elif _THIS_YEAR_RE.search(text):
+            since = now.replace(month=1, day=1)
+        elif _RECENT_RE.search(text):
+            since = now - timedelta(days=settings.RETRIEVAL_RECENT_DAYS)
+        else:
+            return None
+        return int(since.strftime('%Y%m%d'))
+
+    def plan(self, question):
+        """
+        Returns: metadata filter dict for EmbeddingService.query_similar, or None
+        """
+        text = question.lower()
+        # Sentiment or recency alone ("bad battery?", "recent firmware?") says nothing about reviews
+        if _REVIEW_RE.search(text):
+            metadata_filter = {'type': REVIEW}
+            rating = self._rating(text)
+            if rating is not None:
+                metadata_filter['rating'] = rating
+            since = self._since(text)
+            if since is not None:
+                metadata_filter['review_date'] = {'$gte': since}
+            if _HELPFUL_RE.search(text):
+                metadata_filter['helpful_votes'] = {'$gte': settings.RETRIEVAL_HELPFUL_MIN_VOTES}
+            return metadata_filter
+        if _QA_RE.search(text):
+            return {'type': QA}
+        if _SPEC_RE.search(text):
+            return {'type': {'$in': [SPECIFICATIONS, OVERVIEW]}}
+        return None
@@ -0,0 +1,331 @@
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+from .redis_client import get_redis
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+# wait_ms / acquired is the mean queueing delay in front of a provider
+for _name in settings.RATE_LIMITS:
+    metrics.register(*(
+        f"rate_limit.{_name}.{counter}"
+        for counter in ('acquired', 'wait_ms', 'throttled', 'retries', 'rejected', 'transient_retries')
+    ))
+
+# Refill both buckets for the time elapsed since the last call, then take one
+# request and ARGV[4] tokens if both have enough. Returns 0 when granted,
+# otherwise the milliseconds until they would be. A call larger than the
+# whole token bucket is capped to it so it can still pass when the bucket is full.
+_TAKE = """
+local rpm = tonumber(ARGV[2])
+local tpm = tonumber(ARGV[3])
+local now = tonumber(ARGV[1])
+local state = redis.call('HMGET', KEYS[1], 'requests', 'tokens', 'ts')
+local requests = tonumber(state[1]) or rpm
+local tokens = tonumber(state[2]) or tpm
+local elapsed = math.max(0, now - (tonumber(state[3]) or now))
+requests = math.min(rpm, requests + elapsed * rpm / 60000)
+tokens = math.min(tpm, tokens + elapsed * tpm / 60000)
+local wanted = math.min(tonumber(ARGV[4]), tpm)
+local wait = 0
+if requests < 1 then
+    wait = math.max(wait, (1 - requests) * 60000 / rpm)
+end
+if tokens < wanted then
+    wait = math.max(wait, (wanted - tokens) * 60000 / tpm)
+end
+if wait == 0 then
+    requests = requests - 1
+    tokens = tokens - wanted
+end
+redis.call('HSET', KEYS[1], 'requests', tostring(requests), 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], 120000)
+return math.ceil(wait)
+"""
+
+
+class RateLimitExceeded(Exception):
+    """The provider (or our own budget) is still throttling after every retry"""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f"Rate limit exceeded for {name}; retry after {retry_after}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_rate_limit_error(exc):
+    """True for provider 429 / quota errors (OpenAI, Gemini and their HTTP clients)"""
+    status = getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status == 429 or getattr(exc, 'code', None) == 429:
+        return True
+    if type(exc).__name__ in ('RateLimitError', 'ResourceExhausted', 'TooManyRequests'):
+        return True
+    message = str(exc)
+    return '429' in message or 'RESOURCE_EXHAUSTED' in message or 'rate limit' in message.lower()
+
+
+_TRANSIENT_STATUS = {408, 500, 502, 503, 504}
+_TRANSIENT_ERRORS = {
+    # openai / httpx
+    'APIConnectionError', 'APITimeoutError', 'InternalServerError', 'ConnectError',
+    'ConnectTimeout', 'ReadTimeout', 'ReadError', 'RemoteProtocolError',
+    # google.api_core (Gemini)
+    'ServiceUnavailable', 'DeadlineExceeded', 'InternalServerError',
+}
+
+
+def is_transient_error(exc):
+    """True for server-side (5xx), timeout and connection errors worth retrying"""
+    if isinstance(exc, (ConnectionError, TimeoutError)):
+        return True
+    status = getattr(exc, 'status_code', None) or getattr(getattr(exc, 'response', None), 'status_code', None)
+    if status in _TRANSIENT_STATUS or getattr(exc, 'code', None) in _TRANSIENT_STATUS:
+        return True
+    return type(exc).__name__ in _TRANSIENT_ERRORS
+
+
+class TokenBucket:
+    """
+    Redis token bucket shared by every worker: ``requests_per_minute`` and
+    ``tokens_per_minute`` refill continuously and a call waits until both
+    can cover it. If Redis is unreachable calls are let through.
+    """
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute, redis_client=None):
+        self.name = name
+        self.key = f"rate_limit:{name}"
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.redis = redis_client or get_redis()
+        self._take = self.redis.register_script(_TAKE)
+
+    def try_acquire(self, tokens=0):
+        """Returns: 0 if granted, else milliseconds to wait before trying again"""
+        try:
+            return int(self._take(
+                keys=[self.key],
+                args=[int(time.time() * 1000), self.requests_per_minute, self.tokens_per_minute, int(tokens)]
+            ))
+        except Exception as e:
+            logger.warning(f"Rate limiter {self.name} unavailable, not throttling: {str(e)}")
+            return 0
+
+    def _next_wait(self, tokens, started, max_wait):
+        wait_ms = self.try_acquire(tokens)
+        if wait_ms and time.monotonic() - started + wait_ms / 1000.0 > max_wait:
+            metrics.incr(f"rate_limit.{self.name}.rejected")
+            raise RateLimitExceeded(self.name, max(1, round(wait_ms / 1000.0)))
+        return wait_ms
+
+    def _record(self, started):
+        metrics.incr(f"rate_limit.{self.name}.acquired")
+        metrics.incr(f"rate_limit.{self.name}.wait_ms", int((time.monotonic() - started) * 1000))
+
+    def acquire(self, tokens=0, max_wait=None):
+        """Block until the call fits the budget; raises RateLimitExceeded past ``max_wait`` seconds"""
+        max_wait = settings.RATE_LIMIT_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        started = time.monotonic()
+        while True:
+            wait_ms = self._next_wait(tokens, started, max_wait)
+            if not wait_ms:
+                break
+            # A little jitter so waiting workers do not retry in lockstep
+            time.sleep(wait_ms / 1000.0 * random.uniform(1.0, 1.1))
+        self._record(started)
+
+    async def aacquire(self, tokens=0, max_wait=None):
+        max_wait = settings.RATE_LIMIT_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        started = time.monotonic()
+        while True:
+            # The bucket script is a blocking Redis round trip
+            wait_ms = await sync_to_async(self._next_wait, thread_sensitive=False)(tokens, started, max_wait)
+            if not wait_ms:
+                break
+            await asyncio.sleep(wait_ms / 1000.0 * random.uniform(1.0, 1.1))
+        self._record(started)
+
+
+class AdaptiveConcurrency:
+    """
+    Per-process AIMD cap on in-flight calls: the limit grows by one per
+    ``limit`` successful calls and halves on every 429, between 1 and
+    ``max_limit``.
+    """
+
+    def __init__(self, max_limit, initial=None):
+        self.max_limit = max_limit
+        self.limit = float(initial or max(1, max_limit // 2))
+        self.in_flight = 0
+        self._cond = threading.Condition()
+
+    def _try_enter(self):
+        with self._cond:
+            if self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return True
+            return False
+
+    def enter(self):
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+
+    async def aenter(self):
+        # Polls rather than blocking the event loop on the condition
+        while not self._try_enter():
+            await asyncio.sleep(0.02)
+
+    def exit(self, throttled=False):
+        with self._cond:
+            self.in_flight -= 1
+            if throttled:
+                self.limit = max(1.0, self.limit / 2)
+            else:
+                self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+class ProviderLimiter:
+    """
+    Rate control around one provider: shared token bucket, adaptive
+    concurrency and full-jitter exponential backoff on 429s. Raises
+    RateLimitExceeded once ``RATE_LIMIT_MAX_RETRIES`` retries are used up.
+    The provider clients are built without their own retries, so transient
+    errors (5xx, timeouts, dropped connections) are retried here too, with
+    the same backoff, up to ``RATE_LIMIT_TRANSIENT_RETRIES`` times.
+    """
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute, max_concurrency, redis_client=None):
+        self.name = name
+        self.bucket = TokenBucket(name, requests_per_minute, tokens_per_minute, redis_client)
+        self.concurrency = AdaptiveConcurrency(max_concurrency)
+        self.max_retries = settings.RATE_LIMIT_MAX_RETRIES
+        self.transient_retries = settings.RATE_LIMIT_TRANSIENT_RETRIES
+
+    def backoff(self, attempt):
+        cap = min(settings.RATE_LIMIT_BACKOFF_MAX_MS, settings.RATE_LIMIT_BACKOFF_BASE_MS * 2 ** attempt)
+        return random.uniform(0, cap) / 1000.0
+
+    def _on_error(self, exc, retries):
+        """
+        Count the retry in ``retries`` ({'throttled': n, 'transient': n}); 429s
+        and transient errors have separate budgets and backoff sequences
+        Returns: seconds to back off before retrying; raises if the error is final
+        """
+        if not is_rate_limit_error(exc):
+            attempt = retries['transient']
+            if not is_transient_error(exc) or attempt >= self.transient_retries:
+                raise exc
+            retries['transient'] += 1
+            delay = self.backoff(attempt)
+            metrics.incr(f"rate_limit.{self.name}.transient_retries")
+            logger.warning(
+                f"{self.name} call failed ({type(exc).__name__}: {str(exc)}), "
+                f"retrying in {delay:.2f}s (attempt {attempt + 1})"
+            )
+            return delay
+        attempt = retries['throttled']
+        metrics.incr(f"rate_limit.{self.name}.throttled")
+        delay = self.backoff(attempt)
+        if attempt >= self.max_retries:
+            raise RateLimitExceeded(self.name, max(1, round(delay))) from exc
+        retries['throttled'] += 1
+        metrics.incr(f"rate_limit.{self.name}.retries")
+        logger.warning(f"{self.name} rate limited, retrying in {delay:.2f}s (attempt {attempt + 1})")
+        return delay
+
+    def call(self, func, *args, tokens=0, **kwargs):
+        # Retries until _on_error raises
+        retries = {'throttled': 0, 'transient': 0}
+        while True:
+            self.bucket.acquire(tokens)
+            self.concurrency.enter()
+            throttled = False
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                delay = self._on_error(e, retries)
+            finally:
+                self.concurrency.exit(throttled)
+            time.sleep(delay)
+
+    async def acall(self, func, *args, tokens=0, **kwargs):
+        retries = {'throttled': 0, 'transient': 0}
+        while True:
+            await self.bucket.aacquire(tokens)
+            await self.concurrency.aenter()
+            throttled = False
+            try:
+                return await func(*args, **kwargs)
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                delay = self._on_error(e, retries)
+            finally:
+                self.concurrency.exit(throttled)
+            await asyncio.sleep(delay)
+
+    async def astream(self, func, *args, tokens=0, **kwargs):
+        """Rate-limited async iteration; only retried while nothing has been yielded"""
+        retries = {'throttled': 0, 'transient': 0}
+        while True:
+            await self.bucket.aacquire(tokens)
+            await self.concurrency.aenter()
+            throttled = False
+            started = False
+            try:
+                async for item in func(*args, **kwargs):
+                    started = True
+                    yield item
+                return
+            except Exception as e:
+                throttled = is_rate_limit_error(e)
+                if started:
+                    raise
+                delay = self._on_error(e, retries)
+            finally:
+                self.concurrency.exit(throttled)
+            await asyncio.sleep(delay)
+
+
+class RateLimitedEmbeddings:
+    """LangChain embeddings client whose provider requests go through the 'embeddings' limiter"""
+
+    def __init__(self, embeddings, limiter=None):
+        self.embeddings = embeddings
+        self.model = getattr(embeddings, 'model', 'default')
+        self.limiter = limiter or get_limiter('embeddings')
+
+    def embed_documents(self, texts):
+        tokens = sum(count_tokens(text) for text in texts)
+        return self.limiter.call(self.embeddings.embed_documents, texts, tokens=tokens)
+
+    def embed_query(self, text):
+        return self.limiter.call(self.embeddings.embed_query, text, tokens=count_tokens(text))
+
+
+_lock = threading.Lock()
+_limiters = {}
+_limiters_pid = None
+
+
+def get_limiter(name):
+    """Process-wide limiter configured by ``settings.RATE_LIMITS[name]``"""
+    global _limiters_pid
+    with _lock:
+        if _limiters_pid != os.getpid():
+            _limiters.clear()
+            _limiters_pid = os.getpid()
+        if name not in _limiters:
+            _limiters[name] = ProviderLimiter(name, **settings.RATE_LIMITS[name])
+        return _limiters[name]
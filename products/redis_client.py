@@ -0,0 +1,19 @@
+import os
+import threading
+
+import redis
+from django.conf import settings
+
+_lock = threading.Lock()
+_client = None
+_client_pid = None
+
+
+def get_redis():
+    """Shared redis-py client for queues and limiters (the Django cache only covers get/set)"""
+    global _client, _client_pid
+    with _lock:
+        if _client is None or _client_pid != os.getpid():
+            _client = redis.Redis.from_url(settings.REDIS_URL)
+            _client_pid = os.getpid()
+        return _client
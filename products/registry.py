@@ -0,0 +1,80 @@
+import logging
+import os
+import threading
+
+from celery.signals import worker_process_init
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceRegistry:
+    """
+    Lazily built, per-process cache of the heavy service objects.
+
+    QAService and EmbeddingService own network clients (Gemini, OpenAI,
+    Pinecone) whose HTTP connection pools must not be shared across a fork,
+    so every instance is tagged with the pid that created it and the whole
+    registry is dropped in a forked child (gunicorn / Celery prefork workers).
+    """
+
+    def __init__(self):
+        # Re-entrant: the QAService factory builds the EmbeddingService through the registry
+        self._lock = threading.RLock()
+        self._services = {}
+        self._pid = os.getpid()
+
+    def get(self, name, factory):
+        """Return the cached service `name`, building it with `factory` once."""
+        self._check_pid()
+        service = self._services.get(name)
+        if service is not None:
+            return service
+
+        with self._lock:
+            service = self._services.get(name)
+            if service is None:
+                logger.info(f"Initializing {name} for process {self._pid}")
+                service = factory()
+                self._services[name] = service
+        return service
+
+    def reset(self):
+        """Forget every cached service (called after fork)."""
+        self._lock = threading.RLock()
+        self._services = {}
+        self._pid = os.getpid()
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self.reset()
+
+
+registry = ServiceRegistry()
+
+
+def get_embedding_service():
+    """Process-wide EmbeddingService shared by views and Celery tasks"""
+    from .embeddings import EmbeddingService
+    return registry.get('embedding_service', EmbeddingService)
+
+
+def get_qa_service():
+    """Process-wide QAService reusing the shared EmbeddingService"""
+    from .services import QAService
+    return registry.get(
+        'qa_service',
+        lambda: QAService(embedding_service=get_embedding_service())
+    )
+
+
+def reset_services():
+    registry.reset()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_services)
+
+
+@worker_process_init.connect
+def _reset_on_worker_init(**kwargs):
+    reset_services()
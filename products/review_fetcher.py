@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.utils import timezone
+from playwright.async_api import async_playwright
+
+from . import metrics
+from .browser_pool import USER_AGENT
+
+logger = logging.getLogger(__name__)
+
+metrics.register('review_fetcher.pages', 'review_fetcher.failures', 'review_fetcher.memory_fallbacks')
+
+
+def available_memory_mb():
+    """MemAvailable of the host in MB, or None where /proc/meminfo can't be read"""
+    try:
+        with open('/proc/meminfo') as meminfo:
+            for line in meminfo:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def has_memory_for_fetcher():
+    """
+    True if the host has SCRAPER_REVIEW_FETCHER_MIN_FREE_MB available (or it
+    can't be told). The fetcher is a second Chromium in each scrape worker,
+    so below the budget reviews are paginated in the pooled browser instead.
+    """
+    available = available_memory_mb()
+    if available is None or available >= settings.SCRAPER_REVIEW_FETCHER_MIN_FREE_MB:
+        return True
+    metrics.incr('review_fetcher.memory_fallbacks')
+    logger.warning(
+        f"Only {available} MB available (budget {settings.SCRAPER_REVIEW_FETCHER_MIN_FREE_MB} MB), "
+        f"paginating reviews sequentially"
+    )
+    return False
+
+
+class HostThrottle:
+    """Minimum delay between request starts to the same host"""
+
+    def __init__(self, delay_ms):
+        self.delay = delay_ms / 1000.0
+        self._locks = {}
+        self._last_start = {}
+
+    async def wait(self, url):
+        host = urlparse(url).hostname or ''
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            remaining = self._last_start.get(host, 0) + self.delay - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            self._last_start[host] = time.monotonic()
+
+
+class ConcurrentReviewFetcher:
+    """
+    Fetches several review pages at once with async Playwright.
+
+    The sync scraper API cannot run pages concurrently, and the pooled sync
+    browser is bound to its own thread, so this drives a second Chromium
+    from an asyncio loop on a background thread. It follows the browser
+    pool's lifecycle: relaunched after ``SCRAPER_BROWSER_MAX_USES`` pages
+    (between batches, never under in-flight pages) or when found
+    disconnected, and counted in the ``browser_pool.*`` metrics. Each page
+    is loaded in its own context (seeded with the product page's cookies)
+    under a semaphore of ``concurrency`` pages, and request starts to one
+    host are spaced by ``host_delay_ms``. One fetcher is kept per process.
+    """
+
+    def __init__(self, concurrency=None, host_delay_ms=None, headless=True, max_uses=None):
+        self.concurrency = concurrency or settings.SCRAPER_REVIEW_CONCURRENCY
+        self.host_delay_ms = settings.SCRAPER_REVIEW_HOST_DELAY_MS if host_delay_ms is None else host_delay_ms
+        self.headless = headless
+        self.max_uses = max_uses or settings.SCRAPER_BROWSER_MAX_USES
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name='review-fetcher', daemon=True
+        )
+        self._thread.start()
+        self._playwright = None
+        self._browser = None
+        self._launch_lock = None
+        self._throttle = HostThrottle(self.host_delay_ms)
+        # Only touched from the fetcher's loop thread
+        self._uses = 0
+        self._active = 0
+        self.launches = 0
+        self.pages_served = 0
+
+    async def _acquire_browser(self):
+        """Browser for one batch of pages; release with _release_browser"""
+        # Created lazily so it binds to the fetcher's loop
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            if self._browser is not None:
+                if not self._browser.is_connected():
+                    logger.warning("Review browser disconnected, relaunching")
+                    await self._close_browser()
+                elif self._uses >= self.max_uses and not self._active:
+                    logger.info(f"Recycling review browser after {self._uses} uses")
+                    metrics.incr('browser_pool.recycles')
+                    await self._close_browser()
+            if self._browser is None:
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                logger.info("Launching async Playwright browser for review pages...")
+                self._browser = await self._playwright.chromium.launch(
+                    headless=self.headless,
+                    args=['--no-sandbox', '--disable-setuid-sandbox']
+                )
+                self._uses = 0
+                self.launches += 1
+                metrics.incr('browser_pool.launches')
+            self._active += 1
+            return self._browser
+
+    def _release_browser(self):
+        self._active -= 1
+
+    async def _fetch_one(self, browser, semaphore, url, wait_selector, extract, storage_state, route_handler):
+        async with semaphore:
+            await self._throttle.wait(url)
+            context = await browser.new_context(user_agent=USER_AGENT, storage_state=storage_state)
+            self._uses += 1
+            self.pages_served += 1
+            metrics.incr('browser_pool.pages')
+            try:
+                page = await context.new_page()
+                if route_handler is not None:
+                    await page.route("**/*", route_handler)
+                await page.goto(url, timeout=30000, wait_until='domcontentloaded')
+                try:
+                    await page.wait_for_selector(wait_selector, timeout=5000)
+                except Exception:
+                    pass  # Past the last page: no reviews rendered
+                result = {
+                    'url': page.url,
+                    'html': await page.content(),
+                    'fetched_at': timezone.now(),
+                    'data': None,
+                }
+                if extract is not None:
+                    script, arg = extract
+                    result['data'] = await page.evaluate(script, arg)
+                return result
+            finally:
+                await context.close()
+
+    async def _fetch_all(self, urls, wait_selector, extract, storage_state, route_handler):
+        browser = await self._acquire_browser()
+        try:
+            semaphore = asyncio.Semaphore(self.concurrency)
+            return await asyncio.gather(
+                *(
+                    self._fetch_one(browser, semaphore, url, wait_selector, extract, storage_state, route_handler)
+                    for url in urls
+                ),
+                return_exceptions=True
+            )
+        finally:
+            self._release_browser()
+
+    def fetch(self, urls, wait_selector, extract=None, storage_state=None, route_handler=None):
+        """
+        Load ``urls`` concurrently; blocks the calling thread until all are done.
+        ``extract`` is an optional (script, arg) evaluated in each page and
+        ``route_handler`` an optional async Playwright route handler.
+        Returns: one dict (url, html, fetched_at, data) or Exception per url, in order
+        """
+        future = asyncio.run_coroutine_threadsafe(
+            self._fetch_all(urls, wait_selector, extract, storage_state, route_handler),
+            self._loop
+        )
+        results = future.result()
+        failures = sum(1 for result in results if isinstance(result, Exception))
+        metrics.incr('review_fetcher.pages', len(results) - failures)
+        if failures:
+            metrics.incr('review_fetcher.failures', failures)
+        return results
+
+    async def _close_browser(self):
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception:
+                pass
+        self._browser = None
+
+    async def _close(self):
+        await self._close_browser()
+        if self._playwright is not None:
+            try:
+                await self._playwright.stop()
+            except Exception:
+                pass
+        self._playwright = None
+
+    def stats(self):
+        return {
+            'launches': self.launches,
+            'pages_served': self.pages_served,
+            'reuses': self.pages_served - self.launches,
+        }
+
+    def close(self):
+        try:
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result(timeout=30)
+        except Exception as e:
+            logger.warning(f"Error closing review fetcher: {str(e)}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+_lock = threading.Lock()
+_fetcher = None
+_fetcher_pid = None
+
+
+def get_review_fetcher():
+    """Review fetcher shared by every thread of the current process"""
+    global _fetcher, _fetcher_pid
+    with _lock:
+        if _fetcher is None or _fetcher_pid != os.getpid():
+            _fetcher = ConcurrentReviewFetcher()
+            _fetcher_pid = os.getpid()
+        return _fetcher
+
+
+def close_review_fetcher():
+    global _fetcher
+    with _lock:
+        if _fetcher is not None and _fetcher_pid == os.getpid():
+            _fetcher.close()
+            logger.info(f"Review fetcher browser stats: {_fetcher.stats()}")
+        _fetcher = None
+
+
+@worker_process_shutdown.connect
+def _close_fetcher_on_worker_shutdown(**kwargs):
+    close_review_fetcher()
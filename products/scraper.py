@@ -2,41 +2,228 @@
 
 import json
 import time
-from playwright.sync_api import sync_playwright, TimeoutError
+from urllib.parse import urlparse
+from playwright.sync_api import TimeoutError, Error as PlaywrightError
 from django.conf import settings
+from django.utils import timezone
+from .amazon_selectors import QA_LIMIT, RELATED_PRODUCTS_LIMIT, SELECTORS
+from .amazon_urls import review_page_url
+from .browser_pool import get_browser_pool
+from .review_fetcher import get_review_fetcher, has_memory_for_fetcher
+from .parsers import (
+    InlineFuture, create_scraped_text, parse_product_page, parse_reviews_page, submit_parse
+)
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Resource types aborted in fast mode (the DOM text is all we extract)
+BLOCKED_RESOURCE_TYPES = {
+    'image', 'media', 'font', 'texttrack', 'eventsource', 'websocket', 'manifest', 'ping'
+}
+
+# In-page extractors: one CDP round trip returns every field as one JSON blob
+_JS_HELPERS = r"""
+    const text = (el) => (el ? (el.innerText || '').trim() : '');
+    const all = (selector, root = document) => Array.from(root.querySelectorAll(selector));
+    const first = (selector, root = document) => root.querySelector(selector);
+    const texts = (selector) => all(selector).map(text).filter(Boolean);
+    const extractReviews = () => all(sel.review).map((review) => ({
+        title: text(first(sel.review_title, review)),
+        text: text(first(sel.review_text, review)),
+        rating: text(first(sel.review_rating, review)),
+        customer_name: text(first(sel.review_customer_name, review)),
+        helpful_votes: text(first(sel.review_helpful_votes, review)) || '0 people found this helpful',
+        date: text(first(sel.review_date, review)),
+    })).filter((review) => review.text);
+"""
+
+EXTRACT_REVIEWS_JS = "(sel) => {" + _JS_HELPERS + r"""
+    const next = first(sel.next_reviews_page);
+    return {
+        reviews: extractReviews(),
+        has_next_page: !!next && !next.closest('.a-disabled'),
+    };
+}"""
+
+EXTRACT_PRODUCT_JS = "([sel, limits]) => {" + _JS_HELPERS + r"""
+    const visible = (el) => !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length);
+    const data = {};
+
+    data.title = text(all(sel.title).find(visible));
+    data.current_price = text(first(sel.current_price));
+    data.original_price = text(first(sel.original_price));
+    data.features = text(first(sel.features));
+    data.brand = text(first(sel.brand));
+    data.availability = text(first(sel.availability));
+    data.variants = texts(sel.variants);
+    data.qa = all(sel.qa).slice(0, limits.qa).map(text).filter(Boolean);
+    data.categories = texts(sel.categories);
+    data.shipping_info = texts(sel.shipping_info).filter((value) => value.length > 5);
+    data.sales_rank = text(first(sel.sales_rank));
+
+    data.specifications = {};
+    for (const rowSelector of sel.specification_rows) {
+        for (const row of all(rowSelector)) {
+            const key = text(first(sel.specification_key, row));
+            const value = text(first(sel.specification_value, row));
+            if (key && value && key !== value) data.specifications[key] = value;
+        }
+    }
+
+    data.related_products = [];
+    const base = location.href.split('/dp/')[0];
+    for (const selector of sel.related_products) {
+        for (const link of all(selector).slice(0, limits.related_products)) {
+            const title = link.getAttribute('title');
+            let href = link.getAttribute('href');
+            if (title && href) {
+                if (!href.startsWith('http')) href = base + href;
+                data.related_products.push({title: title, url: href});
+            }
+        }
+    }
+
+    data.has_reviews_section = !!first(sel.reviews_section);
+    data.has_see_all_reviews = !!first(sel.see_all_reviews);
+    data.reviews = extractReviews();
+    return data;
+}"""
+
+HAS_NEXT_PAGE_JS = """(selector) => {
+    const next = document.querySelector(selector);
+    return !!next && !next.closest('.a-disabled');
+}"""
+
+PARSE_ENGINES = ('browser', 'lxml')
+REVIEW_FETCH_MODES = ('sequential', 'concurrent')
+
+
+def is_blocked_request(resource_type, url, allowed_suffixes):
+    """Fast-mode filter: non-essential resource types and non-first-party hosts"""
+    host = urlparse(url).hostname or ''
+    first_party_host = any(
+        host == suffix or host.endswith('.' + suffix) for suffix in allowed_suffixes
+    )
+    return resource_type in BLOCKED_RESOURCE_TYPES or not first_party_host
+
 # --- Synchronous Playwright Implementation ---
 
 class AmazonProductScraper:
     """Amazon product scraper migrated to Playwright for reliable driver management."""
     
-    def __init__(self):
-        # Playwright manages the driver path internally, so we don't need a path here.
-        self.headless = True # Set to True for production background scraping
-        self.browser = None
+    def __init__(self, browser_pool=None, fast_mode=None, parse_engine=None, capture_pages=None,
+                 review_fetch_mode=None):
+        # Browser lifecycle is owned by the per-worker pool (see browser_pool.py)
+        self.browser_pool = browser_pool or get_browser_pool()
         self.page = None
+        self.fast_mode = settings.SCRAPER_FAST_MODE if fast_mode is None else fast_mode
+        self.parse_engine = parse_engine or settings.SCRAPER_PARSE_ENGINE
+        if self.parse_engine not in PARSE_ENGINES:
+            raise ValueError(f"Unknown parse engine: {self.parse_engine}")
+        self.review_fetch_mode = review_fetch_mode or settings.SCRAPER_REVIEW_FETCH_MODE
+        if self.review_fetch_mode not in REVIEW_FETCH_MODES:
+            raise ValueError(f"Unknown review fetch mode: {self.review_fetch_mode}")
+        self.max_review_pages = 5
+        self.product_url = None
+        # Raw HTML of every fetched page, handed to the page archive by the task
+        self.capture_pages = settings.PAGE_ARCHIVE_ENABLED if capture_pages is None else capture_pages
+        self.fetched_pages = []
+        self.blocked_requests = 0
 
-    def setup_browser(self, p):
-        """Setup Playwright browser instance."""
-        logger.info("Launching Playwright browser (Chromium)...")
-        # Playwright automatically handles the browser executable version
-        self.browser = p.chromium.launch(
-            headless=self.headless,
-            args=['--no-sandbox', '--disable-setuid-sandbox'] 
-        )
-        self.page = self.browser.new_page()
-        
-        # Set User-Agent and anti-bot headers
-        self.page.set_extra_http_headers({
-            "User-Agent": (
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
-            )
+    def allowed_host_suffixes(self, product_url):
+        first_party = urlparse(product_url).hostname or ''
+        return [first_party] + list(settings.SCRAPER_ALLOWED_HOST_SUFFIXES)
+
+    def install_fast_routes(self, product_url):
+        """Abort non-essential resource types and third-party hosts (fast mode)."""
+        allowed_suffixes = self.allowed_host_suffixes(product_url)
+
+        def handle(route):
+            request = route.request
+            if is_blocked_request(request.resource_type, request.url, allowed_suffixes):
+                self.blocked_requests += 1
+                return route.abort()
+            return route.continue_()
+
+        self.page.route("**/*", handle)
+
+    def async_fast_route_handler(self, product_url):
+        """Same filter as install_fast_routes, for the async review fetcher"""
+        allowed_suffixes = self.allowed_host_suffixes(product_url)
+
+        async def handle(route):
+            request = route.request
+            if is_blocked_request(request.resource_type, request.url, allowed_suffixes):
+                self.blocked_requests += 1
+                return await route.abort()
+            return await route.continue_()
+
+        return handle
+
+    def wait_for_reviews(self, review_selector, stale_review=None):
+        """
+        Wait until a (new) review list is rendered.
+        Fast mode waits on the review elements themselves instead of networkidle,
+        which never settles on pages with long-polling trackers.
+        """
+        if not self.fast_mode:
+            self.page.wait_for_load_state('networkidle', timeout=5000)
+            return
+
+        if stale_review is not None:
+            try:
+                # AJAX pagination swaps the list: wait for the old first review to go away
+                self.page.wait_for_function("el => !el.isConnected", arg=stale_review, timeout=5000)
+            except PlaywrightError:
+                pass  # Full navigation destroyed the old document
+        self.page.wait_for_selector(review_selector, timeout=5000)
+
+    def capture_page(self, page_type):
+        """Record the current page's HTML when it is archived or parsed offline"""
+        if not self.capture_pages and self.parse_engine != 'lxml':
+            return None
+        html = self.page.content()
+        self.record_page(self.page.url, page_type, html, timezone.now())
+        return html
+
+    def record_page(self, url, page_type, html, fetched_at):
+        if not self.capture_pages:
+            return
+        review_pages = sum(1 for p in self.fetched_pages if p['page_type'] == 'reviews')
+        self.fetched_pages.append({
+            'url': url,
+            'page_type': page_type,
+            'page_number': review_pages + 1 if page_type == 'reviews' else 0,
+            'html': html,
+            'fetched_at': fetched_at,
         })
 
+    def extract_product_page(self):
+        """
+        Start extracting the product page; returns a future of the product_data dict.
+        'browser' evaluates in the page, 'lxml' parses page.content() in the parse pool.
+        """
+        html = self.capture_page('product')
+        if self.parse_engine == 'lxml':
+            return submit_parse(parse_product_page, html, self.page.url)
+        return InlineFuture(
+            self.page.evaluate,
+            EXTRACT_PRODUCT_JS,
+            [SELECTORS, {'qa': QA_LIMIT, 'related_products': RELATED_PRODUCTS_LIMIT}]
+        )
+
+    def extract_reviews_page(self):
+        """Start extracting the current review page; returns (future of reviews, has_next_page)"""
+        html = self.capture_page('reviews')
+        if self.parse_engine == 'lxml':
+            # Pagination is read from the live page so parsing overlaps the next fetch
+            future = submit_parse(parse_reviews_page, html)
+            has_next_page = self.page.evaluate(HAS_NEXT_PAGE_JS, SELECTORS['next_reviews_page'])
+            return future, has_next_page
+        page_data = self.page.evaluate(EXTRACT_REVIEWS_JS, SELECTORS)
+        return InlineFuture(lambda: page_data), page_data['has_next_page']
+
     def safe_find_element(self, selector, timeout=3):
         """Find element using Playwright locator with error handling."""
         try:
@@ -47,83 +234,22 @@ class AmazonProductScraper:
         except TimeoutError:
             return None
             
-    def extract_text_safe(self, locator):
-        """Extract text from Playwright locator."""
-        try:
-            return locator.inner_text().strip()
-        except Exception:
-            return ""
-
-    def extract_attribute_safe(self, locator, attribute):
-        """Extract attribute from Playwright locator."""
-        try:
-            return locator.get_attribute(attribute)
-        except Exception:
-            return ""
-
     def scrape_product_data(self, product_url):
         """Main scraping method using synchronous Playwright execution."""
         
-        # Use sync_playwright as the execution context for the synchronous Celery task
-        with sync_playwright() as p:
+        # Pages come from the worker's persistent browser, in a fresh context
+        self.fetched_pages = []
+        self.product_url = product_url
+        with self.browser_pool.page() as page:
+            self.page = page
             try:
-                self.setup_browser(p)
-                logger.info(f"Navigating to: {product_url}")
-                self.page.goto(product_url, timeout=60000) # 60 sec timeout
-                
-                # Wait for critical element (product title)
-                self.page.wait_for_selector("#productTitle", timeout=8000)
-                logger.info("Page loaded...")
-                
-                product_data = {}
-                
-                # --- 1. Product Title (FIXED: Use :visible to avoid strict mode error) ---
-                title_locator = self.page.locator("#productTitle:visible")
-                product_data['title'] = self.extract_text_safe(title_locator)
-                
-                # --- 2. Price Information ---
-                price_locator = self.page.locator(".a-price .a-offscreen").first
-                product_data['current_price'] = self.extract_text_safe(price_locator)
-                price_orig_locator = self.page.locator(".a-text-price .a-offscreen").first
-                product_data['original_price'] = self.extract_text_safe(price_orig_locator)
-                
-                # --- 3. Product Features ---
-                features_locator = self.page.locator("#feature-bullets")
-                product_data['features'] = self.extract_text_safe(features_locator)
-                
-                # --- 4. Product Specifications ---
-                product_data['specifications'] = self._extract_specifications_pw()
+                self._open_product_page(product_url)
                 
-                # --- 6. Brand Information ---
-                product_data['brand'] = self.extract_text_safe(self.page.locator("#bylineInfo"))
-                
-                # --- 7. Availability Status ---
-                product_data['availability'] = self.extract_text_safe(self.page.locator("#availability"))
-                
-                # --- 8. Product Variants ---
-                variants_locators = self.page.locator("#variation_size_name li, #variation_color_name li").all()
-                product_data['variants'] = [self.extract_text_safe(v) for v in variants_locators if self.extract_text_safe(v)]
-                
-                # --- 9. Customer Questions & Answers ---
-                qa_locators = self.page.locator("#ask-btf_feature_div .a-section").all()
-                product_data['qa'] = [self.extract_text_safe(qa) for qa in qa_locators[:10] if self.extract_text_safe(qa)]
-                
-                # --- 10. Related Products (Simplified) ---
-                product_data['related_products'] = self._extract_related_products_pw()
-                
-                # --- 11. Categories ---
-                categories_locators = self.page.locator("#wayfinding-breadcrumbs_feature_div a").all()
-                product_data['categories'] = [self.extract_text_safe(c) for c in categories_locators if self.extract_text_safe(c)]
-                
-                # --- 12. Shipping Information ---
-                shipping_locators = self.page.locator("#mir-layout-DELIVERY_BLOCK").all()
-                product_data['shipping_info'] = [self.extract_text_safe(s) for s in shipping_locators if self.extract_text_safe(s) and len(self.extract_text_safe(s)) > 5]
-                
-                # --- 13. Best Seller Rank ---
-                product_data['sales_rank'] = self.extract_text_safe(self.page.locator("#SalesRank"))
+                # --- 1-13. Every product field in one evaluation (or one offline parse) ---
+                product_data = self.extract_product_page().result()
                 
                 # --- 5. Customer Reviews (Run last, includes pagination) ---
-                product_data['reviews'] = self._extract_reviews_pw()
+                product_data['reviews'] = self._extract_reviews_pw(product_data)
                 
                 # --- 14. Concatenate text for RAG (Re-used existing logic) ---
                 product_data['scraped_text'] = self._create_scraped_text(product_data)
@@ -135,70 +261,78 @@ class AmazonProductScraper:
                 logger.error(f"Error occurred while scraping: {str(e)}", exc_info=True)
                 raise # Raise exception for Celery to mark as failed
             finally:
-                if self.browser:
-                    self.browser.close()
+                self.page = None
+
+    def _open_product_page(self, product_url):
+        logger.info(f"Navigating to: {product_url}")
+        if self.fast_mode:
+            self.install_fast_routes(product_url)
+            # Don't wait for the load event (images, ads); the selector wait below suffices
+            self.page.goto(product_url, timeout=60000, wait_until='domcontentloaded')
+        else:
+            self.page.goto(product_url, timeout=60000) # 60 sec timeout
+        
+        # Wait for critical element (product title)
+        self.page.wait_for_selector("#productTitle", timeout=8000)
+        logger.info("Page loaded...")
+
+    def fetch_product_page(self, product_url):
+        """
+        Load only the product page (buy-box refresh: no review pagination).
+        Returns: the captured page (url, page_type, page_number, html, fetched_at)
+        """
+        self.fetched_pages = []
+        self.product_url = product_url
+        self.capture_pages = True
+        with self.browser_pool.page() as page:
+            self.page = page
+            try:
+                self._open_product_page(product_url)
+                self.capture_page('product')
+            finally:
+                self.page = None
+        return self.fetched_pages[0]
 
     # --- Helper Methods for Cleaner Code ---
 
-    def _extract_specifications_pw(self):
-        """Extract product specifications."""
-        specifications = {}
-        spec_selectors = [
-            "#productDetails_techSpec_section_1 tr",
-            "#productDetails_detailBullets_sections1 tr",
-            "#prodDetails tr",
-            ".prodDetTable tr"
-        ]
-        
-        for selector in spec_selectors:
-            for spec in self.page.locator(selector).all():
-                try:
-                    key = self.extract_text_safe(spec.locator("td:first-child, th"))
-                    value = self.extract_text_safe(spec.locator("td:last-child"))
-                    if key and value and key != value:
-                        specifications[key] = value
-                except Exception:
-                    continue
-        return specifications
-
-    def _extract_related_products_pw(self):
-        """Extract related products."""
-        related_products = []
-        selectors = [
-            "[data-automation-id='related-products'] a",
-            "#similarities a"
-        ]
-        
-        for selector in selectors:
-            for related in self.page.locator(selector).all()[:10]:
-                title = self.extract_attribute_safe(related, 'title')
-                href = self.extract_attribute_safe(related, 'href')
-                if title and href:
-                    if not href.startswith('http'):
-                        href = self.page.url.split('/dp/')[0] + href # Base URL logic
-                    related_products.append({'title': title, 'url': href})
-        return related_products
-
-    def _extract_reviews_pw(self):
+    def _extract_reviews_pw(self, product_data):
         """Extract customer reviews with pagination (up to max_pages)."""
-        reviews = []
-        review_selector = ".a-section.review, #cm-cr-dp-review-list .review"
+        review_selector = SELECTORS['review']
         page_count = 1
-        max_pages = 5
+        max_pages = self.max_review_pages
+        
+        if not product_data.pop('has_reviews_section', False):
+            return [] # No reviews section
+        
+        # Reviews already visible on the product page (used if there is no dedicated page)
+        reviews = product_data.get('reviews', [])
         
-        if self.page.locator("#customerReviews").count() == 0:
-            return reviews # No reviews section
-            
         # Click 'See all reviews' if present
-        see_more = self.safe_find_element("a[data-hook='see-all-reviews-link']")
-        if see_more:
-            try:
+        if not product_data.pop('has_see_all_reviews', False):
+            return reviews
+        
+        if self.review_fetch_mode == 'concurrent' and has_memory_for_fetcher():
+            concurrent_reviews = self._fetch_reviews_concurrently()
+            if concurrent_reviews is not None:
+                # Review pages that loaded without reviews keep the product page's
+                return concurrent_reviews or reviews
+        
+        see_more = self.safe_find_element(SELECTORS['see_all_reviews'])
+        if not see_more:
+            return reviews
+        try:
+            if self.fast_mode:
+                with self.page.expect_navigation(wait_until='domcontentloaded', timeout=10000):
+                    see_more.click()
+            else:
                 see_more.click()
-                self.page.wait_for_load_state('networkidle', timeout=5000)
-                logger.info("Navigated to dedicated review page.")
-            except Exception:
-                logger.warning("Could not click 'See more reviews'")
+                self.wait_for_reviews(review_selector)
+            logger.info("Navigated to dedicated review page.")
+        except Exception:
+            logger.warning("Could not click 'See more reviews'")
+            return reviews
         
+        pending = []
         while page_count <= max_pages:
             logger.info(f"Scraping reviews from page {page_count}...")
             
@@ -207,72 +341,80 @@ class AmazonProductScraper:
                 self.page.wait_for_selector(review_selector, timeout=5000)
             except TimeoutError:
                 break # Timeout means no reviews loaded
-                
-            review_elements = self.page.locator(review_selector).all()
             
-            for review in review_elements:
-                try:
-                    data = {}
-                    data['title'] = self.extract_text_safe(review.locator(".review-title"))
-                    # Note: Using text content for the review body
-                    data['text'] = self.extract_text_safe(review.locator(".a-expander-content.reviewText.review-text-content.a-expander-partial-collapse-content"))
-                    data['rating'] = self.extract_text_safe(review.locator(".review-rating"))
-                    data['customer_name'] = self.extract_text_safe(review.locator("span.a-profile-name"))
-                    data['helpful_votes'] = self.extract_text_safe(review.locator(".a-size-small.a-color-secondary")) or "0 people found this helpful"
-                    
-                    if data['text']:
-                        reviews.append(data)
-                except Exception as e:
-                    logger.warning(f"Error processing review on page {page_count}: {str(e)}")
-                    continue
+            # All reviews on the page plus the pagination state in one round trip
+            future, has_next_page = self.extract_reviews_page()
+            pending.append(future)
             
             # Check for 'Next page' button
-            next_page_locator = self.page.locator("li.a-last a")
-            if next_page_locator.count() == 0 or not next_page_locator.is_enabled():
+            if not has_next_page:
                 logger.info(f"No more review pages found after page {page_count}")
                 break
                 
             try:
-                next_page_locator.click()
-                self.page.wait_for_load_state('networkidle', timeout=5000)
+                stale_review = self.page.locator(review_selector).first.element_handle() if self.fast_mode else None
+                self.page.locator(SELECTORS['next_reviews_page']).click()
+                self.wait_for_reviews(review_selector, stale_review)
                 page_count += 1
             except Exception:
                 logger.warning(f"Could not click 'Next page' on page {page_count}")
                 break
-                
+        
+        reviews = []
+        for future in pending:
+            reviews.extend(future.result()['reviews'])
         return reviews
 
-    def _create_scraped_text(self, product_data):
-        """Create concatenated text for RAG pipeline (same logic)."""
-        text_parts = []
-        
-        # Title and basic info
-        if product_data.get('title'):
-            text_parts.append(f"Title: {product_data['title']}")
-        if product_data.get('features'):
-            text_parts.append(f"Features:\n{product_data['features']}")
-        
-        # Specifications
-        if product_data.get('specifications'):
-            text_parts.append("Specifications:")
-            for key, value in product_data['specifications'].items():
-                text_parts.append(f"  {key}: {value}")
+    def _fetch_reviews_concurrently(self):
+        """
+        Load the review pages by URL, several at a time, in the async fetcher.
+        Pages are requested in waves of the fetcher's concurrency; a wave is
+        the last one once a page has no 'Next page' link or no reviews.
+        Returns None (sequential fallback) when the review URLs can't be
+        derived or not even the first page could be fetched.
+        """
+        urls = [review_page_url(self.product_url, n) for n in range(1, self.max_review_pages + 1)]
+        if urls[0] is None:
+            logger.info("No ASIN in product URL, paginating reviews sequentially")
+            return None
         
-        # Reviews
-        if product_data.get('reviews'):
-            text_parts.append("\nCustomer Reviews:")
-            for review in product_data['reviews']:
-                review_text = (
-                    f"Review by {review.get('customer_name', 'Anonymous')}: "
-                    f"{review.get('title', '')} - {review.get('text', '')} "
-                    f"(Rating: {review.get('rating', 'N/A')}, Helpful: {review.get('helpful_votes', 'N/A')})"
-                )
-                text_parts.append(review_text)
+        fetcher = get_review_fetcher()
+        # Cookies from the product page visit carry over to the review pages
+        storage_state = self.page.context.storage_state()
+        extract = (EXTRACT_REVIEWS_JS, SELECTORS) if self.parse_engine == 'browser' else None
+        route_handler = self.async_fast_route_handler(self.product_url) if self.fast_mode else None
         
-        # Q&A
-        if product_data.get('qa'):
-            text_parts.append("\nQuestions & Answers:")
-            for qa in product_data['qa']:
-                text_parts.append(f"  {qa}")
+        reviews = []
+        pages_fetched = 0
+        for start in range(0, len(urls), fetcher.concurrency):
+            wave = urls[start:start + fetcher.concurrency]
+            logger.info(f"Fetching review pages {start + 1}-{start + len(wave)} concurrently...")
+            results = fetcher.fetch(
+                wave, SELECTORS['review'], extract=extract,
+                storage_state=storage_state, route_handler=route_handler
+            )
+            
+            last_page = False
+            for url, result in zip(wave, results):
+                if isinstance(result, Exception):
+                    logger.warning(f"Could not fetch review page {url}: {str(result)}")
+                    last_page = True
+                    break
+                pages_fetched += 1
+                self.record_page(result['url'], 'reviews', result['html'], result['fetched_at'])
+                page_data = result['data'] or submit_parse(parse_reviews_page, result['html']).result()
+                reviews.extend(page_data['reviews'])
+                if not page_data['reviews'] or not page_data['has_next_page']:
+                    last_page = True
+                    break
+            if last_page:
+                break
         
-        return "\n".join(text_parts)
\ No newline at end of file
+        if not pages_fetched:
+            logger.info("No review page could be fetched concurrently, paginating sequentially")
+            return None
+        return reviews
+
+    def _create_scraped_text(self, product_data):
+        """Create concatenated text for RAG pipeline (same logic)."""
+        return create_scraped_text(product_data)
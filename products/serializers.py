@@ -1,5 +1,8 @@
+from django.conf import settings
 from rest_framework import serializers
-from .models import Product, Review, QuestionAnswer, ChatSession, ChatMessage
+from .amazon_urls import canonical_key
+from .ingest import read_csv_urls
+from .models import Product, Review, QuestionAnswer, PriceHistory, ChatSession, ChatMessage
 
 
 class ReviewSerializer(serializers.ModelSerializer):
@@ -7,7 +10,7 @@ class ReviewSerializer(serializers.ModelSerializer):
         model = Review
         fields = [
             'id', 'title', 'text', 'rating', 
-            'customer_name', 'helpful_votes', 'created_at'
+            'customer_name', 'helpful_votes', 'review_date', 'created_at'
         ]
 
 
@@ -17,6 +20,12 @@ class QuestionAnswerSerializer(serializers.ModelSerializer):
         fields = ['id', 'question', 'answer', 'created_at']
 
 
+class PriceHistorySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PriceHistory
+        fields = ['current_price', 'original_price', 'availability', 'recorded_at']
+
+
 class ProductListSerializer(serializers.ModelSerializer):
     """Serializer for product list view"""
     class Meta:
@@ -36,10 +45,10 @@ class ProductDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = [
-            'id', 'url', 'title', 'brand', 'current_price', 'original_price',
+            'id', 'url', 'canonical_key', 'title', 'brand', 'current_price', 'original_price',
             'availability', 'features', 'specifications', 'categories',
             'variants', 'sales_rank', 'related_products', 'shipping_info',
-            'status', 'task_id', 'error_message', 'scraped_at',
+            'status', 'task_id', 'error_message', 'scraped_at', 'price_refreshed_at',
             'vector_count', 'created_at', 'updated_at',
             'reviews', 'questions', 'review_count'
         ]
@@ -57,13 +66,37 @@ class ProductCreateSerializer(serializers.ModelSerializer):
     
     def validate_url(self, value):
         """Validate Amazon URL"""
-        if 'amazon.com' not in value and 'amazon.in' not in value:
+        if canonical_key(value) is None:
             raise serializers.ValidationError(
                 "Please provide a valid Amazon product URL"
             )
         return value
 
 
+class BulkIngestSerializer(serializers.Serializer):
+    """Serializer for bulk ingestion: a JSON list of URLs or an uploaded CSV"""
+    urls = serializers.ListField(
+        child=serializers.CharField(max_length=2000, allow_blank=True),
+        required=False
+    )
+    file = serializers.FileField(required=False)
+    priority = serializers.ChoiceField(choices=['interactive', 'bulk'], default='bulk')
+    
+    def validate(self, attrs):
+        urls = list(attrs.get('urls') or [])
+        if attrs.get('file'):
+            urls.extend(read_csv_urls(attrs.pop('file')))
+        urls = [url.strip() for url in urls if url and url.strip()]
+        if not urls:
+            raise serializers.ValidationError("Provide 'urls' or a CSV 'file' with at least one URL")
+        if len(urls) > settings.INGEST_BULK_MAX_URLS:
+            raise serializers.ValidationError(
+                f"At most {settings.INGEST_BULK_MAX_URLS} URLs per request"
+            )
+        attrs['urls'] = urls
+        return attrs
+
+
 class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
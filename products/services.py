@@ -1,8 +1,16 @@
+from asgiref.sync import sync_to_async
 from langchain_google_genai import GoogleGenerativeAI
 from langchain_core.prompts import PromptTemplate
-from django.core.cache import cache
 from django.conf import settings
+from .answer_cache import SemanticAnswerCache
 from .embeddings import EmbeddingService
+from .intent_router import IntentRouter
+from .models import Product
+from .prompt_budget import PromptBudget
+from .query_planner import QueryPlanner
+from .rate_limit import get_limiter
+from .tokens import count_tokens
+from . import metrics
 import logging
 
 logger = logging.getLogger(__name__)
@@ -11,12 +19,18 @@ logger = logging.getLogger(__name__)
 class QAService:
     """Service for handling Q&A with RAG"""
     
-    def __init__(self):
+    def __init__(self, embedding_service=None):
         self.llm = GoogleGenerativeAI(
             model="gemini-2.0-flash-lite",
-            google_api_key=settings.GOOGLE_API_KEY
+            google_api_key=settings.GOOGLE_API_KEY,
+            # 429s and transient errors are retried by the shared limiter
+            max_retries=0
         )
-        self.embedding_service = EmbeddingService()
+        self.limiter = get_limiter('llm')
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.answer_cache = SemanticAnswerCache()
+        self.intent_router = IntentRouter()
+        self.query_planner = QueryPlanner()
         
         self.prompt_template = """
 You are an expert assistant answering questions about an Amazon product based on the provided context.
@@ -41,8 +55,159 @@ Answer:"""
             template=self.prompt_template,
             input_variables=["context", "chat_history", "question"]
         )
+        self.prompt_budget = PromptBudget(self.prompt_template)
+        
+        self.summary_template = """
+Summarize this conversation between a shopper and an assistant about an Amazon product in at most {max_words} words.
+Keep what the shopper asked about, their preferences and the facts the assistant gave. Plain sentences, no preamble.
+
+Previous summary:
+{summary}
+
+New messages:
+{messages}
+
+Summary:"""
+    
+    def retrieve(self, product_id, question):
+        """
+        Answer-cache lookup and vector retrieval for a question
+        
+        Returns:
+            dict with either 'result' (cache hit or nothing to answer from)
+            or 'matches' and 'query_embedding' for generation
+        """
+        # Check cache (exact question first, then paraphrases)
+        cached_result = self.answer_cache.get_exact(product_id, question)
+        if cached_result:
+            return {'result': cached_result}
+        
+        query_embedding = self.embedding_service.embed_query(question)
+        cached_result = self.answer_cache.get_similar(product_id, query_embedding)
+        if cached_result:
+            return {'result': cached_result}
+        
+        # Get similar chunks, filtered by chunk type / rating / date when the question implies it
+        metadata_filter = self.query_planner.plan(question) if settings.RETRIEVAL_QUERY_PLANNER else None
+        matches = self.embedding_service.query_similar(
+            product_id=str(product_id),
+            query_text=question,
+            top_k=settings.QA_TOP_K,
+            query_embedding=query_embedding,
+            metadata_filter=metadata_filter
+        )
+        if metadata_filter:
+            metrics.incr('query_planner.filtered')
+            if not matches:
+                # e.g. no 1-star reviews, or chunks indexed before the metadata existed
+                metrics.incr('query_planner.fallbacks')
+                logger.info(f"No chunks match {metadata_filter}, retrieving unfiltered")
+                matches = self.embedding_service.query_similar(
+                    product_id=str(product_id),
+                    query_text=question,
+                    top_k=settings.QA_TOP_K,
+                    query_embedding=query_embedding
+                )
+        
+        if not matches:
+            return {
+                'result': {
+                    'answer': "I don't have enough information to answer this question.",
+                    'context_chunks': []
+                }
+            }
+        
+        return {'matches': matches, 'query_embedding': query_embedding}
+    
+    def answer_from_product(self, product, question, intent=None):
+        """
+        Fast path for questions the product row answers directly (price,
+        availability, brand, a specification): no embedding, vector query or LLM
+        
+        Returns:
+            dict with answer and context chunks, or None to use RAG
+        """
+        if not settings.INTENT_ROUTER_ENABLED:
+            return None
+        return self.intent_router.route(product, question, intent)
+    
+    async def aretrieve(self, product_id, question):
+        """Run retrieve() in a worker thread (network-bound clients)"""
+        return await sync_to_async(self.retrieve, thread_sensitive=False)(product_id, question)
+    
+    def build_prompt(self, question, matches, chat_history=None, history_summary=''):
+        """
+        Format the RAG prompt within the token budget (PROMPT_MAX_TOKENS)
+        
+        Returns:
+            dict with 'prompt', 'matches' (the chunks that were sent) and 'tokens'
+        """
+        assembled = self.prompt_budget.assemble(question, matches, chat_history, history_summary)
+        return {
+            'prompt': self.prompt.format(
+                context=assembled['context'],
+                chat_history=assembled['chat_history'],
+                question=question
+            ),
+            'matches': assembled['matches'],
+            'tokens': assembled['tokens'],
+        }
+    
+    def prepare_answer(self, product_id, question, chat_history=None, retrieved=None, history_summary=''):
+        """
+        Run every step of the RAG pipeline that precedes the LLM call
+        Pass `retrieved` (from retrieve/aretrieve) to skip retrieval
+        
+        Returns:
+            dict with either 'result' (cache hit or nothing to answer from)
+            or 'prompt', 'tokens', 'matches' and 'query_embedding' for generation
+        """
+        if retrieved is None:
+            retrieved = self.retrieve(product_id, question)
+        if 'result' in retrieved:
+            return retrieved
+        
+        return {
+            **retrieved,
+            **self.build_prompt(question, retrieved['matches'], chat_history, history_summary)
+        }
+    
+    def summarize_history(self, summary, messages):
+        """
+        Fold `messages` into the rolling conversation summary (one LLM call)
+        
+        Returns:
+            the new summary text
+        """
+        prompt = self.summary_template.format(
+            max_words=settings.CHAT_SUMMARY_MAX_WORDS,
+            summary=summary or "(none)",
+            messages="\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        )
+        return self.limiter.call(self.llm.invoke, prompt, tokens=count_tokens(prompt)).strip()
+    
+    def finish_answer(self, product_id, question, prepared, answer):
+        """Build the response for a generated answer and cache it"""
+        result = {
+            'answer': answer,
+            'context_chunks': [
+                {
+                    'text': match['text'],
+                    'score': match['score']
+                }
+                for match in prepared['matches']
+            ]
+        }
+        
+        # Cache result
+        self.answer_cache.set(
+            product_id, question, result, embedding=prepared['query_embedding']
+        )
+        
+        logger.info(f"Generated answer for question: {question[:50]}")
+        return result
     
-    def get_answer(self, product_id, question, chat_history=None):
+    def get_answer(self, product_id, question, chat_history=None, history_summary=''):
         """
         Get answer for a question using RAG
         
@@ -50,68 +215,92 @@ Answer:"""
             product_id: UUID of the product
             question: User's question
             chat_history: List of previous messages
+            history_summary: Rolling summary of older messages (ChatSession)
             
         Returns:
             dict with answer and context chunks
         """
         try:
-            # Check cache
-            cache_key = f"qa_{product_id}_{hash(question)}"
-            cached_result = cache.get(cache_key)
-            if cached_result:
-                logger.info(f"Cache hit for question: {question[:50]}")
-                return cached_result
+            if settings.INTENT_ROUTER_ENABLED:
+                intent = self.intent_router.classify(question)
+                if intent.structured:
+                    product = Product.objects.filter(id=product_id).first()
+                    result = product and self.answer_from_product(product, question, intent)
+                    if result:
+                        return result
             
-            # Get similar chunks
-            matches = self.embedding_service.query_similar(
-                product_id=str(product_id),
-                query_text=question,
-                top_k=5
+            prepared = self.prepare_answer(
+                product_id, question, chat_history, history_summary=history_summary
             )
+            if 'result' in prepared:
+                return prepared['result']
             
-            if not matches:
-                return {
-                    'answer': "I don't have enough information to answer this question.",
-                    'context_chunks': []
-                }
-            
-            # Prepare context
-            context = "\n\n".join([match['text'] for match in matches])
+            # Generate answer
+            answer = self.limiter.call(self.llm.invoke, prepared['prompt'], tokens=prepared['tokens'])
             
-            # Prepare chat history
-            history_text = ""
-            if chat_history:
-                history_text = "\n".join([
-                    f"{msg['role']}: {msg['content']}"
-                    for msg in chat_history[-5:]  # Last 5 messages
-                ])
+            return self.finish_answer(product_id, question, prepared, answer)
             
-            # Generate answer
-            formatted_prompt = self.prompt.format(
-                context=context,
-                chat_history=history_text,
-                question=question
+        except Exception as e:
+            logger.error(f"Error generating answer: {str(e)}", exc_info=True)
+            raise
+    
+    async def agenerate_answer(self, product_id, question, chat_history=None, retrieved=None, history_summary=''):
+        """
+        Async get_answer; pass `retrieved` when retrieval already ran concurrently
+        
+        Returns:
+            dict with answer and context chunks
+        """
+        try:
+            if retrieved is None:
+                retrieved = await self.aretrieve(product_id, question)
+            # Prompt assembly counts tokens (tiktoken), so it runs off the event loop
+            prepared = await sync_to_async(self.prepare_answer, thread_sensitive=False)(
+                product_id, question, chat_history, retrieved, history_summary
             )
+            if 'result' in prepared:
+                return prepared['result']
             
-            answer = self.llm.invoke(formatted_prompt)
+            answer = await self.limiter.acall(self.llm.ainvoke, prepared['prompt'], tokens=prepared['tokens'])
             
-            result = {
-                'answer': answer,
-                'context_chunks': [
-                    {
-                        'text': match['text'],
-                        'score': match['score']
-                    }
-                    for match in matches
-                ]
-            }
+            return await sync_to_async(self.finish_answer, thread_sensitive=False)(
+                product_id, question, prepared, answer
+            )
             
-            # Cache result
-            cache.set(cache_key, result, timeout=3600)  # 1 hour
+        except Exception as e:
+            logger.error(f"Error generating answer: {str(e)}", exc_info=True)
+            raise
+    
+    async def astream_answer(self, product_id, question, chat_history=None, retrieved=None, history_summary=''):
+        """
+        Stream an answer as it is generated
+        
+        Yields:
+            {'type': 'token', 'text': ...} for every chunk from the LLM, then
+            {'type': 'done', 'result': ...} with the same dict get_answer returns
+        """
+        try:
+            if retrieved is None:
+                retrieved = await self.aretrieve(product_id, question)
+            # Prompt assembly counts tokens (tiktoken), so it runs off the event loop
+            prepared = await sync_to_async(self.prepare_answer, thread_sensitive=False)(
+                product_id, question, chat_history, retrieved, history_summary
+            )
+            if 'result' in prepared:
+                yield {'type': 'token', 'text': prepared['result']['answer']}
+                yield {'type': 'done', 'result': prepared['result']}
+                return
+            
+            parts = []
+            async for token in self.limiter.astream(self.llm.astream, prepared['prompt'], tokens=prepared['tokens']):
+                parts.append(token)
+                yield {'type': 'token', 'text': token}
             
-            logger.info(f"Generated answer for question: {question[:50]}")
-            return result
+            result = await sync_to_async(self.finish_answer, thread_sensitive=False)(
+                product_id, question, prepared, "".join(parts)
+            )
+            yield {'type': 'done', 'result': result}
             
         except Exception as e:
-            logger.error(f"Error generating answer: {str(e)}", exc_info=True)
-            raise
\ No newline at end of file
+            logger.error(f"Error streaming answer: {str(e)}", exc_info=True)
+            raise
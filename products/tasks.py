@@ -1,122 +1,661 @@
-from celery import shared_task
+from celery import chain, current_app, shared_task
+from django.db import transaction
 from django.utils import timezone
-from .models import Product, Review, QuestionAnswer
+from django.db.models import Case, Count, F, OuterRef, Q, Subquery, Value, When
+from django.conf import settings
+from .models import (
+    Product, Review, QuestionAnswer, PageSnapshot, PriceHistory, ChatSession, content_hash
+)
 from .scraper import AmazonProductScraper
-from .embeddings import EmbeddingService
+from .registry import get_embedding_service, get_qa_service
+from .page_archive import archive_queue, get_page_archive
+from .embedding_batcher import EmbeddingBatcher
+from .answer_cache import SemanticAnswerCache
+from .chunking import build_chunks
+from .parsers import ProductPageParser, parse_review_date
+from .rate_limit import RateLimitExceeded
+from . import metrics
+from datetime import timedelta
+import json
 import logging
+import random
+import re
 
 logger = logging.getLogger(__name__)
 
+metrics.register(
+    'price_refresh.products', 'price_refresh.price_changes', 'price_refresh.content_changes',
+    'chat_summary.updates'
+)
+
+BUY_BOX_FIELDS = ('current_price', 'original_price', 'availability')
+
+# Prefix of content fingerprints computed from normalised fields; older ones are re-adopted
+FINGERPRINT_VERSION = 'v2:'
+_INVISIBLE_RE = re.compile('[\u200b-\u200f\u2060\ufeff]')
+
+
+def _stage_status(status):
+    """
+    Status for a pipeline stage to set. A product that is already completed
+    (a refresh re-scrape) stays completed, so it keeps answering questions
+    from its current data until the new data is in.
+    """
+    return Case(When(status='completed', then=Value('completed')), default=Value(status))
+
+
+def _normalize_field(value):
+    return " ".join(_INVISIBLE_RE.sub('', str(value or '')).split()).lower()
+
+
+def _content_fingerprint(scraped_data):
+    """
+    Hash of the product-page fields that feed the embedded text (not prices
+    or reviews). Fields are normalised (whitespace, case, invisible marks,
+    bullet and line order) so the browser and lxml extractors agree.
+    """
+    features = sorted(filter(None, (
+        _normalize_field(line).lstrip('•·-* ') for line in (scraped_data.get('features') or '').splitlines()
+    )))
+    specifications = sorted(
+        (_normalize_field(key).rstrip(' :'), _normalize_field(value))
+        for key, value in (scraped_data.get('specifications') or {}).items()
+    )
+    qa = sorted(_normalize_field(text) for text in scraped_data.get('qa') or [])
+    digest = content_hash(
+        scraped_data.get('title'), scraped_data.get('brand'),
+        json.dumps(features), json.dumps(specifications), json.dumps(qa)
+    )
+    return FINGERPRINT_VERSION + digest[:64 - len(FINGERPRINT_VERSION)]
+
+
+def _page_fingerprint(page):
+    """Content fingerprint of a captured product page, always through the lxml parser"""
+    return _content_fingerprint(ProductPageParser().parse_product_page(page['html'], page['url']))
+
+
+def _record_price(product_id, previous, scraped_data, now):
+    """
+    Add a PriceHistory row when the buy-box differs from ``previous`` (the
+    product's stored values) or the product has no history yet
+    Returns: True if a row was added
+    """
+    current = {field: scraped_data.get(field) or '' for field in BUY_BOX_FIELDS}
+    unchanged = all((previous.get(field) or '') == current[field] for field in BUY_BOX_FIELDS)
+    if unchanged and PriceHistory.objects.filter(product_id=product_id).exists():
+        return False
+    PriceHistory.objects.create(product_id=product_id, recorded_at=now, **current)
+    return True
+
+
+def _persist_scraped_data(product_id, scraped_data):
+    """
+    Write scraped fields, reviews and Q&A in one transaction
+    
+    Reviews and Q&A are upserted on (product, content_hash), so a retried or
+    repeated scrape does not insert duplicates. The product row is written
+    with a single UPDATE.
+    Returns: (review_count, qa_count)
+    """
+    now = timezone.now()
+    
+    reviews = {}
+    for review_data in scraped_data.get('reviews', []):
+        digest = Review.compute_content_hash(review_data)
+        reviews[digest] = Review(
+            product_id=product_id,
+            content_hash=digest,
+            title=review_data.get('title', ''),
+            text=review_data.get('text', ''),
+            rating=review_data.get('rating', ''),
+            customer_name=review_data.get('customer_name', ''),
+            helpful_votes=review_data.get('helpful_votes', ''),
+            review_date=parse_review_date(review_data.get('date'))
+        )
+    
+    questions = {}
+    for qa_text in scraped_data.get('qa', []):
+        digest = QuestionAnswer.compute_content_hash(qa_text)
+        questions[digest] = QuestionAnswer(
+            product_id=product_id,
+            content_hash=digest,
+            question=qa_text,
+            answer=''
+        )
+    
+    with transaction.atomic():
+        previous = Product.objects.filter(id=product_id).values(*BUY_BOX_FIELDS).first() or {}
+        _record_price(product_id, previous, scraped_data, now)
+        Product.objects.filter(id=product_id).update(
+            title=scraped_data.get('title', ''),
+            brand=scraped_data.get('brand', ''),
+            current_price=scraped_data.get('current_price', ''),
+            original_price=scraped_data.get('original_price', ''),
+            availability=scraped_data.get('availability', ''),
+            features=scraped_data.get('features', ''),
+            specifications=scraped_data.get('specifications', {}),
+            categories=scraped_data.get('categories', []),
+            variants=scraped_data.get('variants', []),
+            sales_rank=scraped_data.get('sales_rank', ''),
+            related_products=scraped_data.get('related_products', []),
+            shipping_info=scraped_data.get('shipping_info', []),
+            scraped_at=now,
+            price_refreshed_at=now,
+            content_fingerprint=scraped_data.get('content_fingerprint') or _content_fingerprint(scraped_data),
+            status=_stage_status('embedding'),
+            updated_at=now
+        )
+        
+        # Helpful-vote counts change between scrapes; everything else is the key
+        Review.objects.bulk_create(
+            reviews.values(),
+            update_conflicts=True,
+            unique_fields=['product', 'content_hash'],
+            update_fields=['helpful_votes', 'review_date'],
+            batch_size=500
+        )
+        QuestionAnswer.objects.bulk_create(
+            questions.values(),
+            ignore_conflicts=True,
+            batch_size=500
+        )
+    
+    return len(reviews), len(questions)
+
+
+def _previous_manifest(product):
+    """Manifest to diff against; [] for a product that was never embedded"""
+    # Only new chunks are embedded when the previous manifest is known
+    previous_manifest = product.embedding_manifest
+    if previous_manifest is None and not product.vector_count:
+        previous_manifest = []
+    return previous_manifest
+
+
+def _legacy_vector_count(product):
+    """Positional vectors stored before chunk ids were content hashes (no manifest)"""
+    return product.vector_count if product.embedding_manifest is None else 0
+
+
+def _mark_embedded(product_id, sync):
+    """Record the synced namespace on the product and mark it completed"""
+    embedding_service = get_embedding_service()
+    Product.objects.filter(id=product_id).update(
+        pinecone_namespace=embedding_service.create_namespace(str(product_id)),
+        vector_count=sync['vector_count'],
+        embedding_manifest=sync['manifest'],
+        status='completed',
+        error_message=None,
+        updated_at=timezone.now()
+    )
+
+
+def _invalidate_answers(product_id):
+    """Drop cached answers built from the product's previous data"""
+    try:
+        SemanticAnswerCache().invalidate(product_id)
+    except Exception as e:
+        # Answers still expire after QA_CACHE_TIMEOUT
+        logger.warning(f"Could not invalidate cached answers of {product_id}: {str(e)}")
+
+
+def _sync_product_embeddings(product, chunks):
+    """
+    Embed the product's chunks (only new ones when the previous manifest is
+    known) and mark the product completed
+    Returns: sync stats from EmbeddingService.sync_embeddings
+    """
+    if not chunks:
+        raise Exception("No text to embed")
+    
+    sync = get_embedding_service().sync_embeddings(
+        product_id=str(product.id),
+        chunks=chunks,
+        previous_manifest=_previous_manifest(product),
+        legacy_count=_legacy_vector_count(product)
+    )
+    _mark_embedded(product.id, sync)
+    _invalidate_answers(product.id)
+    return sync
+
+
+def _local_snapshots():
+    """Snapshots whose pages are in this host's archive (or whose host was not recorded)"""
+    return PageSnapshot.objects.filter(Q(archive_host=settings.PAGE_ARCHIVE_HOST) | Q(archive_host=''))
+
+
+def _archive_queue(host):
+    # Snapshots from before hosts were recorded are read by any scrape worker
+    return archive_queue(host) if host else 'scrape'
+
+
+def _store_snapshots(product_id, fetched_pages):
+    """
+    Store fetched HTML in the page archive and record one PageSnapshot per page
+    Returns: the created PageSnapshot rows
+    """
+    archive = get_page_archive()
+    urls = {page['url'] for page in fetched_pages}
+    previous = {}
+    for url, digest in (
+        PageSnapshot.objects.filter(url__in=urls)
+        .order_by('url', '-fetched_at')
+        .values_list('url', 'content_hash')
+    ):
+        previous.setdefault(url, digest)
+    
+    snapshots = []
+    for page in fetched_pages:
+        stored = archive.store(page['html'])
+        snapshots.append(PageSnapshot(
+            product_id=product_id,
+            url=page['url'],
+            page_type=page['page_type'],
+            page_number=page['page_number'],
+            fetched_at=page['fetched_at'],
+            content_hash=stored['content_hash'],
+            raw_size=stored['raw_size'],
+            compressed_size=stored['compressed_size'],
+            unchanged=previous.get(page['url']) == stored['content_hash'],
+            archive_host=settings.PAGE_ARCHIVE_HOST
+        ))
+    PageSnapshot.objects.bulk_create(snapshots)
+    
+    unchanged = sum(1 for snapshot in snapshots if snapshot.unchanged)
+    if unchanged:
+        metrics.incr('page_archive.unchanged', unchanged)
+    return snapshots
+
+
+# --- Ingestion pipeline ---
+#
+# fetch -> parse -> persist -> chunk -> embed -> finalize, one Celery task per
+# stage chained together. Each stage is idempotent and retries on its own, so
+# a failed embedding call is retried without relaunching the browser. Stages
+# are routed to their own queues (CELERY_TASK_ROUTES) so browser workers and
+# embedding workers scale independently. The fields extracted in the browser
+# worker travel down the chain in the payload; the page archive is written
+# by the scrape workers but never read by the pipeline, so the queues need
+# no shared storage.
+
+def _retry_stage(task, product_id, exc):
+    """Retry a pipeline stage; mark the product failed once retries run out"""
+    logger.error(
+        f"Error in {task.name} for {product_id} "
+        f"(attempt {task.request.retries + 1}): {str(exc)}",
+        exc_info=True
+    )
+    if task.request.retries >= task.max_retries:
+        try:
+            Product.objects.filter(id=product_id).update(
+                status=_stage_status('failed'),
+                error_message=str(exc),
+                updated_at=timezone.now()
+            )
+        except Exception:
+            pass
+    if isinstance(exc, RateLimitExceeded):
+        raise task.retry(exc=exc, countdown=exc.retry_after + random.uniform(0, 5))
+    raise task.retry(exc=exc)
+
 
 @shared_task(bind=True, max_retries=3, default_retry_delay=60)
-def scrape_and_embed_product(self, product_id):
+def fetch_product_pages(self, product_id):
     """
-    Celery task to scrape product data and create embeddings
+    Stage 1 (browser): load the product and review pages and extract their
+    fields (SCRAPER_PARSE_ENGINE); the pages are archived when PAGE_ARCHIVE_ENABLED
     """
     try:
-        # Get product
         product = Product.objects.get(id=product_id)
-        product.status = 'scraping'
-        product.save()
+        Product.objects.filter(id=product_id).update(
+            status=_stage_status('scraping'), updated_at=timezone.now()
+        )
         
-        logger.info(f"Starting scraping for product {product_id}: {product.url}")
+        logger.info(f"Fetching pages for product {product_id}: {product.url}")
         
-        # Scrape data
         scraper = AmazonProductScraper()
         scraped_data = scraper.scrape_product_data(product.url)
-        
-        if not scraped_data:
+        if not scraped_data.get('title'):
             raise Exception("No data scraped")
+        # Chunks are built from the fields; the legacy concatenation is not needed downstream
+        scraped_data.pop('scraped_text', None)
+        # Fingerprint the page the way refresh_product_price does, whatever SCRAPER_PARSE_ENGINE is
+        product_page = next((page for page in scraper.fetched_pages if page['page_type'] == 'product'), None)
+        if product_page:
+            scraped_data['content_fingerprint'] = _page_fingerprint(product_page)
         
-        # Update product with scraped data
-        product.title = scraped_data.get('title', '')
-        product.brand = scraped_data.get('brand', '')
-        product.current_price = scraped_data.get('current_price', '')
-        product.original_price = scraped_data.get('original_price', '')
-        product.availability = scraped_data.get('availability', '')
-        product.features = scraped_data.get('features', '')
-        product.specifications = scraped_data.get('specifications', {})
-        product.categories = scraped_data.get('categories', [])
-        product.variants = scraped_data.get('variants', [])
-        product.sales_rank = scraped_data.get('sales_rank', '')
-        product.related_products = scraped_data.get('related_products', [])
-        product.shipping_info = scraped_data.get('shipping_info', [])
-        product.scraped_at = timezone.now()
-        product.status = 'embedding'
-        product.save()
-        
-        logger.info(f"Scraped product data for {product_id}")
-        
-        # Save reviews
-        reviews = scraped_data.get('reviews', [])
-        for review_data in reviews:
-            Review.objects.create(
-                product=product,
-                title=review_data.get('title', ''),
-                text=review_data.get('text', ''),
-                rating=review_data.get('rating', ''),
-                customer_name=review_data.get('customer_name', ''),
-                helpful_votes=review_data.get('helpful_votes', '')
-            )
+        snapshots = []
+        if scraper.fetched_pages:
+            try:
+                snapshots = _store_snapshots(product.id, scraper.fetched_pages)
+            except Exception as e:
+                logger.warning(f"Could not archive pages of {product_id}: {str(e)}")
+        return {
+            'product_id': str(product_id),
+            'scraped_data': scraped_data,
+            'stats': {
+                'pages_archived': len(snapshots),
+                'pages_unchanged': sum(1 for snapshot in snapshots if snapshot.unchanged),
+            }
+        }
+    except Exception as e:
+        _retry_stage(self, product_id, e)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def parse_product_pages(self, payload):
+    """
+    Stage 2 (CPU): build the typed chunks from the extracted product data
+    """
+    product_id = payload['product_id']
+    try:
+        scraped_data = payload['scraped_data']
+        scraped_data['chunks'] = build_chunks(scraped_data)
+        if not scraped_data.get('chunks'):
+            raise Exception("No data scraped")
+        return {
+            'product_id': product_id,
+            'scraped_data': scraped_data,
+            'stats': payload['stats'],
+        }
+    except Exception as e:
+        _retry_stage(self, product_id, e)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def persist_product_data(self, payload):
+    """
+    Stage 3 (DB): upsert product fields, reviews and Q&A
+    """
+    product_id = payload['product_id']
+    try:
+        scraped_data = payload['scraped_data']
+        review_count, qa_count = _persist_scraped_data(product_id, scraped_data)
         
-        logger.info(f"Saved {len(reviews)} reviews for product {product_id}")
+        logger.info(
+            f"Saved product data, {review_count} reviews and {qa_count} Q&A "
+            f"for product {product_id}"
+        )
+        return {
+            'product_id': product_id,
+            'chunks': scraped_data['chunks'],
+            'stats': {**payload['stats'], 'reviews': review_count, 'questions': qa_count},
+        }
+    except Exception as e:
+        _retry_stage(self, product_id, e)
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def chunk_product_text(self, payload):
+    """
+    Stage 4: diff the product's typed chunks against the stored manifest
+    and rebuild the product's lexical (BM25) index
+    """
+    product_id = payload['product_id']
+    try:
+        product = Product.objects.get(id=product_id)
+        embedding_service = get_embedding_service()
+        plan = embedding_service.plan_sync(
+            product_id=product_id,
+            chunks=payload['chunks'],
+            previous_manifest=_previous_manifest(product),
+            legacy_count=_legacy_vector_count(product)
+        )
+        embedding_service.index_chunks(product_id, payload['chunks'])
+        return {'product_id': product_id, 'plan': plan, 'stats': payload['stats']}
+    except Exception as e:
+        _retry_stage(self, product_id, e)
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=30)
+def embed_product_chunks(self, payload):
+    """
+    Stage 5 (embedding API): hand the new chunks to the cross-product
+    embedding batcher; finalize_product is queued once they are all stored
+    
+    Nothing is deleted here: the product may be live (a refresh re-scrape),
+    so replaced vectors are deleted by finalize_product after the new ones
+    are stored.
+    """
+    product_id = payload['product_id']
+    try:
+        plan = payload['plan']
+        embedding_service = get_embedding_service()
+        batcher = EmbeddingBatcher(embedding_service)
         
-        # Save Q&A
-        qa_list = scraped_data.get('qa', [])
-        for qa_text in qa_list:
-            QuestionAnswer.objects.create(
-                product=product,
-                question=qa_text,
-                answer=''
-            )
+        # An unfinished older job would finalize a stale manifest; its upserted
+        # chunks that this plan does not keep are deleted with the vanished ones
+        vanished = list(plan['vanished'])
+        superseded = batcher.supersede(product_id)
+        if superseded:
+            keep = set(plan['manifest']) | set(vanished)
+            vanished += [digest for digest in superseded['sync']['manifest'] if digest not in keep]
         
-        logger.info(f"Saved {len(qa_list)} Q&A for product {product_id}")
+        cleanup = {'vanished': vanished, 'legacy_count': plan.get('legacy_count', 0)}
+        sync = {
+            'vector_count': len(plan['manifest']),
+            'manifest': plan['manifest'],
+            'embedded': len(plan['chunks']),
+            'deleted': len(vanished) + cleanup['legacy_count'],
+            'unchanged': len(plan['manifest']) - len(plan['chunks']),
+        }
+        metrics.incr('embeddings.chunks_unchanged', sync['unchanged'])
+        job = {'product_id': product_id, 'sync': sync, 'cleanup': cleanup, 'stats': payload['stats']}
         
-        # Create embeddings
-        embedding_service = EmbeddingService()
-        scraped_text = scraped_data.get('scraped_text', '')
+        if not plan['chunks']:
+            finalize_product.delay(job)
+            return {'product_id': product_id, 'queued_chunks': 0}
         
-        if not scraped_text:
-            raise Exception("No text to embed")
+        batcher.enqueue(product_id, plan['chunks'], job)
+        drain_embedding_queue.delay()
+        return {'product_id': product_id, 'queued_chunks': len(plan['chunks'])}
+    except Exception as e:
+        _retry_stage(self, product_id, e)
+
+
+def _fail_embedding_job(job, error):
+    """Mark the product of a dead-lettered embedding job failed"""
+    Product.objects.filter(id=job['product_id']).update(
+        status=_stage_status('failed'),
+        error_message=f"Embedding failed: {error}",
+        updated_at=timezone.now()
+    )
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=15)
+def drain_embedding_queue(self):
+    """
+    Celery task to embed queued chunks of all products in full-size requests
+    
+    Only one drain runs at a time; extra triggers return immediately. A
+    drain that stops while chunks remain (time budget, late producer)
+    re-queues itself.
+    """
+    batcher = EmbeddingBatcher(get_embedding_service())
+    try:
+        processed = batcher.drain(on_complete=finalize_product.delay, on_failed=_fail_embedding_job)
+    except RateLimitExceeded as e:
+        # Chunks are back in the queue; come back once the provider has recovered
+        logger.warning(f"Embedding queue drain rate limited: {str(e)}")
+        raise self.retry(exc=e, countdown=e.retry_after + random.uniform(0, 5))
+    except Exception as e:
+        logger.error(f"Error draining embedding queue: {str(e)}", exc_info=True)
+        raise self.retry(exc=e)
+    
+    if processed is not None and batcher.queue_length():
+        drain_embedding_queue.delay()
+    return {'processed': processed}
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def finalize_product(self, payload):
+    """
+    Stage 6: delete the vectors the new chunks replace, record the manifest
+    and vector count and mark the product completed
+    """
+    product_id = payload['product_id']
+    try:
+        sync = payload['sync']
+        if payload.get('cleanup'):
+            get_embedding_service().delete_replaced(product_id, payload['cleanup'])
+        _mark_embedded(product_id, sync)
+        _invalidate_answers(product_id)
         
-        vector_count = embedding_service.create_embeddings(
-            product_id=str(product.id),
-            text=scraped_text
+        logger.info(
+            f"Successfully completed scraping and embedding for product {product_id}"
         )
+        return {
+            'product_id': product_id,
+            'status': 'completed',
+            'vector_count': sync['vector_count'],
+            'chunks_embedded': sync['embedded'],
+            'chunks_unchanged': sync['unchanged'],
+            'chunks_deleted': sync['deleted'],
+            **payload['stats'],
+        }
+    except Exception as e:
+        _retry_stage(self, product_id, e)
+
+
+def build_product_pipeline(product_id, priority=None):
+    """Pipeline chain for a product; ``priority`` is a key of INGEST_PRIORITIES"""
+    options = {} if priority is None else {'priority': settings.INGEST_PRIORITIES[priority]}
+    return chain(
+        fetch_product_pages.s(str(product_id)).set(**options),
+        parse_product_pages.s().set(**options),
+        persist_product_data.s().set(**options),
+        chunk_product_text.s().set(**options),
+        # finalize_product is queued by the embedding batcher when the chunks are stored
+        embed_product_chunks.s().set(**options),
+    )
+
+
+def start_product_pipeline(product_id, priority='interactive'):
+    """
+    Queue the ingestion pipeline for a product
+    Returns: AsyncResult of the final stage
+    """
+    return build_product_pipeline(product_id, priority).apply_async()
+
+
+@shared_task
+def enqueue_product_pipelines(product_ids, priority='bulk'):
+    """
+    Celery task to queue the pipelines of a batch of bulk-ingested products
+    
+    Publishes every chain over one broker connection and records the task
+    ids with a single UPDATE batch.
+    """
+    task_ids = {}
+    with current_app.producer_or_acquire() as producer:
+        for product_id in product_ids:
+            result = build_product_pipeline(product_id, priority).apply_async(producer=producer)
+            task_ids[product_id] = result.id
+    
+    Product.objects.bulk_update(
+        [Product(id=product_id, task_id=task_id) for product_id, task_id in task_ids.items()],
+        ['task_id']
+    )
+    logger.info(f"Queued pipelines for {len(task_ids)} products at {priority} priority")
+    return {'queued': len(task_ids), 'priority': priority}
+
+
+@shared_task
+def scrape_and_embed_product(product_id):
+    """
+    Celery task kept for callers (and queued messages) of the former
+    single-task ingestion; starts the staged pipeline
+    """
+    result = start_product_pipeline(product_id)
+    return {'product_id': str(product_id), 'pipeline_task_id': result.id}
+
+
+def _load_archived_product_data(product_id):
+    """
+    Rebuild scraped_data from archived pages, parsed offline with the
+    current selectors: the latest product-page snapshot in this host's
+    archive and the review pages fetched with it
+    """
+    archive = get_page_archive()
+    parser = ProductPageParser()
+    
+    snapshots = _local_snapshots().filter(product_id=product_id)
+    product_snapshot = snapshots.filter(page_type='product').order_by('-fetched_at').first()
+    if product_snapshot is None:
+        raise Exception("No archived product page")
+    
+    scraped_data = parser.parse_product_page(
+        archive.load(product_snapshot.content_hash), product_snapshot.url
+    )
+    
+    review_snapshots = snapshots.filter(
+        page_type='reviews', fetched_at__gte=product_snapshot.fetched_at
+    ).order_by('page_number', 'fetched_at')
+    review_pages = {}
+    for snapshot in review_snapshots:
+        review_pages.setdefault(snapshot.page_number, snapshot)
+    
+    has_reviews_section = scraped_data.pop('has_reviews_section')
+    scraped_data.pop('has_see_all_reviews')
+    if not has_reviews_section:
+        scraped_data['reviews'] = []
+    elif review_pages:
+        # Same precedence as the scraper: dedicated review pages replace the inline ones
+        scraped_data['reviews'] = []
+        for page_number in sorted(review_pages):
+            html = archive.load(review_pages[page_number].content_hash)
+            scraped_data['reviews'].extend(parser.parse_reviews_page(html)['reviews'])
+    
+    scraped_data['chunks'] = build_chunks(scraped_data)
+    return scraped_data
+
+
+def queue_reparse_from_archive(product_id):
+    """
+    Queue reparse_product_from_archive on the host whose archive holds the
+    product's latest product page
+    Returns: the AsyncResult
+    """
+    host = PageSnapshot.objects.filter(product_id=product_id, page_type='product').order_by(
+        '-fetched_at'
+    ).values_list('archive_host', flat=True).first()
+    if host is None:
+        raise ValueError(f"No archived product page for {product_id}")
+    return reparse_product_from_archive.apply_async(args=[str(product_id)], queue=_archive_queue(host))
+
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=60)
+def reparse_product_from_archive(self, product_id):
+    """
+    Celery task to re-extract and re-embed a product from its archived pages
+    (e.g. after a selector change) without fetching anything. Reads this
+    host's archive; queue it with queue_reparse_from_archive.
+    """
+    try:
+        product = Product.objects.get(id=product_id)
+        scraped_data = _load_archived_product_data(product.id)
         
-        # Update product
-        product.pinecone_namespace = embedding_service.create_namespace(str(product.id))
-        product.vector_count = vector_count
-        product.status = 'completed'
-        product.error_message = None
-        product.save()
+        review_count, qa_count = _persist_scraped_data(product.id, scraped_data)
+        sync = _sync_product_embeddings(product, scraped_data['chunks'])
         
         logger.info(
-            f"Successfully completed scraping and embedding for product {product_id}"
+            f"Re-extracted product {product_id} from archive: {review_count} reviews, "
+            f"{qa_count} Q&A, {sync['embedded']} chunks embedded"
         )
-        
         return {
             'product_id': str(product_id),
             'status': 'completed',
-            'vector_count': vector_count
+            'vector_count': sync['vector_count'],
+            'chunks_embedded': sync['embedded'],
+            'chunks_unchanged': sync['unchanged'],
+            'chunks_deleted': sync['deleted']
         }
-        
+    
     except Exception as e:
         logger.error(
-            f"Error in scrape_and_embed_product for {product_id}: {str(e)}",
+            f"Error in reparse_product_from_archive for {product_id}: {str(e)}",
             exc_info=True
         )
-        
-        # Update product status
-        try:
-            product = Product.objects.get(id=product_id)
-            product.status = 'failed'
-            product.error_message = str(e)
-            product.save()
-        except:
-            pass
-        
-        # Retry task
         raise self.retry(exc=e)
 
 
@@ -132,7 +671,7 @@ def cleanup_old_products(days=30):
     old_products = Product.objects.filter(created_at__lt=cutoff_date)
     
     # Delete embeddings from Pinecone
-    embedding_service = EmbeddingService()
+    embedding_service = get_embedding_service()
     for product in old_products:
         try:
             embedding_service.delete_product_embeddings(str(product.id))
@@ -145,3 +684,215 @@ def cleanup_old_products(days=30):
     
     logger.info(f"Cleaned up {count} old products")
     return {'deleted_count': count}
+
+
+@shared_task
+def prune_page_archive(days=None):
+    """
+    Celery task to apply the page archive retention policy to this host's
+    archive (see schedule_page_archive_pruning)
+    
+    Its snapshots older than ``days`` (PAGE_ARCHIVE_RETENTION_DAYS) are
+    deleted, except the latest one of each URL, then blobs none of its
+    snapshots refers to are removed from disk.
+    """
+    days = days or settings.PAGE_ARCHIVE_RETENTION_DAYS
+    cutoff = timezone.now() - timedelta(days=days)
+    
+    latest = PageSnapshot.objects.filter(url=OuterRef('url')).order_by('-fetched_at').values('id')[:1]
+    expired = (
+        _local_snapshots().filter(fetched_at__lt=cutoff)
+        .annotate(latest_id=Subquery(latest))
+        .exclude(id=F('latest_id'))
+    )
+    deleted_snapshots, _ = PageSnapshot.objects.filter(
+        id__in=list(expired.values_list('id', flat=True))
+    ).delete()
+    
+    referenced = _local_snapshots().values_list('content_hash', flat=True).distinct()
+    deleted_blobs = get_page_archive().prune(referenced)
+    
+    logger.info(
+        f"Pruned {deleted_snapshots} page snapshots and {deleted_blobs} archived pages"
+    )
+    return {'deleted_snapshots': deleted_snapshots, 'deleted_blobs': deleted_blobs}
+
+
+@shared_task
+def schedule_page_archive_pruning(days=None):
+    """
+    Periodic (celery beat) task: queue prune_page_archive on every host
+    that has archived pages, since each one can only prune its own disk
+    """
+    hosts = list(PageSnapshot.objects.values_list('archive_host', flat=True).distinct().order_by())
+    for host in hosts:
+        prune_page_archive.apply_async(kwargs={'days': days}, queue=_archive_queue(host))
+    logger.info(f"Queued page archive pruning on {len(hosts)} hosts")
+    return {'hosts': hosts}
+
+
+# --- Buy-box refresh ---
+
+@shared_task(bind=True, max_retries=2, default_retry_delay=60)
+def refresh_product_price(self, product_id):
+    """
+    Celery task to refresh a product's price and availability
+    
+    Loads the product page alone (no review pagination, no embedding),
+    records price history, and starts the full pipeline only when the page
+    content that feeds the embedded text has changed. The product stays
+    completed (and answerable) while it is re-scraped.
+    """
+    try:
+        product = Product.objects.get(id=product_id)
+    except Product.DoesNotExist:
+        return {'product_id': str(product_id), 'status': 'missing'}
+    
+    try:
+        page = AmazonProductScraper().fetch_product_page(product.url)
+        scraped_data = ProductPageParser().parse_product_page(page['html'], page['url'])
+        if not scraped_data.get('title'):
+            raise Exception("Product page has no title (blocked or unavailable)")
+    except Exception as e:
+        logger.error(f"Error refreshing price for {product_id}: {str(e)}", exc_info=True)
+        raise self.retry(exc=e)
+    
+    if settings.PAGE_ARCHIVE_ENABLED:
+        try:
+            _store_snapshots(product.id, [page])
+        except Exception as e:
+            logger.warning(f"Could not archive refreshed page of {product_id}: {str(e)}")
+    
+    now = timezone.now()
+    # scraped_data is the lxml parse of the page, as in _page_fingerprint
+    fingerprint = _content_fingerprint(scraped_data)
+    # Products fingerprinted before (or by an older scheme) just adopt the current one
+    known = product.content_fingerprint.startswith(FINGERPRINT_VERSION)
+    content_changed = known and fingerprint != product.content_fingerprint
+    with transaction.atomic():
+        price_changed = _record_price(
+            product.id, {field: getattr(product, field) for field in BUY_BOX_FIELDS}, scraped_data, now
+        )
+        Product.objects.filter(id=product.id).update(
+            **{field: scraped_data.get(field) or '' for field in BUY_BOX_FIELDS},
+            price_refreshed_at=now,
+            price_refresh_queued_at=None,
+            content_fingerprint=product.content_fingerprint if known else fingerprint,
+            updated_at=now
+        )
+    
+    metrics.incr('price_refresh.products')
+    if price_changed:
+        metrics.incr('price_refresh.price_changes')
+        _invalidate_answers(product.id)
+    if content_changed:
+        metrics.incr('price_refresh.content_changes')
+        logger.info(f"Content of product {product_id} changed, starting a full rescrape")
+        start_product_pipeline(product.id, priority='bulk')
+    
+    return {
+        'product_id': str(product_id),
+        'price_changed': price_changed,
+        'content_changed': content_changed,
+    }
+
+
+def _due_for_refresh(now):
+    """
+    Completed products whose refresh interval has passed. The interval
+    depends on the tier the product's recent question volume falls in
+    (PRICE_REFRESH_TIERS); never-refreshed products come first. Products
+    with a refresh already queued are skipped until it runs or
+    PRICE_REFRESH_QUEUED_TIMEOUT_MINUTES passes.
+    """
+    window_start = now - timedelta(days=settings.PRICE_REFRESH_POPULARITY_DAYS)
+    queued_since = now - timedelta(minutes=settings.PRICE_REFRESH_QUEUED_TIMEOUT_MINUTES)
+    products = Product.objects.filter(status='completed').exclude(
+        price_refresh_queued_at__gte=queued_since
+    ).annotate(
+        recent_questions=Count(
+            'chat_sessions__messages',
+            filter=Q(
+                chat_sessions__messages__role='user',
+                chat_sessions__messages__created_at__gte=window_start
+            )
+        )
+    )
+    
+    due = Q(pk__in=[])
+    upper = None
+    for min_questions, interval_hours in sorted(settings.PRICE_REFRESH_TIERS, reverse=True):
+        tier = Q(recent_questions__gte=min_questions)
+        if upper is not None:
+            tier &= Q(recent_questions__lt=upper)
+        stale = Q(price_refreshed_at__isnull=True) | Q(
+            price_refreshed_at__lt=now - timedelta(hours=interval_hours)
+        )
+        due |= tier & stale
+        upper = min_questions
+    
+    return products.filter(due).order_by(F('price_refreshed_at').asc(nulls_first=True))
+
+
+@shared_task
+def schedule_price_refreshes(limit=None):
+    """
+    Periodic (celery beat) task: queue refresh_product_price for the
+    products due for a refresh, at bulk priority, and mark them queued
+    """
+    limit = limit or settings.PRICE_REFRESH_BATCH_LIMIT
+    now = timezone.now()
+    product_ids = list(_due_for_refresh(now).values_list('id', flat=True)[:limit])
+    Product.objects.filter(id__in=product_ids).update(price_refresh_queued_at=now)
+    
+    priority = settings.INGEST_PRIORITIES['bulk']
+    with current_app.producer_or_acquire() as producer:
+        for product_id in product_ids:
+            refresh_product_price.apply_async(
+                args=[str(product_id)], priority=priority, producer=producer
+            )
+    
+    logger.info(f"Queued price refresh for {len(product_ids)} products")
+    return {'queued': len(product_ids)}
+
+
+# --- Chat history ---
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=30)
+def summarize_chat_history(self, session_id):
+    """
+    Fold all but the newest PROMPT_RECENT_MESSAGES unsummarized messages of
+    a chat session into its rolling summary, so later prompts carry the
+    summary instead of the full history. Does nothing until at least
+    CHAT_SUMMARY_BATCH_MESSAGES messages are ready to fold
+    """
+    try:
+        session = ChatSession.objects.get(id=session_id)
+        messages = list(
+            session.messages.filter(
+                **({'created_at__gt': session.summarized_until} if session.summarized_until else {})
+            ).order_by('created_at')
+        )
+        fold = messages[:-settings.PROMPT_RECENT_MESSAGES] if settings.PROMPT_RECENT_MESSAGES else messages
+        if not fold or len(fold) < settings.CHAT_SUMMARY_BATCH_MESSAGES:
+            return {'session_id': str(session_id), 'summarized': 0}
+        
+        summary = get_qa_service().summarize_history(
+            session.history_summary,
+            [{'role': msg.role, 'content': msg.content} for msg in fold]
+        )
+        # Skip the write if a concurrent run already advanced the summary
+        updated = ChatSession.objects.filter(
+            id=session_id, summarized_until=session.summarized_until
+        ).update(history_summary=summary, summarized_until=fold[-1].created_at)
+        if updated:
+            metrics.incr('chat_summary.updates')
+        logger.info(f"Summarized {len(fold)} messages of chat session {session_id}")
+        return {'session_id': str(session_id), 'summarized': len(fold) if updated else 0}
+    except ChatSession.DoesNotExist:
+        return {'session_id': str(session_id), 'summarized': 0}
+    except RateLimitExceeded as e:
+        raise self.retry(exc=e, countdown=e.retry_after + random.uniform(0, 5))
+    except Exception as e:
+        logger.error(f"Error summarizing chat session {session_id}: {str(e)}", exc_info=True)
+        raise self.retry(exc=e)
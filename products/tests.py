@@ -1,3 +1,1045 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import multiprocessing
+import os
+import tempfile
+import time
+import uuid
+from unittest import mock
+from datetime import timedelta
+from pathlib import Path
 
-# Create your tests here.
+import fakeredis
+from asgiref.sync import async_to_sync
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from .amazon_urls import (
+    canonical_key, canonical_product_url, extract_asin, is_amazon_url, marketplace, review_page_url
+)
+from .answer_cache import SemanticAnswerCache
+from .chunking import (
+    OVERVIEW, QA, REVIEW, SPECIFICATIONS, ProductChunker, parse_helpful_votes, parse_rating
+)
+from .ingest import ingest_urls
+from .intent_router import IntentRouter
+from . import parsers, tasks, views
+from .embedding_batcher import EmbeddingBatcher
+from .embedding_cache import CachedEmbeddings, LRUCache, MicroBatcher
+from .embeddings import EmbeddingService
+from .lexical_index import LexicalIndexStore, reciprocal_rank_fusion, tokenize
+from .models import ChatMessage, ChatSession, PageSnapshot, PriceHistory, Product
+from .page_archive import PageArchive
+from .prompt_budget import PromptBudget, dedupe_chunks
+from .query_planner import QueryPlanner
+from .rate_limit import AdaptiveConcurrency, ProviderLimiter, RateLimitExceeded, TokenBucket
+from .scraper import AmazonProductScraper
+from .vector_stores import LocalVectorStore
+
+
+class IntentRouterTests(SimpleTestCase):
+    product = SimpleNamespace(
+        current_price='$99.00', original_price='$129.00', availability='In Stock', brand='Visit the Acme Store',
+        specifications={
+            'Product Dimensions': '10 x 5 x 3 cm', 'Item Weight': '250 g', 'Battery Life': '30 hours',
+            'Model Name': 'WH-1', 'Item model number': 'WH1000',
+        },
+    )
+
+    def setUp(self):
+        self.router = IntentRouter(threshold=0.7)
+
+    def assertRoutes(self, questions, expected):
+        for question in questions:
+            with self.subTest(question=question):
+                self.assertEqual(self.router.classify(question).name, expected)
+
+    def test_opinion_questions_use_rag(self):
+        self.assertRoutes([
+            "does it feel cheap?",
+            "is it available in blue?",
+            "does the company offer a warranty?",
+            "is it good value for the cost?",
+            "is it brand new?",
+            "is it worth the price?",
+        ], 'rag')
+
+    def test_price_questions(self):
+        self.assertRoutes(["what is the price?", "how much is it?", "what does it cost?", "is it on sale?"], 'price')
+
+    def test_availability_questions(self):
+        self.assertRoutes(["is it in stock?", "is this available?", "is it out of stock?"], 'availability')
+
+    def test_brand_questions(self):
+        self.assertRoutes(["who makes this?", "what brand is it?", "which company makes this?"], 'brand')
+
+    def test_spec_questions(self):
+        self.assertRoutes(["how much does it weigh?", "what are the dimensions?"], 'spec')
+
+    def test_fast_path_answers_from_product(self):
+        self.assertEqual(self.router.route(self.product, "what is the price?")['answer'],
+                         "The current price is $99.00 (list price $129.00).")
+        self.assertEqual(self.router.route(self.product, "who makes this?")['answer'], "This product is made by Acme.")
+        self.assertEqual(self.router.route(self.product, "what is the battery life?")['answer'], "Battery Life: 30 hours")
+        self.assertEqual(self.router.route(self.product, "what is the model number?")['answer'], "Item model number: WH1000")
+
+    def test_fast_path_declines_other_objects_and_extra_words(self):
+        for question in [
+            "how long does the battery last?",
+            "is the battery replaceable?",
+            "what is the price of replacement pads?",
+            "is this the 2023 model?",
+            "what is the return policy if out of stock?",
+            "does the brand offer support?",
+        ]:
+            with self.subTest(question=question):
+                self.assertIsNone(self.router.route(self.product, question))
+
+
+class QueryPlannerTests(SimpleTestCase):
+    def setUp(self):
+        self.planner = QueryPlanner()
+
+    def days_ago(self, days):
+        return int((timezone.now() - timedelta(days=days)).strftime('%Y%m%d'))
+
+    def test_star_ratings(self):
+        self.assertEqual(self.planner.plan("what do 1-star reviews say?"), {'type': REVIEW, 'rating': 1.0})
+        self.assertEqual(self.planner.plan("show me three star reviews"), {'type': REVIEW, 'rating': 3.0})
+
+    def test_decimal_stars_are_not_a_rating_filter(self):
+        self.assertEqual(self.planner.plan("why is it rated 4.5 stars?"), {'type': REVIEW})
+
+    def test_explicit_sentiment(self):
+        self.assertEqual(
+            self.planner.plan("what do the negative reviews say?"),
+            {'type': REVIEW, 'rating': {'$lte': settings.RETRIEVAL_NEGATIVE_MAX_RATING}},
+        )
+        self.assertEqual(
+            self.planner.plan("summarize the positive reviews"),
+            {'type': REVIEW, 'rating': {'$gte': settings.RETRIEVAL_POSITIVE_MIN_RATING}},
+        )
+
+    def test_neutral_questions_are_not_sentiment_filtered(self):
+        self.assertEqual(self.planner.plan("do people like the battery?"), {'type': REVIEW})
+        self.assertIsNone(self.planner.plan("what's it like to use?"))
+        self.assertIsNone(self.planner.plan("any issues?"))
+
+    def test_recency(self):
+        self.assertEqual(
+            self.planner.plan("reviews from the last 3 months"),
+            {'type': REVIEW, 'review_date': {'$gte': self.days_ago(90)}},
+        )
+        self.assertEqual(
+            self.planner.plan("reviews from the past year"),
+            {'type': REVIEW, 'review_date': {'$gte': self.days_ago(365)}},
+        )
+        self.assertEqual(
+            self.planner.plan("reviews from the last 2 years"),
+            {'type': REVIEW, 'review_date': {'$gte': self.days_ago(730)}},
+        )
+
+    def test_chunk_types(self):
+        self.assertEqual(self.planner.plan("what are the specifications?"), {'type': {'$in': [SPECIFICATIONS, OVERVIEW]}})
+        self.assertEqual(self.planner.plan("any answered questions about size?"), {'type': QA})
+
+
+class ChunkingTests(SimpleTestCase):
+    product_data = {
+        'title': 'Wireless Headphones',
+        'brand': 'Acme',
+        'features': 'Noise cancelling',
+        'specifications': {'Item Weight': '250 g', 'Colour': 'Black'},
+        'reviews': [
+            {'customer_name': 'Ann', 'rating': '5.0 out of 5 stars', 'title': 'Great', 'text': 'Love them.',
+             'helpful_votes': '3 people found this helpful', 'date': 'Reviewed in the United States on March 3, 2024'},
+            {'customer_name': 'Bob', 'rating': '5.0 out of 5 stars', 'title': 'Good', 'text': 'Comfy.',
+             'helpful_votes': 'One person found this helpful'},
+            {'customer_name': 'Cy', 'rating': '1.0 out of 5 stars', 'title': 'Broke', 'text': 'x' * 300},
+        ],
+        'qa': ['Does it fold? Yes.'],
+    }
+
+    def test_helpers(self):
+        self.assertEqual(parse_rating('4,5 out of 5 stars'), 4.5)
+        self.assertIsNone(parse_rating(''))
+        self.assertEqual(parse_helpful_votes('1,234 people found this helpful'), 1234)
+        self.assertEqual(parse_helpful_votes('One person found this helpful'), 1)
+        self.assertEqual(parse_helpful_votes(None), 0)
+
+    def test_typed_chunks(self):
+        chunks = ProductChunker(max_chars=1200, short_review_chars=200).build(self.product_data)
+        self.assertEqual(
+            [chunk['metadata']['type'] for chunk in chunks],
+            [OVERVIEW, SPECIFICATIONS, REVIEW, REVIEW, QA],
+        )
+        long_review, short_reviews = chunks[2], chunks[3]
+        self.assertEqual(long_review['metadata']['rating'], 1.0)
+        self.assertEqual(len(long_review['metadata']['review_ids']), 1)
+        # Short reviews with the same rating share a chunk with the highest vote count and newest date
+        self.assertEqual(short_reviews['metadata']['rating'], 5.0)
+        self.assertEqual(len(short_reviews['metadata']['review_ids']), 2)
+        self.assertEqual(short_reviews['metadata']['helpful_votes'], 3)
+        self.assertNotIn('helpful', short_reviews['text'])
+
+    def test_review_dates(self):
+        chunks = ProductChunker(max_chars=1200, short_review_chars=200).build(self.product_data)
+        self.assertEqual(chunks[3]['metadata']['review_date'], 20240303)
+        self.assertNotIn('review_date', chunks[2]['metadata'])
+
+    def test_long_items_are_split(self):
+        data = {'reviews': [{'customer_name': 'Dee', 'rating': '3.0 out of 5 stars', 'text': 'word ' * 200}]}
+        chunks = ProductChunker(max_chars=300, short_review_chars=200).build(data)
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual([chunk['metadata']['part'] for chunk in chunks], list(range(len(chunks))))
+        self.assertTrue(all(len(chunk['text']) <= 300 for chunk in chunks))
+
+
+class PromptBudgetTests(SimpleTestCase):
+    def test_dedupe_drops_contained_chunks_and_trims_overlap(self):
+        tail = "This is the shared overlap tail of the first part."
+        first = "Review about comfort. " * 3 + tail
+        kept, dropped = dedupe_chunks([
+            {'text': first, 'score': 0.9},
+            {'text': tail + " Second part about battery.", 'score': 0.8},
+            {'text': "Review about comfort.", 'score': 0.7},
+        ])
+        self.assertEqual(dropped, 1)
+        self.assertEqual([match['text'] for match in kept], [first, "Second part about battery."])
+
+    def test_assemble_stays_within_budget(self):
+        budget = PromptBudget("{context}", max_tokens=200, history_max_tokens=30)
+        history = [{'role': 'user', 'content': f'question number {i}'} for i in range(20)]
+        history.append({'role': 'user', 'content': 'Now?'})
+        matches = [{'text': f'chunk {i} ' + 'word ' * 40, 'score': 1.0 - i / 10} for i in range(10)]
+        result = budget.assemble('Now?', matches, history, 'earlier summary')
+
+        self.assertLessEqual(result['tokens'], 200)
+        self.assertTrue(result['chat_history'].startswith('Summary of earlier conversation: earlier summary'))
+        self.assertIn('question number 19', result['chat_history'])
+        self.assertNotIn('user: question number 0', result['chat_history'].splitlines())
+        self.assertNotIn('Now?', result['chat_history'])
+        self.assertGreater(len(result['matches']), 0)
+        self.assertLess(len(result['matches']), len(matches))
+        self.assertTrue(result['context'].startswith('chunk 0 '))
+
+
+class LexicalIndexTests(SimpleTestCase):
+    def test_tokenize(self):
+        self.assertEqual(tokenize("What is the WH-1000XM5 weight?"), ['wh-1000xm5', 'wh', '1000xm5', 'weight'])
+
+    entries = [
+        {'id': 'a', 'text': 'Battery lasts two days', 'metadata': {'type': 'review', 'rating': 5.0}},
+        {'id': 'b', 'text': 'Battery died after a week, battery is weak', 'metadata': {'type': 'review', 'rating': 1.0}},
+        {'id': 'c', 'text': 'Item Weight: 250 g', 'metadata': {'type': 'specifications'}},
+    ]
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = LexicalIndexStore(root=self.tmp.name)
+
+    def test_store_search_and_delete(self):
+        self.assertEqual(self.store.search('product_1', 'battery', 5), [])
+        self.store.write('product_1', self.entries)
+        self.assertEqual([hit['id'] for hit in self.store.search('product_1', 'battery', 5)], ['b', 'a'])
+        self.store.delete('product_1')
+        self.assertEqual(self.store.search('product_1', 'battery', 5), [])
+
+    def test_metadata_filter(self):
+        self.store.write('product_1', self.entries)
+        filtered = self.store.search('product_1', 'battery', 5, {'rating': {'$gte': 4.0}})
+        self.assertEqual([hit['id'] for hit in filtered], ['a'])
+
+    def test_reciprocal_rank_fusion(self):
+        fused = reciprocal_rank_fusion([[{'id': 'a'}, {'id': 'b'}], [{'id': 'b'}, {'id': 'c'}]])
+        self.assertEqual([item_id for item_id, _ in fused], ['b', 'a', 'c'])
+
+
+class AmazonUrlTests(SimpleTestCase):
+    def test_extract_asin(self):
+        self.assertEqual(extract_asin('https://www.amazon.com/Some-Slug/dp/b0abcdefgh?ref=x'), 'B0ABCDEFGH')
+        self.assertEqual(extract_asin('https://www.amazon.in/gp/product/B0ABCDEFGH'), 'B0ABCDEFGH')
+        self.assertIsNone(extract_asin('https://www.amazon.com/s?k=headphones'))
+
+    def test_marketplace(self):
+        self.assertEqual(marketplace('https://smile.amazon.com/dp/B0ABCDEFGH'), 'amazon.com')
+        self.assertTrue(is_amazon_url('https://www.amazon.in/dp/B0ABCDEFGH'))
+        self.assertFalse(is_amazon_url('https://amazon.com.evil.example/dp/B0ABCDEFGH'))
+
+    def test_canonical_urls(self):
+        url = 'https://www.amazon.com/Some-Slug/dp/B0ABCDEFGH/ref=sr_1?th=1'
+        self.assertEqual(canonical_key(url), 'amazon.com:B0ABCDEFGH')
+        self.assertEqual(canonical_product_url(url), 'https://www.amazon.com/dp/B0ABCDEFGH')
+        self.assertIsNone(canonical_key('https://example.com/dp/B0ABCDEFGH'))
+        self.assertEqual(
+            review_page_url(url, 2),
+            'https://www.amazon.com/product-reviews/B0ABCDEFGH/?pageNumber=2&reviewerType=all_reviews',
+        )
+
+
+class LocalVectorStoreTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.store = LocalVectorStore(root=self.tmp.name, block_size=2)
+
+    def upsert(self, *vectors):
+        self.store.upsert([
+            {'id': vector_id, 'values': values, 'metadata': metadata} for vector_id, values, metadata in vectors
+        ], namespace='ns')
+
+    def upsert_rated(self):
+        self.upsert(
+            ('a', [1.0, 0.0], {'rating': 5.0}),
+            ('b', [0.8, 0.6], {'rating': 1.0}),
+            ('c', [0.0, 1.0], {'rating': 4.0}),
+        )
+
+    def test_query(self):
+        self.upsert_rated()
+        self.assertEqual([hit['id'] for hit in self.store.query([1.0, 0.1], 2, 'ns')], ['a', 'b'])
+        self.assertAlmostEqual(self.store.query([2.0, 0.0], 1, 'ns')[0]['score'], 1.0, places=5)
+        self.assertEqual(self.store.query([1.0, 0.0], 2, 'missing'), [])
+
+    def test_metadata_filter(self):
+        self.upsert_rated()
+        filtered = self.store.query([1.0, 0.1], 2, 'ns', {'rating': {'$gte': 4.0}})
+        self.assertEqual([hit['id'] for hit in filtered], ['a', 'c'])
+
+    def test_upsert_replaces_and_delete_removes(self):
+        self.upsert(('a', [1.0, 0.0], {'v': 1}), ('b', [0.0, 1.0], {}))
+        self.upsert(('a', [0.0, 1.0], {'v': 2}))
+        hits = self.store.query([0.0, 1.0], 5, 'ns')
+        self.assertEqual(sorted(hit['id'] for hit in hits), ['a', 'b'])
+        self.assertEqual(next(hit for hit in hits if hit['id'] == 'a')['metadata'], {'v': 2})
+        self.store.delete('ns', ids=['b'])
+        self.assertEqual([hit['id'] for hit in self.store.query([0.0, 1.0], 5, 'ns')], ['a'])
+        self.store.delete('ns', delete_all=True)
+        self.assertEqual(self.store.query([0.0, 1.0], 5, 'ns'), [])
+
+    def test_swap_keeps_superseded_matrix_for_readers(self):
+        self.upsert(('a', [1.0, 0.0], {}))
+        # Another process loaded this manifest before the next write swapped it
+        reader = LocalVectorStore(root=self.tmp.name)
+        old_matrix = reader._read_manifest('ns')['matrix']
+        reader.query([1.0, 0.0], 1, 'ns')
+
+        self.upsert(('b', [0.0, 1.0], {}))
+        namespace_dir = Path(self.tmp.name) / 'ns'
+        manifest = self.store._read_manifest('ns')
+        self.assertNotEqual(manifest['matrix'], old_matrix)
+        self.assertIn(old_matrix, manifest['retired'])
+        self.assertTrue((namespace_dir / old_matrix).exists())
+        self.assertEqual(len(reader.query([1.0, 0.0], 5, 'ns')), 2)
+
+        # Once the grace period has passed the next write deletes it
+        self.store.grace_seconds = 0
+        self.upsert(('c', [0.5, 0.5], {}))
+        self.assertFalse((namespace_dir / old_matrix).exists())
+        self.assertEqual(sorted(path.name for path in namespace_dir.glob('vectors-*.npy')),
+                         [self.store._read_manifest('ns')['matrix']])
+
+
+def _parse_in_daemonic_child(queue):
+    future = parsers.submit_parse(len, 'abc')
+    queue.put((type(parsers.get_parse_pool()).__name__, future.result(timeout=30)))
+    parsers.shutdown_parse_pool()
+
+
+class ParsePoolTests(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(setattr, parsers, '_pool_failed_pid', parsers._pool_failed_pid)
+        self.addCleanup(setattr, parsers, '_pool', parsers._pool)
+        self.addCleanup(setattr, parsers, '_pool_pid', parsers._pool_pid)
+
+    def test_daemonic_process_uses_billiard_pool(self):
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        child = context.Process(target=_parse_in_daemonic_child, args=(queue,), daemon=True)
+        child.start()
+        self.assertEqual(queue.get(timeout=60), ('BilliardParsePool', 3))
+        child.join(10)
+
+    def test_broken_pool_is_dropped_once(self):
+        class BrokenPool:
+            submits = 0
+
+            def submit(self, func, *args):
+                BrokenPool.submits += 1
+                raise AssertionError('daemonic processes are not allowed to have children')
+
+            def shutdown(self, wait=True, cancel_futures=False):
+                pass
+
+        parsers._pool, parsers._pool_pid, parsers._pool_failed_pid = BrokenPool(), os.getpid(), None
+        with self.assertLogs('products.parsers', 'WARNING'):
+            self.assertEqual(parsers.submit_parse(len, 'abcd').result(), 4)
+        self.assertEqual(parsers.submit_parse(len, 'ab').result(), 2)
+        self.assertEqual(BrokenPool.submits, 1)
+        self.assertIsNone(parsers.get_parse_pool())
+
+
+class FakeEmbeddings:
+    def __init__(self):
+        self.texts = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return [[float(len(text)), 1.0] for text in texts]
+
+
+class EmbeddingBatcherTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with mock.patch('products.embeddings.OpenAIEmbeddings'):
+            self.service = EmbeddingService(vector_store=LocalVectorStore(root=tmp.name))
+        self.service.embeddings = FakeEmbeddings()
+        self.batcher = EmbeddingBatcher(self.service, redis_client=fakeredis.FakeRedis())
+        self.completed, self.failed = [], []
+
+    def chunks(self, *texts):
+        return self.service.plan_sync('p1', [{'text': text, 'metadata': {'type': 'review'}} for text in texts], [])
+
+    def drain(self):
+        return self.batcher.drain(on_complete=self.completed.append, on_failed=lambda job, error: self.failed.append(job))
+
+    def test_newer_job_supersedes_unfinished_one(self):
+        first = self.chunks('old review one', 'old review two')
+        self.batcher.enqueue('p1', first['chunks'], {'sync': {'manifest': first['manifest']}})
+        second = self.chunks('new review')
+        superseded = self.batcher.supersede('p1')
+        self.assertEqual(superseded['sync']['manifest'], first['manifest'])
+        self.batcher.enqueue('p1', second['chunks'], {'sync': {'manifest': second['manifest']}})
+
+        self.drain()
+        self.assertEqual(self.service.embeddings.texts, ['new review'])
+        self.assertEqual([job['sync']['manifest'] for job in self.completed], [second['manifest']])
+        self.assertIsNone(self.batcher.supersede('p1'))
+
+    def test_replaced_vectors_are_deleted_after_the_new_ones_are_stored(self):
+        old = self.chunks('kept review', 'vanished review')
+        self.service.apply_sync('p1', old)
+        plan = self.service.plan_sync(
+            'p1', [{'text': text, 'metadata': {'type': 'review'}} for text in ('kept review', 'added review')],
+            old['manifest']
+        )
+        self.assertEqual(len(plan['vanished']), 1)
+        self.batcher.enqueue('p1', plan['chunks'], {'sync': {'manifest': plan['manifest']}})
+        # Until the drain stores the new chunk, the old index stays whole
+        namespace = self.service.create_namespace('p1')
+        self.assertEqual(len(self.service.vector_store.query([1.0, 1.0], 10, namespace)), 2)
+
+        self.drain()
+        self.assertEqual(len(self.service.vector_store.query([1.0, 1.0], 10, namespace)), 3)
+        self.service.delete_replaced('p1', plan)
+        texts = sorted(hit['metadata']['text'] for hit in self.service.vector_store.query([1.0, 1.0], 10, namespace))
+        self.assertEqual(texts, ['added review', 'kept review'])
+
+
+class IncrementalEmbeddingTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with mock.patch('products.embeddings.OpenAIEmbeddings'):
+            self.service = EmbeddingService(vector_store=LocalVectorStore(root=tmp.name))
+        self.service.embeddings = FakeEmbeddings()
+        self.namespace = self.service.create_namespace('p1')
+
+    def chunks(self, *texts):
+        return [{'text': text, 'metadata': {'type': 'review'}} for text in texts]
+
+    def stored_texts(self):
+        return sorted(hit['metadata']['text'] for hit in self.service.vector_store.query([1.0, 1.0], 10, self.namespace))
+
+    def test_only_new_chunks_are_planned_and_vanished_ones_listed(self):
+        old = self.service.plan_sync('p1', self.chunks('kept', 'gone'), [])
+        plan = self.service.plan_sync('p1', self.chunks('kept', 'added', 'kept'), old['manifest'])
+
+        self.assertFalse(plan['rebuild'])
+        self.assertEqual([chunk['text'] for chunk in plan['chunks']], ['added'])
+        self.assertEqual(plan['chunks'][0]['index'], 1)
+        self.assertEqual(plan['vanished'], [old['manifest'][1]])
+        self.assertEqual(plan['manifest'], [old['manifest'][0], plan['chunks'][0]['hash']])
+
+    def test_resync_embeds_only_new_chunks_and_deletes_vanished_ones(self):
+        old = self.service.apply_sync('p1', self.service.plan_sync('p1', self.chunks('kept', 'gone')))
+        self.service.embeddings.texts.clear()
+
+        plan = self.service.plan_sync('p1', self.chunks('kept', 'added'), old['manifest'])
+        sync = self.service.apply_sync('p1', plan)
+
+        self.assertEqual(self.service.embeddings.texts, ['added'])
+        self.assertEqual((sync['embedded'], sync['deleted'], sync['unchanged']), (1, 1, 1))
+        self.assertEqual(self.stored_texts(), ['added', 'kept'])
+
+    def test_rebuild_without_manifest_deletes_legacy_positional_ids(self):
+        self.service.vector_store.upsert(vectors=[
+            {'id': f'p1_chunk_{i}', 'values': [1.0, 1.0], 'metadata': {'text': f'legacy {i}'}} for i in range(2)
+        ], namespace=self.namespace)
+
+        plan = self.service.plan_sync('p1', self.chunks('fresh'), legacy_count=2)
+        self.assertTrue(plan['rebuild'])
+        sync = self.service.apply_sync('p1', plan)
+
+        self.assertEqual(sync['deleted'], 2)
+        self.assertEqual(self.stored_texts(), ['fresh'])
+
+
+class ContentFingerprintTests(TestCase):
+    URL = 'https://www.amazon.com/dp/B0TEST1000'
+
+    def setUp(self):
+        html = (Path(__file__).parent / 'fixtures' / 'pages' / 'sample_product.html').read_text()
+        self.page = {'url': self.URL, 'page_type': 'product', 'page_number': 1, 'html': html, 'fetched_at': None}
+        self.product = Product.objects.create(url=self.URL, status='completed')
+
+    def browser_data(self):
+        """The lxml parse as the browser extractor renders it: other spacing, marks and order"""
+        data = parsers.parse_product_page(self.page['html'], self.URL)
+        data['title'] = data['title'].replace(' ', '  ')
+        data['features'] = '\n'.join(f"• {line} " for line in reversed(data['features'].splitlines()))
+        data['specifications'] = {f"{key}‎ :": f" {value}" for key, value in data['specifications'].items()}
+        return data
+
+    def test_normalised_fields_give_the_same_fingerprint(self):
+        clean = parsers.parse_product_page(self.page['html'], self.URL)
+        self.assertEqual(tasks._content_fingerprint(self.browser_data()), tasks._content_fingerprint(clean))
+        clean['features'] += '\nNew feature'
+        self.assertNotEqual(tasks._content_fingerprint(self.browser_data()), tasks._content_fingerprint(clean))
+
+    def test_pipeline_and_refresh_agree_on_one_page(self):
+        test = self
+
+        class BrowserScraper:
+            def scrape_product_data(self, url):
+                self.fetched_pages = [test.page]
+                return test.browser_data()
+
+            def fetch_product_page(self, url):
+                return test.page
+
+        with mock.patch.object(tasks, 'AmazonProductScraper', BrowserScraper), \
+                mock.patch.object(tasks, '_store_snapshots', return_value=[]), \
+                mock.patch.object(tasks, 'start_product_pipeline') as pipeline, \
+                self.settings(PAGE_ARCHIVE_ENABLED=False):
+            fetched = tasks.fetch_product_pages.apply(args=[str(self.product.id)]).get()
+            fingerprint = fetched['scraped_data']['content_fingerprint']
+            Product.objects.filter(id=self.product.id).update(content_fingerprint=fingerprint)
+            result = tasks.refresh_product_price.apply(args=[str(self.product.id)]).get()
+
+        self.assertFalse(result['content_changed'])
+        pipeline.assert_not_called()
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.content_fingerprint, fingerprint)
+
+
+class PriceRefreshTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+
+    def product(self, asin, hours_ago=None, questions=0, status='completed'):
+        product = Product.objects.create(
+            url=f'https://www.amazon.com/dp/{asin}', status=status, current_price='$10.00',
+            price_refreshed_at=self.now - timedelta(hours=hours_ago) if hours_ago is not None else None
+        )
+        if questions:
+            session = ChatSession.objects.create(product=product, session_id=asin)
+            ChatMessage.objects.bulk_create(
+                ChatMessage(session=session, role='user', content='price?') for _ in range(questions)
+            )
+        return product
+
+    def test_interval_depends_on_question_tier(self):
+        busy = self.product('B0BUSY0001', hours_ago=7, questions=20)
+        self.product('B0WARM0001', hours_ago=7, questions=1)
+        warm = self.product('B0WARM0002', hours_ago=25, questions=1)
+        self.product('B0IDLE0001', hours_ago=25)
+        idle = self.product('B0IDLE0002', hours_ago=73)
+        never = self.product('B0NEW00001')
+        self.product('B0FAIL0001', hours_ago=100, status='failed')
+
+        due = list(tasks._due_for_refresh(self.now))
+        self.assertEqual(due[0], never)
+        self.assertEqual(set(due), {busy, warm, idle, never})
+
+    def test_queued_products_are_not_queued_again(self):
+        product = self.product('B0IDLE0002', hours_ago=73)
+        with mock.patch.object(tasks, 'current_app'), \
+                mock.patch.object(tasks.refresh_product_price, 'apply_async') as apply_async:
+            self.assertEqual(tasks.schedule_price_refreshes()['queued'], 1)
+            self.assertEqual(tasks.schedule_price_refreshes()['queued'], 0)
+            apply_async.assert_called_once()
+            # A refresh that never ran is queued again after the timeout
+            Product.objects.filter(id=product.id).update(
+                price_refresh_queued_at=self.now - timedelta(minutes=settings.PRICE_REFRESH_QUEUED_TIMEOUT_MINUTES + 1)
+            )
+            self.assertEqual(tasks.schedule_price_refreshes()['queued'], 1)
+
+    def test_refresh_records_price_change_and_clears_queued_mark(self):
+        product = self.product('B0TEST1000', hours_ago=73)
+        Product.objects.filter(id=product.id).update(price_refresh_queued_at=self.now)
+        html = (Path(__file__).parent / 'fixtures' / 'pages' / 'sample_product.html').read_text()
+        page = {'url': product.url, 'page_type': 'product', 'page_number': 1, 'html': html, 'fetched_at': None}
+        with mock.patch.object(tasks.AmazonProductScraper, '__init__', return_value=None), \
+                mock.patch.object(tasks.AmazonProductScraper, 'fetch_product_page', return_value=page), \
+                mock.patch.object(tasks, '_invalidate_answers') as invalidate, \
+                mock.patch.object(tasks, 'start_product_pipeline') as pipeline, \
+                self.settings(PAGE_ARCHIVE_ENABLED=False):
+            result = tasks.refresh_product_price.apply(args=[str(product.id)]).get()
+            # Adopts the first fingerprint; a later content change starts a rescrape
+            self.assertEqual((result['price_changed'], result['content_changed']), (True, False))
+            Product.objects.filter(id=product.id).update(content_fingerprint=tasks.FINGERPRINT_VERSION + 'stale')
+            result = tasks.refresh_product_price.apply(args=[str(product.id)]).get()
+            self.assertEqual((result['price_changed'], result['content_changed']), (False, True))
+
+        invalidate.assert_called_once_with(product.id)
+        pipeline.assert_called_once_with(product.id, priority='bulk')
+        product.refresh_from_db()
+        self.assertEqual(product.current_price, '$248.00')
+        self.assertIsNone(product.price_refresh_queued_at)
+        self.assertEqual(PriceHistory.objects.filter(product=product).count(), 1)
+
+
+class CanonicalKeyTests(TestCase):
+    def test_saving_an_existing_unkeyed_duplicate_keeps_it_unkeyed(self):
+        Product.objects.create(url='https://www.amazon.com/dp/B0TEST1000')
+        legacy = Product.objects.create(url='https://www.amazon.com/Acme/dp/B0TEST1000/ref=sr_1', canonical_key='x')
+        Product.objects.filter(id=legacy.id).update(canonical_key=None)
+        legacy.refresh_from_db()
+        legacy.title = 'Acme'
+        legacy.save()
+        self.assertIsNone(Product.objects.get(id=legacy.id).canonical_key)
+
+    def test_backfill_merges_url_variants(self):
+        backfill = importlib.import_module('products.migrations.0005_product_canonical_key').backfill_canonical_keys
+        first = Product.objects.create(url='https://www.amazon.com/dp/B0TEST1000', status='failed')
+        completed = Product.objects.create(
+            url='https://www.amazon.com/Acme/dp/B0TEST1000/ref=sr_1', canonical_key='x', status='completed'
+        )
+        other = Product.objects.create(url='https://www.amazon.in/dp/B0TEST1000')
+        session = ChatSession.objects.create(product=first, session_id='s1')
+        Product.objects.update(canonical_key=None)
+
+        backfill(django_apps, None)
+        self.assertEqual(
+            set(Product.objects.values_list('id', 'canonical_key')),
+            {(completed.id, 'amazon.com:B0TEST1000'), (other.id, 'amazon.in:B0TEST1000')}
+        )
+        session.refresh_from_db()
+        self.assertEqual(session.product_id, completed.id)
+
+
+class AskViewTests(TestCase):
+    def setUp(self):
+        self.client = Client(enforce_csrf_checks=True)
+        self.url = reverse('product-ask', args=[uuid.uuid4()])
+
+    def test_logged_in_requests_need_a_csrf_token(self):
+        self.client.force_login(User.objects.create_user('shopper'))
+        response = self.client.post(self.url, {'question': 'price?'}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+
+        token = 'a' * 32
+        self.client.cookies[settings.CSRF_COOKIE_NAME] = token
+        response = self.client.post(
+            self.url, {'question': 'price?'}, content_type='application/json', headers={'X-CSRFToken': token}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_requests_are_parsed_and_validated_by_drf(self):
+        response = self.client.post(self.url, {'question': ''})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('question', response.json())
+        response = self.client.post(self.url, 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_errors_before_the_stream_are_json(self):
+        response = self.client.post(
+            reverse('product-ask-stream', args=[uuid.uuid4()]), {'question': 'price?'},
+            content_type='application/json', headers={'Accept': 'text/event-stream'}
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_history_holds_every_message_after_the_summary(self):
+        product = Product.objects.create(url='https://www.amazon.com/dp/B0HISTORY1', status='completed')
+        session = ChatSession.objects.create(product=product, session_id='s1')
+        start = timezone.now() - timedelta(hours=1)
+        for i in range(14):
+            message = ChatMessage.objects.create(session=session, role='user', content=f'message {i}')
+            ChatMessage.objects.filter(id=message.id).update(created_at=start + timedelta(minutes=i))
+
+        history = async_to_sync(views._aload_history)('s1', product.id)
+        self.assertEqual([msg['content'] for msg in history], [f'message {i}' for i in range(14)])
+
+        ChatSession.objects.filter(id=session.id).update(summarized_until=start + timedelta(minutes=2))
+        history = async_to_sync(views._aload_history)('s1', product.id)
+        self.assertEqual([msg['content'] for msg in history], [f'message {i}' for i in range(3, 14)])
+
+
+class RateLimitTests(SimpleTestCase):
+    class Throttled(Exception):
+        status_code = 429
+
+    def bucket(self, requests_per_minute, tokens_per_minute):
+        return TokenBucket('test', requests_per_minute, tokens_per_minute, redis_client=fakeredis.FakeRedis())
+
+    def take(self, bucket, tokens, at_seconds):
+        with mock.patch('time.time', return_value=1000.0 + at_seconds):
+            return bucket.try_acquire(tokens)
+
+    def test_token_bucket_waits_for_the_refill(self):
+        bucket = self.bucket(60, 1000)
+        self.assertEqual(self.take(bucket, 600, 0), 0)
+        # 400 tokens left; 200 more refill in 12s at 1000 per minute
+        self.assertEqual(self.take(bucket, 600, 0), 12000)
+        self.assertEqual(self.take(bucket, 600, 6), 6000)
+        self.assertEqual(self.take(bucket, 600, 12), 0)
+        # Calls larger than the bucket are capped to it
+        self.assertEqual(self.take(bucket, 5000, 72), 0)
+
+    def test_token_bucket_waits_for_a_request_slot(self):
+        bucket = self.bucket(2, 1000000)
+        self.assertEqual([self.take(bucket, 0, 0) for _ in range(3)], [0, 0, 30000])
+        self.assertEqual(self.take(bucket, 0, 30), 0)
+
+    def test_acquire_rejects_waits_past_max_wait(self):
+        bucket = self.bucket(1, 1000000)
+        bucket.acquire()
+        with self.assertRaises(RateLimitExceeded) as raised:
+            bucket.acquire(max_wait=1)
+        self.assertEqual(raised.exception.retry_after, 60)
+
+    def test_adaptive_concurrency_is_aimd(self):
+        concurrency = AdaptiveConcurrency(max_limit=4, initial=1)
+        concurrency.enter()
+        concurrency.exit()
+        self.assertEqual(concurrency.limit, 2.0)
+        for throttled in (True, True):
+            concurrency.enter()
+            concurrency.exit(throttled=throttled)
+        self.assertEqual(concurrency.limit, 1.0)
+        for _ in range(50):
+            concurrency.enter()
+            concurrency.exit()
+        self.assertEqual(concurrency.limit, 4.0)
+
+    def limiter(self, outcomes, max_retries=1, transient_retries=3):
+        limiter = ProviderLimiter('test', 1000, 1000000, 4, redis_client=fakeredis.FakeRedis())
+        limiter.max_retries, limiter.transient_retries = max_retries, transient_retries
+        limiter.backoff = lambda attempt: 0
+        outcomes = list(outcomes)
+        calls = []
+
+        def func():
+            calls.append(1)
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        async def afunc():
+            return func()
+
+        return limiter, func, afunc, calls
+
+    def test_transient_retries_have_their_own_budget(self):
+        # More transient retries than 429 retries still ends in a result
+        outcomes = [TimeoutError(), ConnectionError(), self.Throttled(), TimeoutError(), 'answer']
+        limiter, func, afunc, calls = self.limiter(outcomes)
+        self.assertEqual(limiter.call(func), 'answer')
+        self.assertEqual(len(calls), 5)
+        limiter, func, afunc, calls = self.limiter(outcomes)
+        self.assertEqual(asyncio.run(limiter.acall(afunc)), 'answer')
+
+    def test_retry_classification(self):
+        limiter, func, afunc, calls = self.limiter([self.Throttled(), self.Throttled(), 'answer'])
+        with self.assertRaises(RateLimitExceeded):
+            limiter.call(func)
+        self.assertEqual(len(calls), 2)
+
+        limiter, func, afunc, calls = self.limiter([TimeoutError()] * 4 + ['answer'])
+        with self.assertRaises(TimeoutError):
+            asyncio.run(limiter.acall(afunc))
+        self.assertEqual(len(calls), 4)
+
+        limiter, func, afunc, calls = self.limiter([ValueError('bad request'), 'answer'])
+        with self.assertRaises(ValueError):
+            limiter.call(func)
+        self.assertEqual(len(calls), 1)
+
+
+class ConcurrentReviewFetchTests(SimpleTestCase):
+    URL = 'https://www.amazon.com/dp/B0TEST1000'
+
+    def scraper(self, results):
+        scraper = AmazonProductScraper(browser_pool=mock.Mock(), review_fetch_mode='concurrent', capture_pages=False)
+        scraper.product_url = self.URL
+        scraper.page = mock.Mock()
+        fetcher = mock.Mock(concurrency=5)
+        fetcher.fetch.return_value = results
+        patcher = mock.patch('products.scraper.get_review_fetcher', return_value=fetcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return scraper
+
+    def product_data(self):
+        return {'has_reviews_section': True, 'has_see_all_reviews': True, 'reviews': [{'text': 'from product page'}]}
+
+    def test_failed_first_page_falls_back_to_sequential_pagination(self):
+        scraper = self.scraper([RuntimeError('blocked')] * 5)
+        self.assertIsNone(scraper._fetch_reviews_concurrently())
+        with mock.patch.object(scraper, 'safe_find_element', return_value=None) as find:
+            self.assertEqual(scraper._extract_reviews_pw(self.product_data()), [{'text': 'from product page'}])
+        find.assert_called_once()
+
+    def test_review_pages_without_reviews_keep_product_page_reviews(self):
+        page = {'url': self.URL, 'html': '', 'fetched_at': None, 'data': {'reviews': [], 'has_next_page': False}}
+        scraper = self.scraper([page] + [RuntimeError('not reached')] * 4)
+        self.assertEqual(scraper._extract_reviews_pw(self.product_data()), [{'text': 'from product page'}])
+
+    def test_low_memory_skips_the_concurrent_fetcher(self):
+        scraper = self.scraper([])
+        with mock.patch('products.review_fetcher.available_memory_mb', return_value=100), \
+                mock.patch.object(scraper, '_fetch_reviews_concurrently') as concurrent, \
+                mock.patch.object(scraper, 'safe_find_element', return_value=None):
+            scraper._extract_reviews_pw(self.product_data())
+        concurrent.assert_not_called()
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class SemanticAnswerCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = fakeredis.FakeRedis()
+        self.cache = self.worker()
+
+    def worker(self, **kwargs):
+        """Another process sharing Redis, with its own in-process copies"""
+        return SemanticAnswerCache(threshold=0.9, max_entries=kwargs.get('max_entries', 10), timeout=60, redis_client=self.redis)
+
+    def answer(self, text):
+        return {'answer': text, 'context_chunks': []}
+
+    def test_exact_hit_on_the_normalised_question(self):
+        self.cache.set('p1', 'What is the price?', self.answer('$10'))
+        self.assertEqual(self.cache.get_exact('p1', '  what is the PRICE ')['answer'], '$10')
+        self.assertIsNone(self.cache.get_exact('p2', 'What is the price?'))
+
+    def test_similar_hit_sees_answers_added_by_other_workers(self):
+        other = self.worker()
+        self.cache.set('p1', 'Is it loud?', self.answer('quiet'), embedding=[1.0, 0.0, 0.0])
+        self.assertEqual(other.get_similar('p1', [0.99, 0.05, 0.0])['answer'], 'quiet')
+        self.assertIsNone(other.get_similar('p1', [0.0, 1.0, 0.0]))
+
+        # Added after `other` built its copy; the copy is extended, not reloaded
+        loaded_at = other._local.get('p1')[4]
+        self.cache.set('p1', 'Does it fold?', self.answer('yes'), embedding=[0.0, 1.0, 0.0])
+        self.assertEqual(other.get_similar('p1', [0.05, 0.99, 0.0])['answer'], 'yes')
+        self.assertEqual(len(other._local.get('p1')[2]), 2)
+        self.assertEqual(other._local.get('p1')[4], loaded_at)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        small = self.worker(max_entries=2)
+        for n, vector in enumerate(([1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])):
+            small.set('p1', f'question {n}', self.answer(str(n)), embedding=vector)
+        stored = {key.decode() for key in self.redis.hkeys(small.vectors_key('p1'))}
+        self.assertEqual(stored, {small.answer_key('p1', 'question 1'), small.answer_key('p1', 'question 2')})
+        self.assertEqual(self.redis.zcard(small.added_key('p1')), 2)
+
+    def test_invalidate_drops_answers_and_every_copy_of_the_index(self):
+        other = self.worker()
+        self.cache.set('p1', 'Is it loud?', self.answer('quiet'), embedding=[1.0, 0.0, 0.0])
+        self.assertIsNotNone(other.get_similar('p1', [1.0, 0.0, 0.0]))
+
+        self.assertEqual(self.cache.invalidate('p1'), 1)
+        self.assertIsNone(self.cache.get_exact('p1', 'Is it loud?'))
+        self.assertIsNone(other.get_similar('p1', [1.0, 0.0, 0.0]))
+        self.assertEqual(other._local.get('p1')[2], [])
+
+
+class PageArchiveTests(TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.enterContext(self.settings(PAGE_ARCHIVE_DIR=tmp.name, PAGE_ARCHIVE_HOST='scrape-1'))
+        self.archive = PageArchive()
+        self.product = Product.objects.create(url='https://www.amazon.com/dp/B0TEST1000')
+        self.html = (Path(__file__).parent / 'fixtures' / 'pages' / 'sample_product.html').read_text()
+
+    def page(self, html, days_ago=0, url=None):
+        return {
+            'url': url or self.product.url, 'page_type': 'product', 'page_number': 0, 'html': html,
+            'fetched_at': timezone.now() - timedelta(days=days_ago),
+        }
+
+    def test_round_trip_and_deduplication(self):
+        first = self.archive.store(self.html)
+        second = self.archive.store(self.html)
+        self.assertFalse(first['deduplicated'])
+        self.assertTrue(second['deduplicated'])
+        self.assertLess(first['compressed_size'], first['raw_size'])
+        self.assertEqual(self.archive.load(first['content_hash']), self.html)
+
+        snapshots = tasks._store_snapshots(self.product.id, [self.page(self.html), self.page(self.html)])
+        self.assertEqual([snapshot.archive_host for snapshot in snapshots], ['scrape-1', 'scrape-1'])
+        data = tasks._load_archived_product_data(self.product.id)
+        self.assertEqual(data['title'], parsers.parse_product_page(self.html, self.product.url)['title'])
+        self.assertTrue(data['chunks'])
+
+    def test_prune_keeps_the_latest_snapshot_and_other_hosts_pages(self):
+        tasks._store_snapshots(self.product.id, [self.page('<html>old</html>', days_ago=40)])
+        tasks._store_snapshots(self.product.id, [self.page('<html>new</html>', days_ago=35)])
+        other_url = 'https://www.amazon.com/dp/B0TEST2000'
+        other_disk = tempfile.TemporaryDirectory()
+        self.addCleanup(other_disk.cleanup)
+        with self.settings(PAGE_ARCHIVE_HOST='scrape-2', PAGE_ARCHIVE_DIR=other_disk.name):
+            tasks._store_snapshots(self.product.id, [
+                self.page('<html>elsewhere</html>', days_ago=50, url=other_url),
+                self.page('<html>elsewhere 2</html>', days_ago=45, url=other_url),
+            ])
+        old, new = (self.archive.content_hash(html) for html in ('<html>old</html>', '<html>new</html>'))
+
+        # Past the grace period for freshly written blobs
+        with mock.patch('time.time', return_value=time.time() + 7200):
+            result = tasks.prune_page_archive()
+        self.assertEqual(result, {'deleted_snapshots': 1, 'deleted_blobs': 1})
+        self.assertFalse(self.archive.exists(old))
+        self.assertTrue(self.archive.exists(new))
+        # scrape-2's snapshots are left to scrape-2's own prune
+        self.assertEqual(PageSnapshot.objects.filter(archive_host='scrape-2').count(), 2)
+
+        with mock.patch.object(tasks.prune_page_archive, 'apply_async') as apply_async:
+            self.assertEqual(sorted(tasks.schedule_page_archive_pruning()['hosts']), ['scrape-1', 'scrape-2'])
+        self.assertEqual(
+            sorted(call.kwargs['queue'] for call in apply_async.call_args_list), ['archive.scrape-1', 'archive.scrape-2']
+        )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class EmbeddingCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.provider = FakeEmbeddings()
+        self.embeddings = CachedEmbeddings(self.provider, model_name='fake')
+
+    def test_lru_evicts_the_least_recently_used(self):
+        lru = LRUCache(2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertEqual((lru.get('a'), lru.get('b'), lru.get('c')), (1, None, 3))
+
+    def test_only_uncached_texts_reach_the_provider(self):
+        self.assertEqual(self.embeddings.embed_documents(['one', 'two', 'one']), [[3.0, 1.0], [3.0, 1.0], [3.0, 1.0]])
+        self.assertEqual(self.provider.texts, ['one', 'two'])
+        self.embeddings.embed_documents(['two', 'three'])
+        self.assertEqual(self.provider.texts, ['one', 'two', 'three'])
+
+        # Another process (empty LRU) reads the shared cache
+        other = CachedEmbeddings(self.provider, model_name='fake')
+        self.assertEqual(other.embed_query('three'), [5.0, 1.0])
+        self.assertEqual(self.provider.texts, ['one', 'two', 'three'])
+        # Vectors of another model are not shared
+        CachedEmbeddings(self.provider, model_name='other').embed_query('three')
+        self.assertEqual(self.provider.texts, ['one', 'two', 'three', 'three'])
+
+    def test_micro_batcher_coalesces_concurrent_queries(self):
+        batches = []
+
+        def embed(items):
+            batches.append(list(items))
+            return [item.upper() for item in items]
+
+        batcher = MicroBatcher(embed, window_ms=200, max_batch_size=3)
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(batcher.submit, ['a', 'b', 'c', 'd']))
+        self.assertEqual(results, ['A', 'B', 'C', 'D'])
+        self.assertEqual(sorted(len(batch) for batch in batches), [1, 3])
+
+    def test_micro_batcher_fails_every_item_of_a_failed_batch(self):
+        batcher = MicroBatcher(mock.Mock(side_effect=RuntimeError('provider down')), window_ms=1)
+        with self.assertRaises(RuntimeError):
+            batcher.submit('a')
+
+
+class PersistScrapedDataTests(TestCase):
+    def setUp(self):
+        self.product = Product.objects.create(url='https://www.amazon.com/dp/B0TEST1000')
+
+    def scraped(self, helpful_votes='3 people found this helpful'):
+        review = {
+            'title': 'Great', 'text': 'Quiet and comfortable', 'rating': '5.0 out of 5 stars',
+            'customer_name': 'Jordan', 'helpful_votes': helpful_votes, 'date': 'Reviewed on January 5, 2024',
+        }
+        return {
+            'title': 'Acme WH-1000', 'current_price': '$248.00', 'features': 'Noise cancelling',
+            # A page can repeat a review (e.g. top and recent lists)
+            'reviews': [review, dict(review)],
+            'qa': ['Question: Does it fold? Answer: Yes.'],
+        }
+
+    def test_rerun_adds_no_duplicates_and_updates_votes(self):
+        self.assertEqual(tasks._persist_scraped_data(self.product.id, self.scraped()), (1, 1))
+        self.assertEqual(tasks._persist_scraped_data(self.product.id, self.scraped('7 people found this helpful')), (1, 1))
+
+        self.assertEqual(self.product.reviews.count(), 1)
+        self.assertEqual(self.product.questions.count(), 1)
+        review = self.product.reviews.get()
+        self.assertEqual(review.helpful_votes, '7 people found this helpful')
+        self.assertEqual(review.review_date.isoformat(), '2024-01-05')
+        self.product.refresh_from_db()
+        self.assertEqual((self.product.title, self.product.status), ('Acme WH-1000', 'embedding'))
+
+
+@override_settings(INGEST_ENQUEUE_BATCH_SIZE=2)
+class BulkIngestTests(TestCase):
+    def setUp(self):
+        patcher = mock.patch('products.ingest.enqueue_product_pipelines.apply_async')
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_variants_of_one_product_collapse_and_existing_products_are_skipped(self):
+        existing = Product.objects.create(url='https://www.amazon.com/dp/B000000001')
+        summary = ingest_urls([
+            'https://www.amazon.com/Some-Slug/dp/B000000001?ref=x',
+            'https://www.amazon.com/dp/B000000002',
+            'https://amazon.com/gp/product/B000000002/?tag=y',
+            'https://www.amazon.in/dp/B000000002',
+            'https://example.com/dp/B000000003',
+        ])
+
+        self.assertEqual(
+            (summary['created'], summary['existing'], summary['duplicates'], summary['invalid']), (2, 1, 1, 1)
+        )
+        self.assertEqual(Product.objects.filter(canonical_key='amazon.com:B000000001').get(), existing)
+        self.assertEqual(
+            set(Product.objects.filter(id__in=summary['product_ids']).values_list('canonical_key', flat=True)),
+            {'amazon.com:B000000002', 'amazon.in:B000000002'}
+        )
+
+    def test_new_products_are_queued_in_batches_at_the_requested_priority(self):
+        urls = [f'https://www.amazon.com/dp/B00000000{i}' for i in range(5)]
+        summary = ingest_urls(urls, priority='interactive')
+        self.assertEqual(summary['created'], 5)
+
+        batches = [call.kwargs['args'] for call in self.apply_async.call_args_list]
+        self.assertEqual([len(ids) for ids, priority in batches], [2, 2, 1])
+        self.assertEqual({priority for ids, priority in batches}, {'interactive'})
+        self.assertEqual(sum((ids for ids, priority in batches), []), summary['product_ids'])
+        self.assertEqual({call.kwargs['priority'] for call in self.apply_async.call_args_list}, {0})
+
+        # A second ingest of the same URLs creates and queues nothing
+        self.apply_async.reset_mock()
+        self.assertEqual(ingest_urls(urls)['existing'], 5)
+        self.apply_async.assert_not_called()
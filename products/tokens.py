@@ -0,0 +1,33 @@
+import logging
+import threading
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ENCODING = 'cl100k_base'
+
+_lock = threading.Lock()
+_encodings = {}
+
+
+def _get_encoding(name):
+    with _lock:
+        if name not in _encodings:
+            try:
+                _encodings[name] = tiktoken.get_encoding(name)
+            except Exception as e:
+                # The BPE file is downloaded on first use; fall back to an estimate when offline
+                logger.warning(f"Could not load tiktoken encoding {name}, estimating tokens: {str(e)}")
+                _encodings[name] = None
+        return _encodings[name]
+
+
+def count_tokens(text, encoding_name=DEFAULT_ENCODING):
+    """Token count of ``text`` (about 4 characters per token if the encoding is unavailable)"""
+    if not text:
+        return 0
+    encoding = _get_encoding(encoding_name)
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
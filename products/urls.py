@@ -16,17 +16,23 @@ from . import views
 urlpatterns = [
     # 1. Product CRUD
     path('products/', views.ProductListCreateView.as_view(), name='product-list'),
+    path('products/bulk/', views.ProductBulkIngestView.as_view(), name='product-bulk-ingest'),
     path('products/<uuid:id>/', views.ProductDetailView.as_view(), name='product-detail'),
 
     # 2. Product Actions (Previously @action)
     path('products/<uuid:id>/status/', views.ProductStatusView.as_view(), name='product-status'),
     path('products/<uuid:id>/retry/', views.ProductRetryView.as_view(), name='product-retry'),
     path('products/<uuid:id>/ask/', views.ProductAskView.as_view(), name='product-ask'),
+    path('products/<uuid:id>/ask/stream/', views.ProductAskStreamView.as_view(), name='product-ask-stream'),
     
     # 3. Nested Resources (Reviews & Sessions)
     path('products/<uuid:id>/reviews/', views.ProductReviewsView.as_view(), name='product-reviews'),
+    path('products/<uuid:id>/price-history/', views.ProductPriceHistoryView.as_view(), name='product-price-history'),
     path('products/<uuid:id>/chat-sessions/', views.ProductChatSessionsView.as_view(), name='product-sessions'),
 
     # 4. Standalone Chat Session URLs
     path('chat-sessions/<str:session_id>/messages/', views.ChatSessionMessagesView.as_view(), name='session-messages'),
+
+    # 5. Operational
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
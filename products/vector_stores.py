@@ -0,0 +1,355 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from pinecone import Pinecone
+
+logger = logging.getLogger(__name__)
+
+_COMPARISONS = {
+    '$eq': lambda value, operand: value == operand,
+    '$ne': lambda value, operand: value != operand,
+    '$gt': lambda value, operand: value is not None and value > operand,
+    '$gte': lambda value, operand: value is not None and value >= operand,
+    '$lt': lambda value, operand: value is not None and value < operand,
+    '$lte': lambda value, operand: value is not None and value <= operand,
+    '$in': lambda value, operand: value in operand,
+    '$nin': lambda value, operand: value not in operand,
+}
+
+
+def _field_matches(value, condition):
+    if not isinstance(condition, dict):
+        condition = {'$eq': condition}
+    for operator, operand in condition.items():
+        compare = _COMPARISONS[operator]
+        if isinstance(value, list):
+            # List fields (e.g. review_ids) match when any element does, as in Pinecone
+            if operator in ('$ne', '$nin'):
+                if not all(compare(item, operand) for item in value):
+                    return False
+            elif not any(compare(item, operand) for item in value):
+                return False
+        elif not compare(value, operand):
+            return False
+    return True
+
+
+def metadata_matches(metadata, metadata_filter):
+    """
+    Evaluate a Pinecone-style metadata filter ({'type': 'review',
+    'rating': {'$lte': 2}}, '$and' / '$or' lists) against one record's metadata.
+    A range comparison on a missing field is false, as in Pinecone.
+    """
+    for key, condition in metadata_filter.items():
+        if key == '$and':
+            if not all(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == '$or':
+            if not any(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif not _field_matches(metadata.get(key), condition):
+            return False
+    return True
+
+
+class PineconeVectorStore:
+    """Vector store backed by the hosted Pinecone index"""
+
+    def __init__(self):
+        self.pc = Pinecone(api_key=settings.PINECONE_API_KEY)
+        self.index = self.pc.Index(settings.PINECONE_INDEX_NAME)
+
+    def upsert(self, vectors, namespace):
+        self.index.upsert(vectors=vectors, namespace=namespace)
+
+    def query(self, vector, top_k, namespace, metadata_filter=None):
+        """
+        ``metadata_filter`` is applied by the index, before the top-k cut
+        Returns: list of dicts with id, score and metadata, best first
+        """
+        results = self.index.query(
+            vector=vector,
+            top_k=top_k,
+            namespace=namespace,
+            filter=metadata_filter or None,
+            include_metadata=True
+        )
+        return [
+            {
+                'id': match.id,
+                'score': match.score,
+                'metadata': match.metadata or {}
+            }
+            for match in results.matches
+        ]
+
+    def delete(self, namespace, ids=None, delete_all=False):
+        if delete_all:
+            self.index.delete(delete_all=True, namespace=namespace)
+        elif ids:
+            self.index.delete(ids=list(ids), namespace=namespace)
+
+
+class LocalVectorStore:
+    """
+    In-process exact-search vector store.
+
+    Each namespace lives in its own directory as a contiguous float32 matrix
+    (``vectors-<version>.npy``, memory-mapped on read) plus a ``manifest.json``
+    holding the row ids and metadata. Rows are L2-normalised on write, so a
+    dot product gives the same cosine score as the Pinecone index. Writers
+    hold an exclusive file lock on the namespace (threads and processes
+    alike), produce a new matrix file and atomically swap the manifest, so
+    readers never see a half-written namespace. A superseded matrix is kept
+    for ``LOCAL_VECTOR_STORE_GRACE_SECONDS`` so readers that loaded the old
+    manifest can still open it.
+    """
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, root=None, block_size=4096, grace_seconds=None):
+        self.root = Path(root or settings.LOCAL_VECTOR_STORE_DIR)
+        self.block_size = block_size
+        self.grace_seconds = (
+            settings.LOCAL_VECTOR_STORE_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        )
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    # --- Storage helpers ---
+
+    def _namespace_dir(self, namespace):
+        return self.root / namespace
+
+    @contextmanager
+    def _write_lock(self, namespace):
+        """Exclusive writer lock for a namespace, across threads and processes"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Outside the namespace directory, which delete_all removes
+        lock_path = self.root / f".{namespace}.lock"
+        with self._lock, open(lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_manifest(self, namespace):
+        try:
+            with open(self._namespace_dir(namespace) / self.MANIFEST) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _load(self, namespace, retry=True):
+        """Return (matrix, ids, metadata) for a namespace, cached by manifest mtime."""
+        manifest_path = self._namespace_dir(namespace) / self.MANIFEST
+        try:
+            mtime = manifest_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._cache.pop(namespace, None)
+            return None
+
+        cached = self._cache.get(namespace)
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        manifest = self._read_manifest(namespace)
+        if manifest is None:
+            self._cache.pop(namespace, None)
+            return None
+
+        matrix_path = self._namespace_dir(namespace) / manifest['matrix']
+        try:
+            if manifest['ids']:
+                matrix = np.load(matrix_path, mmap_mode='r')
+            else:
+                matrix = np.empty((0, manifest.get('dimension', 0)), dtype=np.float32)
+        except FileNotFoundError:
+            # The namespace was rewritten (or deleted) between reading the manifest and the matrix
+            if not retry:
+                raise
+            return self._load(namespace, retry=False)
+
+        entry = (matrix, manifest['ids'], manifest['metadata'])
+        self._cache[namespace] = (mtime, entry)
+        return entry
+
+    def _write(self, namespace, matrix, ids, metadata):
+        """Swap in a new matrix and manifest; call with the namespace write lock held"""
+        namespace_dir = self._namespace_dir(namespace)
+        namespace_dir.mkdir(parents=True, exist_ok=True)
+
+        matrix_name = f"vectors-{uuid.uuid4().hex}.npy"
+        np.save(namespace_dir / matrix_name, np.ascontiguousarray(matrix, dtype=np.float32))
+
+        # Superseded matrices (name -> time retired) are deleted once the grace period has passed
+        now = time.time()
+        previous = self._read_manifest(namespace) or {}
+        retired = dict(previous.get('retired', {}))
+        if previous.get('matrix'):
+            retired[previous['matrix']] = now
+        expired = [name for name, retired_at in retired.items() if now - retired_at >= self.grace_seconds]
+        for name in expired:
+            del retired[name]
+
+        manifest = {
+            'matrix': matrix_name,
+            'dimension': int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+            'ids': ids,
+            'metadata': metadata,
+            'retired': retired,
+        }
+        tmp_path = namespace_dir / f"{self.MANIFEST}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, namespace_dir / self.MANIFEST)
+
+        # Files no manifest refers to are left behind by writers that crashed mid-write
+        live = {matrix_name, *retired}
+        for path in namespace_dir.glob('vectors-*.npy'):
+            if path.name in live:
+                continue
+            try:
+                if path.name in expired or now - path.stat().st_mtime >= self.grace_seconds:
+                    path.unlink()
+            except OSError:
+                pass
+        self._cache.pop(namespace, None)
+
+    @staticmethod
+    def _normalize(values):
+        matrix = np.asarray(values, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    # --- Public API (mirrors PineconeVectorStore) ---
+
+    def upsert(self, vectors, namespace):
+        if not vectors:
+            return
+
+        new_ids = [v['id'] for v in vectors]
+        new_matrix = self._normalize([v['values'] for v in vectors])
+        new_metadata = [v.get('metadata', {}) for v in vectors]
+
+        with self._write_lock(namespace):
+            existing = self._load(namespace)
+            if existing and existing[1]:
+                matrix, ids, metadata = existing
+                replaced = set(new_ids)
+                keep = [i for i, vector_id in enumerate(ids) if vector_id not in replaced]
+                matrix = np.concatenate([np.asarray(matrix)[keep], new_matrix])
+                ids = [ids[i] for i in keep] + new_ids
+                metadata = [metadata[i] for i in keep] + new_metadata
+            else:
+                matrix, ids, metadata = new_matrix, new_ids, new_metadata
+
+            self._write(namespace, matrix, ids, metadata)
+
+    def query(self, vector, top_k, namespace, metadata_filter=None):
+        """
+        Exact top-k by cosine similarity, scanning the matrix in blocks.
+        With ``metadata_filter`` only the matching rows are scored.
+        Returns: list of dicts with id, score and metadata, best first
+        """
+        entry = self._load(namespace)
+        if not entry or not entry[1] or top_k <= 0:
+            return []
+
+        matrix, ids, metadata = entry
+        query = self._normalize(vector)[0]
+
+        if metadata_filter:
+            rows = np.array(
+                [row for row, row_metadata in enumerate(metadata) if metadata_matches(row_metadata, metadata_filter)],
+                dtype=np.int64
+            )
+            if not len(rows):
+                return []
+            scores = np.asarray(matrix[rows]) @ query
+            top = np.argsort(-scores)[:top_k]
+            return [
+                {'id': ids[row], 'score': float(scores[i]), 'metadata': metadata[row]}
+                for i, row in zip(top, rows[top])
+            ]
+
+        best_scores = np.empty(0, dtype=np.float32)
+        best_rows = np.empty(0, dtype=np.int64)
+        for start in range(0, len(ids), self.block_size):
+            block = matrix[start:start + self.block_size]
+            scores = block @ query
+            if len(scores) > top_k:
+                top = np.argpartition(scores, -top_k)[-top_k:]
+            else:
+                top = np.arange(len(scores))
+            best_scores = np.concatenate([best_scores, scores[top]])
+            best_rows = np.concatenate([best_rows, top + start])
+            if len(best_scores) > top_k:
+                keep = np.argpartition(best_scores, -top_k)[-top_k:]
+                best_scores, best_rows = best_scores[keep], best_rows[keep]
+
+        order = np.argsort(-best_scores)
+        return [
+            {
+                'id': ids[row],
+                'score': float(best_scores[i]),
+                'metadata': metadata[row]
+            }
+            for i, row in zip(order, best_rows[order])
+        ]
+
+    def delete(self, namespace, ids=None, delete_all=False):
+        with self._write_lock(namespace):
+            if delete_all:
+                namespace_dir = self._namespace_dir(namespace)
+                if namespace_dir.exists():
+                    for path in namespace_dir.iterdir():
+                        path.unlink()
+                    namespace_dir.rmdir()
+                self._cache.pop(namespace, None)
+                return
+
+            entry = self._load(namespace)
+            if not entry or not ids:
+                return
+            matrix, current_ids, metadata = entry
+            removed = set(ids)
+            keep = [i for i, vector_id in enumerate(current_ids) if vector_id not in removed]
+            if len(keep) == len(current_ids):
+                return
+            self._write(
+                namespace,
+                np.asarray(matrix)[keep].reshape(len(keep), matrix.shape[1]),
+                [current_ids[i] for i in keep],
+                [metadata[i] for i in keep]
+            )
+
+
+VECTOR_STORE_BACKENDS = {
+    'pinecone': PineconeVectorStore,
+    'local': LocalVectorStore,
+}
+
+
+def get_vector_store(backend=None):
+    """Build the vector store selected by settings.VECTOR_STORE_BACKEND"""
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    try:
+        store_class = VECTOR_STORE_BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown vector store backend: {backend}")
+    logger.info(f"Using {backend} vector store")
+    return store_class()
@@ -3,20 +3,34 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.parsers import FormParser, JSONParser, MultiPartParser
+from django.conf import settings
 from django.shortcuts import get_object_or_404
-from django.db.models import Q
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.http import StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from celery.result import AsyncResult
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import json
 import uuid
 import logging
 
-from .models import Product, Review, ChatSession, ChatMessage
+from .models import Product, Review, PriceHistory, ChatSession, ChatMessage
 from .serializers import (
     ProductListSerializer, ProductDetailSerializer, ProductCreateSerializer,
     ReviewSerializer, ChatSessionSerializer, ChatMessageSerializer,
-    AskQuestionSerializer
+    AskQuestionSerializer, BulkIngestSerializer, PriceHistorySerializer
 )
-from .tasks import scrape_and_embed_product
-from .services import QAService
+from .tasks import start_product_pipeline, summarize_chat_history
+from .ingest import ingest_urls
+from .registry import get_qa_service
+from .answer_cache import SemanticAnswerCache
+from .intent_router import IntentRouter
+from .rate_limit import RateLimitExceeded
+from .amazon_urls import canonical_key, canonical_product_url
+from . import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -61,9 +75,10 @@ class ProductListCreateView(APIView):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
         url = serializer.validated_data['url']
+        key = canonical_key(url)
 
-        # 2. Check Existence Logic
-        existing_product = Product.objects.filter(url=url).first()
+        # 2. Check Existence Logic (any URL variant of the same ASIN)
+        existing_product = Product.objects.filter(canonical_key=key).first()
         if existing_product:
             if existing_product.status == 'completed':
                 return Response({
@@ -76,13 +91,28 @@ class ProductListCreateView(APIView):
                     'product': ProductDetailSerializer(existing_product).data
                 }, status=status.HTTP_200_OK)
         
-        # 3. Create & Save
-        product = Product.objects.create(url=url, status='pending')
+        # 3. Create & Save (or reuse a failed product's row)
+        if existing_product:
+            product = existing_product
+            Product.objects.filter(id=product.id).update(status='pending', error_message=None)
+            product.status, product.error_message = 'pending', None
+        else:
+            product_url = canonical_product_url(url)
+            try:
+                with transaction.atomic():
+                    product = Product.objects.create(url=product_url, canonical_key=key, status='pending')
+            except IntegrityError:
+                # Added concurrently by another request
+                product = Product.objects.filter(Q(canonical_key=key) | Q(url=product_url)).first()
+                return Response({
+                    'message': 'Product is being processed',
+                    'product': ProductDetailSerializer(product).data
+                }, status=status.HTTP_200_OK)
         
-        # 4. Trigger Celery Task
-        task = scrape_and_embed_product.delay(str(product.id))
+        # 4. Trigger Celery Task (interactive priority: ahead of bulk backfills)
+        task = start_product_pipeline(product.id, priority='interactive')
+        Product.objects.filter(id=product.id).update(task_id=task.id)
         product.task_id = task.id
-        product.save()
 
         logger.info(f"Created product {product.id}...")
 
@@ -93,6 +123,28 @@ class ProductListCreateView(APIView):
         }, status=status.HTTP_201_CREATED)
 
 
+class ProductBulkIngestView(APIView):
+    """
+    Handles: POST /products/bulk/
+    
+    Accepts {"urls": [...], "priority": "bulk"|"interactive"} as JSON, or a
+    multipart CSV upload in 'file'. Products are created in bulk and their
+    pipelines queued in the background.
+    """
+    parser_classes = [JSONParser, MultiPartParser, FormParser]
+    
+    def post(self, request):
+        serializer = BulkIngestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        summary = ingest_urls(
+            serializer.validated_data['urls'],
+            priority=serializer.validated_data['priority']
+        )
+        return Response(summary, status=status.HTTP_202_ACCEPTED)
+
+
 class ProductDetailView(APIView):
     """
     Handles:
@@ -162,7 +214,7 @@ class ProductRetryView(APIView):
         product.error_message = None
         product.save()
         
-        task = scrape_and_embed_product.delay(str(product.id))
+        task = start_product_pipeline(product.id)
         product.task_id = task.id
         product.save()
         
@@ -172,78 +224,325 @@ class ProductRetryView(APIView):
         })
 
 
-class ProductAskView(APIView):
+# Assistant messages are written off the request's critical path. A thread
+# pool (rather than an asyncio task) survives the per-request event loop used
+# when async views run under WSGI.
+_PERSIST_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix='chat-persist')
+
+
+def _queue_history_summary(session_id):
+    try:
+        summarize_chat_history.delay(str(session_id))
+    except Exception as e:
+        logger.error(f"Error queueing chat summary: {str(e)}", exc_info=True)
+
+
+def _save_messages(messages, summarize_session_id=None):
+    """Insert chat messages, then queue the session's history summary if it is due"""
+    try:
+        ChatMessage.objects.bulk_create(messages)
+        if summarize_session_id:
+            _queue_history_summary(summarize_session_id)
+    except Exception as e:
+        logger.error(f"Error saving chat messages: {str(e)}", exc_info=True)
+    finally:
+        close_old_connections()
+
+
+def _sse_event(event, data):
+    """Format one server-sent event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView whose handlers are coroutines
+    
+    DRF has no async dispatch, so the usual request policies (content
+    negotiation, authentication with SessionAuthentication's CSRF check,
+    permissions, throttles) and body parsing run in a thread before the
+    handler is awaited; errors go through DRF's exception handling.
+    """
+    def _initial(self, request, *args, **kwargs):
+        self.initial(request, *args, **kwargs)
+        request.data
+    
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+        
+        try:
+            await sync_to_async(self._initial)(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+        
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
+
+
+def _parse_ask_request(request):
+    """
+    Validate an ask request body
+    Returns: (validated_data, None) or (None, error Response)
+    """
+    serializer = AskQuestionSerializer(data=request.data)
+    if not serializer.is_valid():
+        return None, Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return serializer.validated_data, None
+
+
+async def _aload_conversation(product, session_id, user):
+    """
+    Chat session and history of an ask request
+    
+    Both lookups only depend on ids from the request, so they are issued
+    together instead of one after another.
+    Returns: (chat_session, chat_history)
+    """
+    if session_id:
+        chat_session, history = await asyncio.gather(
+            ChatSession.objects.filter(session_id=session_id, product_id=product.id).afirst(),
+            _aload_history(session_id, product.id),
+        )
+    else:
+        session_id = str(uuid.uuid4())
+        chat_session, history = None, []
+    
+    if not chat_session:
+        chat_session = await ChatSession.objects.acreate(
+            product=product,
+            session_id=session_id,
+            user=user if user.is_authenticated else None
+        )
+        history = []
+    
+    return chat_session, history
+
+
+async def _aload_history(session_id, product_id):
+    """
+    The messages of a session not yet folded into its summary, oldest first
+    
+    Everything after summarized_until is loaded (the summary only advances
+    a batch at a time, in the background); PromptBudget keeps the newest
+    that fit the history budget.
+    """
+    return [
+        {'role': msg.role, 'content': msg.content}
+        async for msg in ChatMessage.objects.filter(
+            Q(session__summarized_until__isnull=True) | Q(created_at__gt=F('session__summarized_until')),
+            session__session_id=session_id, session__product_id=product_id
+        ).order_by('created_at')
+    ]
+
+
+async def _aprepare_ask(request, id):
+    """
+    Shared front half of the ask endpoints
+    
+    Checks that the product exists and is ready (one primary-key lookup)
+    before anything billable runs, then starts retrieval (answer cache,
+    question embedding, vector query) and overlaps it with session/history
+    loading and the user-message insert.
+    Returns: (context dict, None) or (None, error Response)
+    """
+    data, error = _parse_ask_request(request)
+    if error:
+        return None, error
+    question = data['question']
+    
+    product = await Product.objects.filter(id=id).afirst()
+    if product is None:
+        return None, Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+    if product.status != 'completed':
+        return None, Response(
+            {'error': 'Product data is not ready yet'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    qa_service = await sync_to_async(get_qa_service, thread_sensitive=False)()
+    # Questions the product row answers (price, stock, ...) skip retrieval entirely.
+    # Both steps record metrics, so they run off the event loop like retrieval.
+    intent = None
+    if settings.INTENT_ROUTER_ENABLED:
+        intent = await sync_to_async(qa_service.intent_router.classify, thread_sensitive=False)(question)
+    result = None
+    if intent and intent.structured:
+        result = await sync_to_async(qa_service.answer_from_product, thread_sensitive=False)(
+            product, question, intent
+        )
+    if result:
+        retrieval = asyncio.get_running_loop().create_future()
+        retrieval.set_result({'result': result})
+    else:
+        retrieval = asyncio.ensure_future(qa_service.aretrieve(id, question))
+    
+    try:
+        chat_session, chat_history = await _aload_conversation(
+            product, data.get('session_id'), request.user
+        )
+    except Exception:
+        retrieval.cancel()
+        raise
+    
+    # Save User Msg while retrieval / generation are in flight
+    user_message = asyncio.ensure_future(ChatMessage.objects.acreate(
+        session=chat_session, role='user', content=question
+    ))
+    chat_history.append({'role': 'user', 'content': question})
+    
+    return {
+        'qa_service': qa_service,
+        'product': product,
+        'question': question,
+        'chat_session': chat_session,
+        'chat_history': chat_history,
+        'history_summary': chat_session.history_summary,
+        # Fold only once a full batch of unsummarized messages (question + answer
+        # included) has left the recent window, not on every turn past it
+        'summary_due': len(chat_history) + 1 >= (
+            settings.PROMPT_RECENT_MESSAGES + settings.CHAT_SUMMARY_BATCH_MESSAGES
+        ),
+        'retrieval': retrieval,
+        'user_message': user_message,
+    }, None
+
+
+class ProductAskView(AsyncAPIView):
     """
     Handles: POST /products/<id>/ask/
+    
+    Async pipeline: retrieval runs concurrently with session resolution and
+    history loading, and the assistant message is persisted after the
+    response is returned.
     """
-    def post(self, request, id):
-        product = get_object_or_404(Product, id=id)
+    async def post(self, request, id):
+        ask, error = await _aprepare_ask(request, id)
+        if error:
+            return error
         
-        if product.status != 'completed':
+        chat_session = ask['chat_session']
+        try:
+            retrieved = await ask['retrieval']
+            result = await ask['qa_service'].agenerate_answer(
+                ask['product'].id, ask['question'], ask['chat_history'], retrieved,
+                history_summary=ask['history_summary']
+            )
+        except RateLimitExceeded as e:
+            logger.warning(f"Answer rate limited: {str(e)}")
+            await ask['user_message']
+            response = Response(
+                {'error': 'Too many requests, please retry shortly', 'retry_after': e.retry_after},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
+            )
+            response['Retry-After'] = str(e.retry_after)
+            return response
+        except Exception as e:
+            logger.error(f"Error answering question: {str(e)}", exc_info=True)
+            await ask['user_message']
             return Response(
-                {'error': 'Product data is not ready yet'},
-                status=status.HTTP_400_BAD_REQUEST
+                {'error': 'Failed to generate answer'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-            
-        serializer = AskQuestionSerializer(data=request.data)
-        if not serializer.is_valid():
-             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        question = serializer.validated_data['question']
-        session_id = serializer.validated_data.get('session_id')
+        await ask['user_message']
         
-        # Session Logic
-        if session_id:
-            chat_session = ChatSession.objects.filter(
-                session_id=session_id, product=product
-            ).first()
-        else:
-            session_id = str(uuid.uuid4())
-            chat_session = None
-            
-        if not chat_session:
-            chat_session = ChatSession.objects.create(
-                product=product,
-                session_id=session_id,
-                user=request.user if request.user.is_authenticated else None
-            )
-            
-        # Save User Msg
-        ChatMessage.objects.create(
-            session=chat_session, role='user', content=question
-        )
+        # Save AI Msg
+        _PERSIST_EXECUTOR.submit(_save_messages, [ChatMessage(
+            session=chat_session,
+            role='assistant',
+            content=result['answer'],
+            context_chunks=result['context_chunks']
+        )], chat_session.id if ask['summary_due'] else None)
         
-        # Get Chat History
-        chat_history = [
-            {'role': msg.role, 'content': msg.content}
-            for msg in chat_session.messages.all().order_by('created_at')[:10]
-        ]
+        return Response({
+            'answer': result['answer'],
+            'session_id': chat_session.session_id,
+            'context_chunks': result['context_chunks']
+        })
+
+
+class ProductAskStreamView(AsyncAPIView):
+    """
+    Handles: POST /products/<id>/ask/stream/
+    
+    Same contract as ProductAskView, but the answer is streamed as
+    server-sent events while the LLM generates it:
+    'session' -> 'token'* -> 'done' (or 'error').
+    Serve through amazon_qa_project.asgi for real streaming; under WSGI the
+    response is buffered.
+    """
+    def perform_content_negotiation(self, request, force=False):
+        # Clients accept text/event-stream; errors before the stream starts are JSON
+        return super().perform_content_negotiation(request, force=True)
+    
+    async def post(self, request, id):
+        ask, error = await _aprepare_ask(request, id)
+        if error:
+            return error
         
-        # Call AI Service
-        qa_service = QAService()
-        try:
-            result = qa_service.get_answer(product.id, question, chat_history)
+        chat_session = ask['chat_session']
+        session_id = chat_session.session_id
+        
+        async def event_stream():
+            yield _sse_event('session', {'session_id': session_id})
+            
+            result = None
+            try:
+                retrieved = await ask['retrieval']
+                async for event in ask['qa_service'].astream_answer(
+                    ask['product'].id, ask['question'], ask['chat_history'], retrieved,
+                    history_summary=ask['history_summary']
+                ):
+                    if event['type'] == 'token':
+                        yield _sse_event('token', {'text': event['text']})
+                    else:
+                        result = event['result']
+            except RateLimitExceeded as e:
+                logger.warning(f"Streamed answer rate limited: {str(e)}")
+                await ask['user_message']
+                yield _sse_event('error', {
+                    'error': 'Too many requests, please retry shortly', 'retry_after': e.retry_after
+                })
+                return
+            except Exception as e:
+                logger.error(f"Error streaming answer: {str(e)}", exc_info=True)
+                await ask['user_message']
+                yield _sse_event('error', {'error': 'Failed to generate answer'})
+                return
             
-            # Save AI Msg
-            ChatMessage.objects.create(
+            await ask['user_message']
+            
+            # Save AI Msg once the full answer is known
+            await ChatMessage.objects.acreate(
                 session=chat_session,
                 role='assistant',
                 content=result['answer'],
                 context_chunks=result['context_chunks']
             )
+            if ask['summary_due']:
+                _PERSIST_EXECUTOR.submit(_queue_history_summary, chat_session.id)
             
-            return Response({
+            yield _sse_event('done', {
                 'answer': result['answer'],
                 'session_id': session_id,
                 'context_chunks': result['context_chunks']
             })
-            
-        except Exception as e:
-            logger.error(f"Error answering question: {str(e)}", exc_info=True)
-            return Response(
-                {'error': 'Failed to generate answer'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        
+        response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
 
 
 # --- 3. Nested Resource Views (Using APIView) ---
@@ -268,6 +567,24 @@ class ProductReviewsView(APIView):
         return paginator.get_paginated_response(serializer.data)
 
 
+class ProductPriceHistoryView(APIView):
+    """
+    Handles: GET /products/<id>/price-history/
+    """
+    def get(self, request, id):
+        if not Product.objects.filter(id=id).exists():
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        history = PriceHistory.objects.filter(product_id=id).order_by('-recorded_at')
+        
+        paginator = PageNumberPagination()
+        paginator.page_size = 50
+        result_page = paginator.paginate_queryset(history, request)
+        
+        serializer = PriceHistorySerializer(result_page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
 class ProductChatSessionsView(APIView):
     """
     Handles: GET /products/<id>/chat-sessions/
@@ -289,4 +606,17 @@ class ChatSessionMessagesView(APIView):
         session = get_object_or_404(ChatSession, session_id=session_id)
         messages = session.messages.all().order_by('created_at')
         serializer = ChatMessageSerializer(messages, many=True)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+# --- 4. Operational Views ---
+
+class MetricsView(APIView):
+    """
+    Handles: GET /metrics/
+    """
+    def get(self, request):
+        counters = metrics.get_counters()
+        counters.update(SemanticAnswerCache().stats())
+        counters.update(IntentRouter.stats())
+        return Response(counters)